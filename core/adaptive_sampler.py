@@ -0,0 +1,71 @@
+# core/adaptive_sampler.py - 動き量に応じたサンプリング間隔制御
+import cv2
+import numpy as np
+from typing import Optional
+import logging
+
+from models.config_models import ExtractionConfig
+from .frame_reader import make_proxy_gray
+
+
+class AdaptiveSampler:
+    """連続するサンプル間の動き量から次のサンプリング間隔を決めるクラス
+
+    動き量は縮小グレースケール画像上の疎なオプティカルフロー（特徴点が少ない場合は
+    フレーム差分）で推定し、画像幅に対する移動量の比で表す。1サンプルあたりの
+    動き量が target_motion_ratio に近づくよう、min_interval_sec〜max_interval_sec の
+    範囲で間隔を伸縮する。
+    """
+
+    # 1回の更新で間隔を変化させる倍率の上限（振動防止）
+    MAX_STEP_FACTOR = 2.0
+    MIN_FEATURES = 10
+    # 往復追跡に成功した特徴点の割合がこれ未満なら追跡不能とみなす
+    MIN_TRACKED_RATIO = 0.3
+    LK_PARAMS = {'winSize': (21, 21), 'maxLevel': 3}
+
+    def __init__(self, config: ExtractionConfig):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.interval = config.base_interval_sec
+        self.last_motion: Optional[float] = None
+        self._prev_gray: Optional[np.ndarray] = None
+
+    def next_interval(self, frame: np.ndarray) -> float:
+        """サンプルしたフレームを受け取り、次のサンプルまでの間隔（秒）を返す"""
+        if not self.config.adaptive_interval:
+            return self.config.base_interval_sec
+
+        gray = make_proxy_gray(frame, max_width=self.config.motion_proxy_width)
+        if self._prev_gray is not None and self._prev_gray.shape == gray.shape:
+            motion = self.estimate_motion(self._prev_gray, gray)
+            self.last_motion = motion
+            self.interval = self._update_interval(motion)
+        self._prev_gray = gray
+        return self.interval
+
+    def estimate_motion(self, prev_gray: np.ndarray, gray: np.ndarray) -> float:
+        """2枚の縮小画像間の動き量（画像幅に対する比）を推定する"""
+        points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=200, qualityLevel=0.01, minDistance=7)
+        if points is not None and len(points) >= self.MIN_FEATURES:
+            next_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **self.LK_PARAMS)
+            back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, next_points, None, **self.LK_PARAMS)
+            # 往復追跡の誤差が大きい点は誤追跡として除外する
+            round_trip = np.linalg.norm((back_points - points).reshape(-1, 2), axis=1)
+            valid = (status.reshape(-1) == 1) & (back_status.reshape(-1) == 1) & (round_trip < 1.0)
+            if valid.mean() < self.MIN_TRACKED_RATIO:
+                # ほとんどの点を見失った = 追跡範囲を超える大きな動き
+                return 1.0
+            displacement = np.linalg.norm((next_points - points).reshape(-1, 2)[valid], axis=1)
+            return float(np.median(displacement) / gray.shape[1])
+
+        # 特徴点が少ない（空・壁など）場合はフレーム差分で代用する
+        diff = cv2.absdiff(prev_gray, gray)
+        return float(diff.mean() / 255.0)
+
+    def _update_interval(self, motion: float) -> float:
+        target = self.config.target_motion_ratio
+        factor = target / max(motion, 1e-6)
+        factor = min(max(factor, 1.0 / self.MAX_STEP_FACTOR), self.MAX_STEP_FACTOR)
+        interval = self.interval * factor
+        return min(max(interval, self.config.min_interval_sec), self.config.max_interval_sec)
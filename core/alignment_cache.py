@@ -0,0 +1,183 @@
+# core/alignment_cache.py - RealityScan アライメント結果のコンテンツアドレスキャッシュ
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+import numpy as np
+
+from models.data_models import AlignmentPoses, ComponentList
+
+# キーの算出方法や保存形式を変えたら上げる（古いエントリは使われずに LRU で消える）
+CACHE_FORMAT_VERSION = 1
+# ComponentList 以外で保存する結果のフィールド
+RESULT_FIELDS = ('total_images', 'unaligned_images', 'alignment_ratio', 'mean_reprojection_error')
+HASH_CHUNK_BYTES = 1 << 20
+
+
+class AlignmentCache:
+    """配置済みフォルダの内容（画像と XMP）・品質・設定のハッシュをキーにアライメント結果を保存するキャッシュ
+
+    各エントリは <キー>/ ディレクトリに姿勢配列（poses.npz）、結果の残りのフィールド（result.json）、
+    RealityScan が書き出したコンポーネント（components/）を持つ。ヒットすると result.json の更新時刻を
+    使用時刻として更新し、合計サイズが max_bytes を超えると使用時刻が古いエントリから削除する。
+    エントリは一時ディレクトリに書いてから rename するので、複数のインスタンスやプロセスで共有できる。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self.stats: Counter = Counter({'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0})
+        self._lock = threading.Lock()
+        # (パス, サイズ, 更新時刻, inode) -> 内容のハッシュ（変わっていないファイルは読み直さない）
+        self._file_digests: Dict[Tuple[str, int, int, int], str] = {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, image_dir: Path, settings: Dict[str, Any]) -> str:
+        """フォルダ内の全ファイル（名前と内容）と settings から決まるキー"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps({'version': CACHE_FORMAT_VERSION, **settings}, sort_keys=True).encode('utf-8'))
+        for path in sorted(Path(image_dir).iterdir()):
+            if path.is_file():
+                digest.update(path.name.encode('utf-8') + b'\0')
+                digest.update(self._file_digest(path).encode('ascii'))
+        return digest.hexdigest()
+
+    def get(self, key: str, image_dir: Path, components_dir: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+        """保存済みの結果を返す（無ければ None）
+
+        画像パスは保存時の配置フォルダから image_dir に読み替え、保存済みのコンポーネントは
+        components_dir に復元する。
+        """
+        entry = self.cache_dir / key
+        try:
+            with open(entry / 'result.json', encoding='utf-8') as f:
+                stored = json.load(f)
+            with np.load(entry / 'poses.npz', allow_pickle=False) as arrays:
+                poses_arrays = {name: arrays[name] for name in arrays.files}
+        except (OSError, ValueError, KeyError) as e:
+            with self._lock:
+                self.stats['misses'] += 1
+            if not isinstance(e, FileNotFoundError):
+                self.logger.warning(f"アライメントキャッシュのエントリを読めませんでした（{key[:12]}）: {e}")
+            else:
+                self.logger.info(f"アライメントキャッシュ: ミス ({key[:12]})")
+            return None
+
+        poses_arrays['paths'] = self._relocate_paths(poses_arrays['paths'], stored['image_dir'], Path(image_dir))
+        poses = AlignmentPoses(**poses_arrays)
+        result = {field: stored[field] for field in RESULT_FIELDS}
+        result['components'] = ComponentList(poses)
+        if components_dir is not None and (entry / 'components').is_dir():
+            shutil.rmtree(components_dir, ignore_errors=True)
+            shutil.copytree(entry / 'components', components_dir)
+        try:
+            os.utime(entry / 'result.json')
+        except OSError:
+            pass
+        with self._lock:
+            self.stats['hits'] += 1
+        self.logger.info(f"アライメントキャッシュ: ヒット ({key[:12]}, {len(poses)}枚を再利用)")
+        return result
+
+    def put(self, key: str, result: Dict[str, Any], image_dir: Path, components_dir: Optional[Path] = None):
+        """結果を保存する。同じキーのエントリが既にあれば何もしない"""
+        entry = self.cache_dir / key
+        if entry.exists():
+            return
+        poses = result['components'].poses if isinstance(result['components'], ComponentList) \
+            else _poses_from_dicts(result['components'])
+        staging = self.cache_dir / f".tmp_{key[:12]}_{uuid.uuid4().hex}"
+        try:
+            staging.mkdir(parents=True)
+            np.savez(staging / 'poses.npz', names=poses.names, paths=poses.paths, rotations=poses.rotations,
+                     positions=poses.positions, component_index=poses.component_index,
+                     component_ids=poses.component_ids, component_image_counts=poses.component_image_counts,
+                     component_errors=poses.component_errors)
+            if components_dir is not None and Path(components_dir).is_dir():
+                shutil.copytree(components_dir, staging / 'components')
+            stored = {field: result.get(field) for field in RESULT_FIELDS}
+            stored['image_dir'] = str(image_dir)
+            with open(staging / 'result.json', 'w', encoding='utf-8') as f:
+                json.dump(stored, f, ensure_ascii=False)
+            os.replace(staging, entry)
+        except OSError as e:
+            # 他のプロセスが同じキーを先に保存した場合も含め、キャッシュ無しで続行する
+            shutil.rmtree(staging, ignore_errors=True)
+            if not entry.exists():
+                self.logger.warning(f"アライメント結果をキャッシュに保存できませんでした: {e}")
+            return
+        with self._lock:
+            self.stats['stores'] += 1
+            self._evict()
+
+    def stats_summary(self) -> Dict[str, float]:
+        total = self.stats['hits'] + self.stats['misses']
+        return {**self.stats, 'hit_rate': round(self.stats['hits'] / total, 3) if total else 0.0}
+
+    def _evict(self):
+        """合計サイズが上限以下になるまで使用時刻が古いエントリから削除する"""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if not entry.is_dir() or entry.name.startswith('.tmp_'):
+                continue
+            try:
+                used = (entry / 'result.json').stat().st_mtime
+                size = sum(p.stat().st_size for p in entry.rglob('*') if p.is_file())
+            except OSError:
+                continue
+            entries.append((used, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            self.stats['evictions'] += 1
+            self.logger.info(f"アライメントキャッシュから削除: {entry.name[:12]} ({size / 1024:.0f} KB)")
+
+    def _file_digest(self, path: Path) -> str:
+        st = path.stat()
+        signature = (str(path), st.st_size, st.st_mtime_ns, st.st_ino)
+        digest = self._file_digests.get(signature)
+        if digest is None:
+            h = hashlib.blake2b(digest_size=20)
+            with open(path, 'rb') as f:
+                while chunk := f.read(HASH_CHUNK_BYTES):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            with self._lock:
+                self._file_digests[signature] = digest
+        return digest
+
+    @staticmethod
+    def _relocate_paths(paths: np.ndarray, stored_dir: str, image_dir: Path) -> np.ndarray:
+        """保存時の配置フォルダ内を指すパスを image_dir 内のパスに置き換える"""
+        if Path(stored_dir) == image_dir:
+            return paths
+        return np.array([str(image_dir / Path(p).name) if os.path.dirname(p) == stored_dir else p for p in paths],
+                        dtype=str)
+
+
+def _poses_from_dicts(components) -> AlignmentPoses:
+    """辞書形式のコンポーネント一覧から AlignmentPoses を組み立てる"""
+    names, paths, rotations, positions, component_index = [], [], [], [], []
+    for c, component in enumerate(components):
+        for image in component['images']:
+            pose = image.get('pose', {})
+            names.append(image['name'])
+            paths.append(image.get('path', ''))
+            rotations.append(pose.get('rotation', np.eye(3)))
+            positions.append([pose.get('tx', 0.0), pose.get('ty', 0.0), pose.get('tz', 0.0)])
+            component_index.append(c)
+    return AlignmentPoses(names, paths, np.reshape(rotations, (-1, 3, 3)), np.reshape(positions, (-1, 3)),
+                          component_index, [str(c.get('id', i)) for i, c in enumerate(components)],
+                          [int(c.get('image_count', len(c['images']))) for c in components],
+                          [float(c.get('reprojection_error', 99.0)) for c in components])
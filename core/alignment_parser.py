@@ -0,0 +1,93 @@
+# core/alignment_parser.py - アライメント結果 XML のストリーミング解析
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from models.data_models import AlignmentPoses
+
+# image 要素の回転属性（行優先）
+ROTATION_ATTRS = tuple(f"r{row}{col}" for row in range(1, 4) for col in range(1, 4))
+IDENTITY_ROTATION = tuple(float(v) for v in np.eye(3).ravel())
+
+
+class _GrowableArray:
+    """行数が事前に分からない配列を倍々に拡張しながら埋める"""
+
+    def __init__(self, width: int, capacity: int):
+        self.data = np.empty((max(capacity, 16), width), dtype=np.float64)
+        self.size = 0
+
+    def reserve(self, capacity: int):
+        """少なくとも capacity 行を格納できるように拡張する（読み込み済みの行は保持する）"""
+        if capacity > len(self.data):
+            self.data = np.resize(self.data, (capacity, self.data.shape[1]))
+
+    def append(self, row):
+        if self.size == len(self.data):
+            self.data = np.resize(self.data, (len(self.data) * 2, self.data.shape[1]))
+        self.data[self.size] = row
+        self.size += 1
+
+    def result(self) -> np.ndarray:
+        return self.data[:self.size].copy()
+
+
+def parse_alignment_xml(xml_path: Path) -> Tuple[Dict[str, Any], AlignmentPoses]:
+    """アライメント結果 XML を iterparse で読み、summary 属性と姿勢配列を返す
+
+    要素は読み終えた時点で破棄するため、画像数が多くてもツリー全体をメモリに持たない。
+    """
+    summary: Dict[str, Any] = {}
+    names: List[str] = []
+    paths: List[str] = []
+    component_index: List[int] = []
+    component_ids: List[str] = []
+    component_counts: List[int] = []
+    component_errors: List[float] = []
+    rotations = positions = None
+
+    context = ET.iterparse(str(xml_path), events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'summary':
+                summary = dict(elem.attrib)
+                capacity = int(summary.get('aligned_images', 0) or 0)
+                # summary が components の後にある場合も読み込み済みの姿勢を残し、行数は容量の目安にだけ使う
+                if rotations is None:
+                    rotations, positions = _GrowableArray(9, capacity), _GrowableArray(3, capacity)
+                else:
+                    rotations.reserve(capacity)
+                    positions.reserve(capacity)
+            elif tag == 'component':
+                component_ids.append(elem.get('id'))
+                component_counts.append(int(elem.get('num_images', 0)))
+                component_errors.append(float(elem.get('reprojection_error', 99.0)))
+            continue
+
+        if tag == 'image' and component_ids:
+            if rotations is None:
+                rotations, positions = _GrowableArray(9, 0), _GrowableArray(3, 0)
+            attrib = elem.attrib
+            names.append(attrib.get('name'))
+            paths.append(attrib.get('path', ''))
+            component_index.append(len(component_ids) - 1)
+            rotations.append([float(attrib.get(k, d)) for k, d in zip(ROTATION_ATTRS, IDENTITY_ROTATION)])
+            positions.append([float(attrib.get(k, 0)) for k in ('tx', 'ty', 'tz')])
+            elem.clear()
+        elif tag in ('image', 'component'):
+            elem.clear()
+            root.clear()
+
+    poses = AlignmentPoses(
+        names=np.array(names, dtype=str), paths=np.array(paths, dtype=str),
+        rotations=rotations.result() if rotations is not None else np.empty((0, 9)),
+        positions=positions.result() if positions is not None else np.empty((0, 3)),
+        component_index=np.array(component_index, dtype=np.int32),
+        component_ids=np.array(component_ids, dtype=str),
+        component_image_counts=np.array(component_counts, dtype=np.int64),
+        component_errors=np.array(component_errors, dtype=np.float64))
+    return summary, poses
@@ -0,0 +1,164 @@
+# core/detection_cache.py - YOLO検出結果の永続キャッシュ（SQLite）
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+
+import numpy as np
+
+from models.data_models import DetectionRecord
+from utils.file_utils import weights_fingerprint
+
+# キー: (動画の識別子, タイムスタンプ秒)
+CacheKey = Tuple[str, float]
+# 保存時のキー: CacheKey に推論入力の幅（px）を加えたもの（縮小プロキシの幅が違えば検出結果も違う）
+EntryKey = Tuple[str, float, int]
+
+# 行を特定する列（モデル・推論バックエンド・推論サイズはインスタンスごとに固定）
+KEY_COLUMNS = ('video_hash', 'timestamp_ms', 'input_width', 'model', 'backend', 'imgsz')
+KEY_WHERE = ' AND '.join(f"{column}=?" for column in KEY_COLUMNS)
+
+# 1行あたりのデータ以外の概算サイズ（キー・インデックス・ページの余白）
+ROW_OVERHEAD_BYTES = 96
+
+
+class DetectionCache:
+    """(動画ハッシュ, タイムスタンプ, 入力幅, モデル, 推論バックエンド, 推論サイズ) をキーに検出結果を保存するキャッシュ
+
+    閾値だけを変えた再実行では推論せずに保存済みのボックスを再判定できる。
+    合計サイズが max_bytes を超えると、最後に使われた時刻が古い行から削除する。
+    複数プロセスから同じファイルを使えるよう WAL モードで開く。
+    """
+
+    def __init__(self, path: Path, model_name: str, imgsz: int, max_bytes: int, backend: str = 'torch'):
+        self.path = Path(path)
+        # ローカルの重みは内容の識別子も含める（再学習した重みで古い検出結果を返さない）
+        fingerprint = weights_fingerprint(model_name)
+        self.model_key = f"{Path(model_name).name}:{fingerprint}" if fingerprint else Path(model_name).name
+        self.imgsz = imgsz
+        # エクスポート済みモデルの推論結果は PyTorch と完全には一致しないため分けて保存する
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self.stats: Counter = Counter({'hits': 0, 'misses': 0, 'evictions': 0})
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(detections)')}
+        if columns and not set(KEY_COLUMNS) <= columns:
+            # 入力幅・バックエンドを持たない古い形式のキャッシュは作り直す
+            self.logger.info("古い形式の検出キャッシュを破棄します。")
+            self._conn.execute('DROP TABLE detections')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS detections (
+                video_hash TEXT NOT NULL,
+                timestamp_ms INTEGER NOT NULL,
+                input_width INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                imgsz INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (video_hash, timestamp_ms, input_width, model, backend, imgsz)
+            )""")
+        self._conn.execute('CREATE INDEX IF NOT EXISTS detections_last_used ON detections (last_used)')
+        # キャッシュだけで判定するときにモデルを読み込まずにクラス名を引けるよう、モデルごとの対応表も保存する
+        self._conn.execute('CREATE TABLE IF NOT EXISTS class_names (model TEXT PRIMARY KEY, names TEXT NOT NULL)')
+        self._conn.commit()
+        self._approx_bytes = self._total_bytes()
+
+    def get_many(self, keys: Iterable[EntryKey]) -> Dict[EntryKey, DetectionRecord]:
+        """キャッシュ済みの検出レコードを返す（無いキーは含まない）"""
+        keys = list(keys)
+        found: Dict[EntryKey, DetectionRecord] = {}
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(f'SELECT data FROM detections WHERE {KEY_WHERE}',
+                                         self._row_key(key)).fetchone()
+                if row is not None:
+                    found[key] = DetectionRecord.from_array(np.frombuffer(row[0], dtype=np.float32))
+            if found:
+                now = time.time()
+                self._conn.executemany(f'UPDATE detections SET last_used=? WHERE {KEY_WHERE}',
+                                       [(now, *self._row_key(key)) for key in found])
+                self._conn.commit()
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[EntryKey, DetectionRecord]]):
+        now = time.time()
+        rows = [(*self._row_key(key), record.to_array().tobytes(), now) for key, record in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO detections ({', '.join(KEY_COLUMNS)}, data, last_used) "
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.commit()
+            self._approx_bytes += sum(len(row[-2]) + ROW_OVERHEAD_BYTES for row in rows)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def get_class_names(self) -> Optional[Dict[int, str]]:
+        """保存済みのモデルのクラス名（クラスID -> 名前）。無ければ None"""
+        with self._lock:
+            row = self._conn.execute('SELECT names FROM class_names WHERE model=?', (self.model_key,)).fetchone()
+        if row is None:
+            return None
+        return {int(k): v for k, v in json.loads(row[0]).items()}
+
+    def put_class_names(self, names: Dict[int, str]):
+        data = json.dumps({str(k): v for k, v in names.items()}, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO class_names (model, names) VALUES (?, ?)', (self.model_key, data))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM detections').fetchone()[0]
+
+    def stats_summary(self) -> Dict[str, float]:
+        total = self.stats['hits'] + self.stats['misses']
+        return {**self.stats, 'hit_rate': round(self.stats['hits'] / total, 3) if total else 0.0,
+                'size_mb': round(self._approx_bytes / (1024 * 1024), 2)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        """合計サイズが上限の 9 割になるまで古い行から削除する"""
+        self._approx_bytes = self._total_bytes()
+        target = int(self.max_bytes * 0.9)
+        while self._approx_bytes > target:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(KEY_COLUMNS)}, LENGTH(data) FROM detections "
+                'ORDER BY last_used LIMIT 256').fetchall()
+            if not rows:
+                break
+            removed = []
+            for row in rows:
+                removed.append(row[:-1])
+                self._approx_bytes -= row[-1] + ROW_OVERHEAD_BYTES
+                if self._approx_bytes <= target:
+                    break
+            self._conn.executemany(f'DELETE FROM detections WHERE {KEY_WHERE}', removed)
+            self._conn.commit()
+            self.stats['evictions'] += len(removed)
+        self.logger.debug(f"検出キャッシュを削減しました: {self._approx_bytes / (1024 * 1024):.1f} MB")
+
+    def _total_bytes(self) -> int:
+        total, count = self._conn.execute('SELECT COALESCE(SUM(LENGTH(data)), 0), COUNT(*) FROM detections').fetchone()
+        return int(total) + count * ROW_OVERHEAD_BYTES
+
+    def _row_key(self, key: EntryKey) -> Tuple[str, int, int, str, str, int]:
+        video_hash, timestamp, input_width = key
+        return video_hash, int(round(timestamp * 1000)), int(input_width), self.model_key, self.backend, self.imgsz
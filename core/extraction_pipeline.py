@@ -0,0 +1,181 @@
+# core/extraction_pipeline.py - 有界キューによるステージ並列パイプライン
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import logging
+
+_SENTINEL = object()
+
+
+@dataclass
+class PipelineStage:
+    """パイプラインの1ステージ
+
+    func はアイテムをその場で更新する（戻り値は使わない）。アイテムは破棄せず
+    必ず次のステージへ流し、不要なものはアイテム側のフラグで表現する。
+    ordered=True のステージは単一スレッドで、アイテムを index 属性の順に処理する。
+    batch_size > 1 のステージ（順序なしのみ）は func にアイテムのリストを渡す。バッチは
+    batch_size 個たまるか上流が終了した時点で処理される。
+    """
+    name: str
+    func: Callable[[Any], None]
+    workers: int = 1
+    ordered: bool = False
+    batch_size: int = 1
+
+
+class StageStats:
+    """ステージごとのスループット計測"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_sec = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, count: int = 1):
+        with self._lock:
+            self.items += count
+            self.busy_sec += elapsed
+
+    @property
+    def items_per_sec(self) -> float:
+        return self.items / self.busy_sec if self.busy_sec > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'items': self.items, 'busy_sec': round(self.busy_sec, 3),
+                'items_per_sec': round(self.items_per_sec, 2)}
+
+
+class StagedPipeline:
+    """ソース（デコード）→ 各ステージを有界キューで接続し、ステージごとのスレッドプールで処理する"""
+
+    def __init__(self, stages: List[PipelineStage], queue_depth: int = 4, source_name: str = 'decode'):
+        self.stages = [PipelineStage(s.name, s.func, 1 if s.ordered else max(1, s.workers), s.ordered,
+                                     1 if s.ordered else max(1, s.batch_size))
+                       for s in stages]
+        self.queue_depth = max(1, queue_depth)
+        self.source_name = source_name
+        self.logger = logging.getLogger(__name__)
+
+        self.stats: Dict[str, StageStats] = {name: StageStats(name)
+                                             for name in [source_name] + [s.name for s in self.stages]}
+        self._stop_event = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    def stop(self):
+        """ソースからの新規アイテム投入を止める（処理中のアイテムは下流まで流れる）"""
+        self._stop_event.set()
+
+    def run(self, source: Iterable[Any]):
+        """ソースを最後まで（または stop() まで）処理し、全ステージの完了を待つ"""
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in self.stages]
+        remaining = [s.workers for s in self.stages]
+
+        threads = [threading.Thread(target=self._run_source, args=(source, queues[0]),
+                                    name=f"pipeline-{self.source_name}", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=self._run_stage, args=(i, queues, remaining),
+                                                name=f"pipeline-{stage.name}-{n}", daemon=True))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def stats_summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def _run_source(self, source: Iterable[Any], out_q: queue.Queue):
+        stats = self.stats[self.source_name]
+        iterator = iter(source)
+        try:
+            while not self.stopped:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats.record(time.perf_counter() - start)
+                out_q.put(item)
+        except Exception as e:
+            self._set_error(e)
+        finally:
+            for _ in range(self.stages[0].workers):
+                out_q.put(_SENTINEL)
+
+    def _run_stage(self, index: int, queues: List[queue.Queue], remaining: List[int]):
+        stage = self.stages[index]
+        in_q = queues[index]
+        out_q = queues[index + 1] if index + 1 < len(queues) else None
+        pending: Dict[int, Any] = {}
+        next_index = 0
+        batch: List[Any] = []
+
+        while True:
+            item = in_q.get()
+            if item is _SENTINEL:
+                break
+            if stage.batch_size > 1:
+                batch.append(item)
+                if len(batch) >= stage.batch_size:
+                    self._process_batch(stage, batch, out_q)
+                    batch = []
+                continue
+            if not stage.ordered:
+                self._process(stage, item, out_q)
+                continue
+            # 順序付きステージ: index の若い順に処理する
+            pending[item.index] = item
+            while next_index in pending:
+                self._process(stage, pending.pop(next_index), out_q)
+                next_index += 1
+
+        if batch:
+            self._process_batch(stage, batch, out_q)
+
+        # ステージの最後のワーカーが下流へ終了を通知する
+        with self._lock:
+            remaining[index] -= 1
+            is_last = remaining[index] == 0
+        if is_last and out_q is not None:
+            for _ in range(self.stages[index + 1].workers):
+                out_q.put(_SENTINEL)
+
+    def _process(self, stage: PipelineStage, item: Any, out_q: Optional[queue.Queue]):
+        start = time.perf_counter()
+        try:
+            stage.func(item)
+        except Exception as e:
+            self._set_error(e)
+        self.stats[stage.name].record(time.perf_counter() - start)
+        if out_q is not None:
+            out_q.put(item)
+
+    def _process_batch(self, stage: PipelineStage, items: List[Any], out_q: Optional[queue.Queue]):
+        start = time.perf_counter()
+        try:
+            stage.func(items)
+        except Exception as e:
+            self._set_error(e)
+        self.stats[stage.name].record(time.perf_counter() - start, count=len(items))
+        if out_q is not None:
+            for item in items:
+                out_q.put(item)
+
+    def _set_error(self, error: BaseException):
+        with self._lock:
+            if self._error is None:
+                self.logger.error(f"パイプライン処理中にエラー: {error}")
+                self._error = error
+        self.stop()
@@ -0,0 +1,58 @@
+# core/face_pruner.py - 特徴の乏しいキューブフェイスの除外
+import threading
+from collections import Counter
+from typing import Dict, Optional
+import logging
+
+import cv2
+import numpy as np
+
+from models.config_models import FacePruningConfig
+from .frame_reader import make_proxy_gray
+
+
+class FacePruner:
+    """空・天井・無地の壁など、特徴点がほとんど取れない面を書き出し前に除外するクラス
+
+    縮小したグレースケール画像で勾配の強い画素（エッジ）の割合を求め、
+    min_edge_ratio 未満の面を低テクスチャとみなす。RealityScan でアライメントに
+    失敗しやすい面を渡さないことで、特徴抽出・マッチングの時間と無駄な再抽出を減らす。
+    remap ステージの複数ワーカーから呼ばれるため統計はロックで保護する。
+    """
+
+    REASON_LOW_TEXTURE = 'low_texture'
+
+    def __init__(self, config: FacePruningConfig):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def score(self, face: np.ndarray) -> float:
+        """勾配強度が gradient_threshold を超える画素の割合（0〜1）"""
+        gray = make_proxy_gray(face, max_side=self.config.proxy_size)
+        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        magnitude = cv2.magnitude(gx, gy)
+        return float(np.count_nonzero(magnitude > self.config.gradient_threshold)) / magnitude.size
+
+    def check(self, face: np.ndarray) -> Optional[str]:
+        """面を除外すべき理由を返す（問題なければ None）"""
+        if not self.config.enabled:
+            return None
+        reason = self.REASON_LOW_TEXTURE if self.score(face) < self.config.min_edge_ratio else None
+        with self._lock:
+            self.stats[reason or 'passed'] += 1
+        return reason
+
+    def prune(self, faces: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """低テクスチャの面を faces から取り除き、{面名: 除外理由} を返す"""
+        if not self.config.enabled:
+            return {}
+        pruned = {}
+        for face_name in list(faces):
+            reason = self.check(faces[face_name])
+            if reason:
+                pruned[face_name] = reason
+                del faces[face_name]
+        return pruned
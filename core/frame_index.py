@@ -0,0 +1,177 @@
+# core/frame_index.py - 動画ごとのフレームインデックス（PTS → フレーム番号／キーフレーム）
+import cv2
+import numpy as np
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+from utils.file_utils import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# 動画の隣に置くサイドカーファイルの拡張子
+SIDECAR_SUFFIX = '.frameindex.npz'
+# サイドカーの形式が変わったら上げる
+FORMAT_VERSION = 1
+
+
+class FrameIndex:
+    """表示順のフレーム時刻（ms）とキーフレーム位置を保持するインデックス
+
+    フレーム番号は表示順（PTS 昇順）の通し番号で、cap.grab() で前進する番号と一致する。
+    VFR 動画でも時刻 → フレーム番号が fps 換算なしで正確に求まる。
+    """
+
+    def __init__(self, pts_ms: np.ndarray, keyframes: np.ndarray):
+        self.pts_ms = np.asarray(pts_ms, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.pts_ms)
+
+    @property
+    def duration_sec(self) -> float:
+        """最終フレームの表示終了時刻（秒）"""
+        if len(self.pts_ms) == 0:
+            return 0.0
+        last_duration = float(np.median(np.diff(self.pts_ms))) if len(self.pts_ms) > 1 else 0.0
+        return (self.pts_ms[-1] + last_duration) / 1000.0
+
+    def frame_at(self, time_sec: float) -> int:
+        """time_sec に最も近い時刻のフレーム番号"""
+        return self.nearest_frame(time_sec * 1000.0)
+
+    def nearest_frame(self, pts_ms: float) -> int:
+        i = int(np.searchsorted(self.pts_ms, pts_ms))
+        if i <= 0:
+            return 0
+        if i >= len(self.pts_ms):
+            return len(self.pts_ms) - 1
+        return i if self.pts_ms[i] - pts_ms < pts_ms - self.pts_ms[i - 1] else i - 1
+
+    def timestamp(self, frame_number: int) -> float:
+        """フレーム番号の表示時刻（秒）"""
+        return float(self.pts_ms[frame_number]) / 1000.0
+
+    def keyframe_before(self, frame_number: int) -> int:
+        """frame_number 以前で最も近いキーフレームの番号（不明なら 0）"""
+        i = int(np.searchsorted(self.keyframes, frame_number, side='right'))
+        return int(self.keyframes[i - 1]) if i > 0 else 0
+
+    @classmethod
+    def build(cls, video_path: str) -> Optional['FrameIndex']:
+        """デコードせずにパケットだけを走査してインデックスを作る"""
+        cap = cv2.VideoCapture(str(video_path), cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+        if not cap.isOpened():
+            return None
+        pts = []
+        is_key = []
+        try:
+            while cap.grab():
+                pts.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+                is_key.append(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) > 0)
+        finally:
+            cap.release()
+        if not pts:
+            return None
+
+        # パケットはデコード順（Bフレームがあると PTS 順と異なる）なので表示順に並べ替える
+        pts = np.asarray(pts, dtype=np.float64)
+        order = np.argsort(pts, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        keyframes = np.sort(rank[np.asarray(is_key, dtype=bool)])
+        return cls(pts[order], keyframes)
+
+    def save(self, path: Path, fingerprint: str):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, version=np.int32(FORMAT_VERSION), fingerprint=np.str_(fingerprint),
+                                pts_ms=self.pts_ms, keyframes=self.keyframes)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, fingerprint: str) -> Optional['FrameIndex']:
+        """サイドカーを読み込む（形式・動画の識別子が一致しなければ None）"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != FORMAT_VERSION or str(data['fingerprint']) != fingerprint:
+                    return None
+                return cls(data['pts_ms'], data['keyframes'])
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def sidecar_path(video_path: str, cache_dir: str = '') -> Path:
+    """サイドカーの保存先（cache_dir 未指定時は動画の隣）"""
+    video_path = Path(video_path)
+    if not cache_dir:
+        return video_path.with_name(video_path.name + SIDECAR_SUFFIX)
+    return Path(cache_dir) / (video_path.name + SIDECAR_SUFFIX)
+
+
+class FrameIndexStore:
+    """動画ごとのフレームインデックスをサイドカーから読み込み、無ければ作成して保存する
+
+    サイドカーは動画のサイズ・更新時刻・内容ハッシュで検証するため、動画が差し替えられると
+    作り直される。動画の隣に書けない場合は一時ディレクトリに保存する。
+    """
+
+    def __init__(self, cache_dir: str = ''):
+        self.cache_dir = cache_dir
+        self.logger = logging.getLogger(__name__)
+        self._indexes: Dict[str, Optional[FrameIndex]] = {}
+        # _lock は辞書の更新だけを守り、読み込み・作成は動画ごとのロックで行う（別の動画は並列に作成できる）
+        self._lock = threading.Lock()
+        self._video_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, video_path: str) -> Optional[FrameIndex]:
+        with self._lock:
+            if video_path in self._indexes:
+                return self._indexes[video_path]
+            video_lock = self._video_locks.setdefault(video_path, threading.Lock())
+        with video_lock:
+            with self._lock:
+                if video_path in self._indexes:
+                    return self._indexes[video_path]
+            index = self._load_or_build(video_path)
+            with self._lock:
+                self._indexes[video_path] = index
+                self._video_locks.pop(video_path, None)
+            return index
+
+    def _load_or_build(self, video_path: str) -> Optional[FrameIndex]:
+        try:
+            fingerprint = file_fingerprint(video_path)
+        except OSError as e:
+            self.logger.warning(f"フレームインデックスを作成できません: {e}")
+            return None
+
+        candidates = [sidecar_path(video_path, self.cache_dir),
+                      sidecar_path(video_path, str(Path(tempfile.gettempdir()) / 'video_3dgs_frame_index'))]
+        for path in candidates:
+            if path.exists():
+                index = FrameIndex.load(path, fingerprint)
+                if index is not None:
+                    self.logger.debug(f"フレームインデックスを読み込みました: {path}")
+                    return index
+
+        index = FrameIndex.build(video_path)
+        if index is None:
+            self.logger.warning(f"フレームインデックスを作成できませんでした: {Path(video_path).name}")
+            return None
+        self.logger.info(f"フレームインデックスを作成しました: {Path(video_path).name} "
+                         f"({len(index)}フレーム, キーフレーム{len(index.keyframes)}個)")
+
+        for path in candidates:
+            try:
+                index.save(path, fingerprint)
+                break
+            except OSError as e:
+                self.logger.debug(f"フレームインデックスを保存できませんでした: {path}: {e}")
+        return index
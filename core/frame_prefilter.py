@@ -0,0 +1,63 @@
+# core/frame_prefilter.py - YOLO前の軽量品質チェック
+import cv2
+import numpy as np
+from collections import Counter
+from typing import Optional
+import logging
+
+from models.config_models import PrefilterConfig
+from .frame_reader import make_proxy_gray
+
+
+class FramePrefilter:
+    """縮小画像に対する安価なチェック（露出・ブレ・重複）でフレームを事前に除外するクラス
+
+    check() は除外理由の文字列、または通過時に None を返す。重複判定は直前に
+    通過したフレームとの比較なので、フレームは時刻順に渡すこと。
+    """
+
+    REASON_UNDEREXPOSED = 'underexposed'
+    REASON_OVEREXPOSED = 'overexposed'
+    REASON_BLUR = 'blur'
+    REASON_DUPLICATE = 'duplicate'
+
+    # 重複判定用サムネイルのサイズ (w, h)
+    THUMBNAIL_SIZE = (64, 32)
+
+    def __init__(self, config: PrefilterConfig):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.stats: Counter = Counter()
+        self._last_thumbnail: Optional[np.ndarray] = None
+
+    def check(self, frame: np.ndarray) -> Optional[str]:
+        """フレームを除外すべき理由を返す（問題なければ None）"""
+        if not self.config.enabled:
+            return None
+
+        reason = self._check(make_proxy_gray(frame, max_width=self.config.proxy_width))
+        self.stats[reason or 'passed'] += 1
+        return reason
+
+    def _check(self, gray: np.ndarray) -> Optional[str]:
+        # 1. 露出（ヒストグラムの両端に画素が集中していないか）
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+        if hist[:self.config.dark_level].sum() >= self.config.max_dark_ratio:
+            return self.REASON_UNDEREXPOSED
+        if hist[self.config.bright_level:].sum() >= self.config.max_bright_ratio:
+            return self.REASON_OVEREXPOSED
+
+        # 2. シャープネス（ラプラシアンの分散）
+        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+        if sharpness < self.config.min_sharpness:
+            self.logger.debug(f"ブレ判定: シャープネス {sharpness:.1f} < {self.config.min_sharpness}")
+            return self.REASON_BLUR
+
+        # 3. 直前に通過したフレームとのほぼ重複
+        thumbnail = cv2.resize(gray, self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        if self._last_thumbnail is not None:
+            difference = cv2.absdiff(thumbnail, self._last_thumbnail).mean() / 255.0
+            if difference < self.config.duplicate_threshold:
+                return self.REASON_DUPLICATE
+        self._last_thumbnail = thumbnail
+        return None
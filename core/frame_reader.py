@@ -0,0 +1,152 @@
+# core/frame_reader.py - 指定時刻フレーム読み出し
+import cv2
+import numpy as np
+from typing import Dict, Optional, Tuple
+import logging
+
+from .frame_index import FrameIndex
+
+
+class FrameReader:
+    """指定時刻のフレームを読み出すクラス
+
+    mode='seek' はサンプル毎に CAP_PROP_POS_MSEC でシークする従来方式。
+    mode='sequential' は前方へ一度だけデコードし、サンプル間のフレームは
+    grab() で読み飛ばす。次のサンプルが seek_threshold_sec 以上離れている
+    場合（または後方に戻る場合）のみシークに切り替える。
+
+    frame_index を渡すと時刻 → フレーム番号を PTS から正確に求め（VFR 対応）、
+    シークするかどうかもキーフレーム位置から判断する。
+    """
+
+    # シーク1回のオーバーヘッドをデコードフレーム数に換算した値
+    SEEK_OVERHEAD_FRAMES = 16
+
+    def __init__(self, cap: cv2.VideoCapture, fps: float, mode: str = 'sequential',
+                 seek_threshold_sec: float = 10.0, frame_index: Optional[FrameIndex] = None):
+        self.cap = cap
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.mode = mode
+        self.seek_threshold_frames = max(1, int(round(seek_threshold_sec * self.fps)))
+        self.frame_index = frame_index
+        self.logger = logging.getLogger(__name__)
+
+        # 次に grab()/read() で得られるフレーム番号
+        self.next_frame_index = 0
+        self.stats: Dict[str, int] = {'seeks': 0, 'grabs': 0, 'reads': 0}
+
+    def frame_number(self, time_sec: float) -> int:
+        """time_sec で読み出されるフレームの番号"""
+        if self.frame_index is not None:
+            return self.frame_index.frame_at(time_sec)
+        return int(round(time_sec * self.fps))
+
+    def read_at(self, time_sec: float) -> Tuple[bool, Optional[np.ndarray]]:
+        """time_sec に対応するフレームを読み出す"""
+        if self.frame_index is not None:
+            return self._read_indexed(self.frame_index.frame_at(time_sec))
+
+        if self.mode == 'seek':
+            self.cap.set(cv2.CAP_PROP_POS_MSEC, int(time_sec * 1000))
+            self.stats['seeks'] += 1
+            return self._read()
+
+        target_index = int(round(time_sec * self.fps))
+        gap = target_index - self.next_frame_index
+
+        if gap < 0 or gap > self.seek_threshold_frames:
+            # 遠い（または後方の）サンプルはシークの方が安い
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, target_index)
+            self.next_frame_index = target_index
+            self.stats['seeks'] += 1
+        else:
+            # 間のフレームは色変換・コピーなしで読み飛ばす
+            for _ in range(gap):
+                if not self.cap.grab():
+                    return False, None
+                self.next_frame_index += 1
+                self.stats['grabs'] += 1
+
+        return self._read()
+
+    def _read_indexed(self, target_index: int) -> Tuple[bool, Optional[np.ndarray]]:
+        gap = target_index - self.next_frame_index
+        if self.mode == 'seek' or gap < 0 or self._seek_is_cheaper(target_index, gap):
+            return self._seek_and_read(target_index)
+
+        for _ in range(gap):
+            if not self.cap.grab():
+                return False, None
+            self.next_frame_index += 1
+            self.stats['grabs'] += 1
+        return self._read()
+
+    def _seek_is_cheaper(self, target_index: int, gap: int) -> bool:
+        if len(self.frame_index.keyframes) == 0:
+            return gap > self.seek_threshold_frames
+        keyframe = self.frame_index.keyframe_before(target_index)
+        # 現在位置と目標の間にキーフレームが無ければ、シークしても同じだけデコードが必要になる
+        if keyframe <= self.next_frame_index:
+            return False
+        return (target_index - keyframe) + self.SEEK_OVERHEAD_FRAMES < gap
+
+    def _seek_and_read(self, target_index: int) -> Tuple[bool, Optional[np.ndarray]]:
+        current = self._seek_and_grab(self.frame_index.pts_ms[target_index])
+        if current is not None and current > target_index:
+            # VFR 動画では OpenCV の fps 換算シークが行き過ぎることがあるため、キーフレームから数え直す
+            keyframe = self.frame_index.keyframe_before(target_index)
+            current = self._seek_and_grab(self.frame_index.pts_ms[keyframe])
+        if current is None:
+            return False, None
+
+        while current < target_index:
+            if not self.cap.grab():
+                return False, None
+            current += 1
+            self.stats['grabs'] += 1
+
+        ret, frame = self.cap.retrieve()
+        self.next_frame_index = current + 1
+        if ret:
+            self.stats['reads'] += 1
+        return ret, frame
+
+    def _seek_and_grab(self, pts_ms: float) -> Optional[int]:
+        """pts_ms へシークして1フレーム grab し、実際に得られたフレーム番号を返す"""
+        self.cap.set(cv2.CAP_PROP_POS_MSEC, float(pts_ms))
+        self.stats['seeks'] += 1
+        if not self.cap.grab():
+            return None
+        return self.frame_index.nearest_frame(self.cap.get(cv2.CAP_PROP_POS_MSEC))
+
+    def _read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, frame = self.cap.read()
+        if ret:
+            self.next_frame_index += 1
+            self.stats['reads'] += 1
+        return ret, frame
+
+
+def make_proxy(frame: np.ndarray, max_width: int = 0, max_side: int = 0) -> np.ndarray:
+    """縮小したプロキシ画像を返す
+
+    max_width は幅、max_side は長辺の上限（px）。0 または原寸以下ならそのまま返す。
+    """
+    h, w = frame.shape[:2]
+    scale = 1.0
+    if max_width > 0 and w > max_width:
+        scale = max_width / w
+    if max_side > 0 and max(h, w) * scale > max_side:
+        scale = max_side / max(h, w)
+    if scale >= 1.0:
+        return frame
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def make_proxy_gray(frame: np.ndarray, max_width: int = 0, max_side: int = 0) -> np.ndarray:
+    """make_proxy で縮小したグレースケール画像を返す（動き推定・事前フィルタ・面の除外判定用）"""
+    small = make_proxy(frame, max_width=max_width, max_side=max_side)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small
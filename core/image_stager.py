@@ -0,0 +1,136 @@
+# core/image_stager.py - RealityScan 用画像フォルダへの差分配置
+import errno
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows には fcntl が無い（reflink は使わない）
+    fcntl = None
+
+# Linux の FICLONE ioctl（Btrfs / XFS などで reflink を作る）
+FICLONE = 0x40049409
+
+# 配置方法（先頭から順に試す）
+STAGING_METHODS = ('hardlink', 'reflink', 'symlink', 'copy')
+
+# ファイルシステム・権限としてその方法が使えないことを示すエラー（以降その方法は使わない）
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK}
+# reflink 非対応のファイルシステムでは ioctl 自体が拒否される
+UNSUPPORTED_REFLINK_ERRNOS = UNSUPPORTED_ERRNOS | {errno.EINVAL, errno.ENOTTY}
+
+
+@dataclass
+class StagingReport:
+    """1回の配置処理の結果"""
+    added: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    missing: int = 0
+    methods: Dict[str, int] = field(default_factory=dict)
+    bytes_copied: int = 0
+    elapsed_sec: float = 0.0
+
+    def summary(self) -> str:
+        return (f"追加 {self.added} {self.methods}, 削除 {self.removed}, 既存 {self.unchanged}, "
+                f"欠損 {self.missing}, コピー {self.bytes_copied / (1024 * 1024):.1f} MB, {self.elapsed_sec:.2f}秒")
+
+
+class ImageStager:
+    """画像をフォルダへ差分で配置するクラス
+
+    配置済みのファイルを (元パス, サイズ, 更新時刻) で記録し、呼び出しごとに新しい画像の追加と
+    不要になった画像の削除だけを行う。ファイルはハードリンク → reflink → シンボリックリンク →
+    コピーの順に試す。ファイルシステムや権限として使えない方法はそれ以降使わず、
+    ファイルごとの一時的なエラーではそのファイルだけ次の方法で配置する。
+    """
+
+    def __init__(self, stage_dir: Path):
+        self.stage_dir = Path(stage_dir)
+        self.logger = logging.getLogger(__name__)
+        self._staged: Dict[str, Tuple[str, int, int]] = {}
+        self._methods: List[str] = list(STAGING_METHODS if fcntl is not None
+                                        else (m for m in STAGING_METHODS if m != 'reflink'))
+
+    @property
+    def staged_names(self) -> List[str]:
+        return sorted(self._staged)
+
+    def stage(self, sources: Iterable[Path]) -> StagingReport:
+        """フォルダの中身を sources と同じ集合にする"""
+        start = time.perf_counter()
+        report = StagingReport()
+        self.stage_dir.mkdir(parents=True, exist_ok=True)
+
+        wanted: Dict[str, Path] = {}
+        for src in sources:
+            src = Path(src)
+            if not src.exists():
+                self.logger.warning(f"画像ファイルが見つかりません: {src}")
+                report.missing += 1
+                continue
+            wanted[src.name] = src
+
+        for name in [n for n in self._staged if n not in wanted]:
+            (self.stage_dir / name).unlink(missing_ok=True)
+            del self._staged[name]
+            report.removed += 1
+
+        for name, src in wanted.items():
+            stat = src.stat()
+            signature = (str(src.resolve()), stat.st_size, stat.st_mtime_ns)
+            dst = self.stage_dir / name
+            if self._staged.get(name) == signature and os.path.lexists(dst):
+                report.unchanged += 1
+                continue
+            if os.path.lexists(dst):
+                dst.unlink()
+            method = self._place(src, dst)
+            self._staged[name] = signature
+            report.added += 1
+            report.methods[method] = report.methods.get(method, 0) + 1
+            if method == 'copy':
+                report.bytes_copied += stat.st_size
+
+        report.elapsed_sec = time.perf_counter() - start
+        return report
+
+    def _place(self, src: Path, dst: Path) -> str:
+        for method in list(self._methods):
+            if method == 'copy':
+                shutil.copyfile(src, dst)
+                return method
+            try:
+                if method == 'hardlink':
+                    os.link(src, dst)
+                elif method == 'reflink':
+                    self._reflink(src, dst)
+                else:
+                    os.symlink(src.resolve(), dst)
+                return method
+            except (OSError, NotImplementedError) as e:
+                if self._is_unsupported(method, e):
+                    self.logger.debug(f"{method} で配置できないため以降は使用しません: {e}")
+                    self._methods.remove(method)
+                else:
+                    self.logger.debug(f"{method} で配置できなかったため次の方法を試します: {src.name}: {e}")
+                if os.path.lexists(dst):
+                    dst.unlink()
+        raise RuntimeError(f"画像を配置できませんでした: {src}")
+
+    @staticmethod
+    def _is_unsupported(method: str, error: Exception) -> bool:
+        if isinstance(error, NotImplementedError):
+            return True
+        unsupported = UNSUPPORTED_REFLINK_ERRNOS if method == 'reflink' else UNSUPPORTED_ERRNOS
+        return error.errno in unsupported
+
+    @staticmethod
+    def _reflink(src: Path, dst: Path):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
@@ -0,0 +1,159 @@
+# core/image_writer.py - 非同期画像書き出し
+import cv2
+import numpy as np
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, Union
+import logging
+
+from models.config_models import OutputConfig
+
+try:
+    from turbojpeg import TurboJPEG
+except ImportError:  # PyTurboJPEG は任意依存
+    TurboJPEG = None
+
+
+class ImageEncoder:
+    """画像を指定形式のバイト列にエンコードする基底クラス"""
+    extension = '.jpg'
+
+    def encode(self, image: np.ndarray) -> bytes:
+        raise NotImplementedError
+
+
+class OpenCVEncoder(ImageEncoder):
+    """cv2.imencode による汎用エンコーダ"""
+
+    def __init__(self, extension: str, params: list):
+        self.extension = extension
+        self.params = params
+
+    def encode(self, image: np.ndarray) -> bytes:
+        ok, buf = cv2.imencode(self.extension, image, self.params)
+        if not ok:
+            raise RuntimeError(f"画像のエンコードに失敗しました ({self.extension})")
+        return buf.tobytes()
+
+
+class TurboJpegEncoder(ImageEncoder):
+    """libjpeg-turbo (PyTurboJPEG) による高速JPEGエンコーダ"""
+    extension = '.jpg'
+
+    def __init__(self, quality: int):
+        self.quality = quality
+        self._jpeg = TurboJPEG()
+
+    def encode(self, image: np.ndarray) -> bytes:
+        return self._jpeg.encode(image, quality=self.quality)
+
+
+def _create_jpeg_encoder(quality: int) -> ImageEncoder:
+    if TurboJPEG is not None:
+        try:
+            return TurboJpegEncoder(quality)
+        except Exception as e:  # ライブラリ本体 (libturbojpeg) が見つからない場合など
+            logging.getLogger(__name__).debug(f"TurboJPEGを利用できません: {e}")
+    return OpenCVEncoder('.jpg', [cv2.IMWRITE_JPEG_QUALITY, quality])
+
+
+_ENCODERS: Dict[str, Callable[[int], ImageEncoder]] = {
+    'jpeg': _create_jpeg_encoder,
+    'jpg': _create_jpeg_encoder,
+    'png': lambda quality: OpenCVEncoder('.png', [cv2.IMWRITE_PNG_COMPRESSION, 3]),
+    'webp': lambda quality: OpenCVEncoder('.webp', [cv2.IMWRITE_WEBP_QUALITY, quality]),
+}
+
+
+def register_encoder(image_format: str, factory: Callable[[int], ImageEncoder]):
+    """画像形式に対するエンコーダを登録する（factory は quality を受け取る）"""
+    _ENCODERS[image_format.lower()] = factory
+
+
+def create_encoder(image_format: str, quality: int) -> ImageEncoder:
+    factory = _ENCODERS.get(image_format.lower())
+    if factory is None:
+        raise ValueError(f"未対応の画像形式です: {image_format}")
+    return factory(quality)
+
+
+class ImageWriter:
+    """バックグラウンドのワーカープールで画像をエンコード・保存するクラス
+
+    未完了の書き出しが max_backlog に達すると submit() はブロックする。
+    flush() は投入済みの全書き出しがディスクに反映されるまで待つ。
+    """
+
+    def __init__(self, config: OutputConfig, workers: Optional[int] = None, max_backlog: Optional[int] = None):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.encoder = create_encoder(config.image_format, config.image_quality)
+        self.workers = max(1, workers or config.writer_workers)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-writer')
+        self._backlog = threading.BoundedSemaphore(max(1, max_backlog or config.writer_max_backlog))
+        self._pending: Set[Future] = set()
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def extension(self) -> str:
+        return self.encoder.extension
+
+    def image_path(self, directory: Union[str, Path], stem: str) -> Path:
+        """出力形式の拡張子を付けた保存先パスを返す"""
+        return Path(directory) / f"{stem}{self.extension}"
+
+    def submit(self, image: np.ndarray, path: Union[str, Path]) -> Future:
+        """画像の書き出しを非同期に投入する"""
+        self._backlog.acquire()
+        try:
+            future = self._executor.submit(self._write, image, Path(path))
+        except Exception:
+            self._backlog.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def write(self, image: np.ndarray, path: Union[str, Path]) -> Path:
+        """画像を同期的に書き出す"""
+        self.submit(image, path).result()
+        return Path(path)
+
+    def flush(self):
+        """投入済みの書き出しが全て完了するまで待つ。失敗があれば最初の例外を送出する"""
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                break
+            for future in pending:
+                future.exception()
+
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _write(self, image: np.ndarray, path: Path):
+        data = self.encoder.encode(image)
+        # cv2.imwrite と異なり非ASCIIパスでも書き出せる
+        path.write_bytes(data)
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+            error = future.exception()
+            if error is not None and self._error is None:
+                self.logger.error(f"画像の書き出しに失敗しました: {error}")
+                self._error = error
+        self._backlog.release()
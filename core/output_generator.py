@@ -1,5 +1,4 @@
 # core/output_generator.py - 3DGS用出力生成
-import pandas as pd
 import numpy as np
 from pathlib import Path
 import shutil
@@ -9,6 +8,19 @@ import logging
 import cv2
 
 from models.config_models import OutputConfig
+from models.data_models import component_pose_arrays
+from .image_writer import ImageWriter
+
+def _json_default(value: Any) -> Any:
+    """json.dump が扱えない値（配列ベースのレコードや NumPy の値）を変換する"""
+    if hasattr(value, 'to_list'):
+        return value.to_list()
+    if hasattr(value, 'to_dicts'):
+        return value.to_dicts()
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
 
 class OutputGenerator:
     """3D Gaussian Splatting用データ出力クラス"""
@@ -16,6 +28,7 @@ class OutputGenerator:
     def __init__(self, config: OutputConfig):
         self.config = config
         self.logger = logging.getLogger(__name__)
+        self.image_writer = ImageWriter(self.config)
     
     def generate_3dgs_dataset(self, alignment_result: Dict[str, Any], 
                              output_dir: str) -> Dict[str, Any]:
@@ -44,6 +57,9 @@ class OutputGenerator:
         results['metadata'] = self._generate_metadata(alignment_result, dataset_structure['root'])
         results['equirectangular'] = self._generate_equirectangular_image(alignment_result, dataset_structure['root'])
 
+        # 非同期書き出し中の画像がすべてディスクに反映されるまで待つ
+        self.image_writer.flush()
+
         self.logger.info("3DGSデータセット生成完了")
         return {
             'output_path': str(output_path),
@@ -117,14 +133,19 @@ class OutputGenerator:
         metadata_path = output_dir / 'metadata.json'
         self.logger.info(f"メタデータを {metadata_path} に出力中...")
         try:
+            # 配列ベースの components（ComponentList）は辞書リストに戻して書き出す
             serializable_result = {
-                k: v for k, v in alignment_result.items() 
-                if isinstance(v, (str, int, float, bool, list, dict, type(None)))
+                k: v.to_list() if hasattr(v, 'to_list') else v for k, v in alignment_result.items()
+                if hasattr(v, 'to_list') or isinstance(v, (str, int, float, bool, list, dict, type(None)))
             }
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(serializable_result, f, indent=4, ensure_ascii=False)
+            # 途中で失敗しても壊れた metadata.json を残さないよう、一時ファイルに書いてから置き換える
+            tmp_path = metadata_path.with_name(metadata_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(serializable_result, f, indent=4, ensure_ascii=False, default=_json_default)
+            tmp_path.replace(metadata_path)
             return str(metadata_path)
         except Exception as e:
+            metadata_path.with_name(metadata_path.name + '.tmp').unlink(missing_ok=True)
             self.logger.error(f"メタデータの保存中にエラーが発生しました: {e}")
             return f"Error saving metadata: {e}"
 
@@ -140,16 +161,16 @@ class OutputGenerator:
 
         # 最大のコンポーネントを選択
         main_component = max(components, key=lambda c: c['image_count'])
-        images_data = main_component.get('images', [])
-        if not images_data:
+        _, image_paths, rotations, positions = component_pose_arrays(main_component)
+        if not image_paths:
             self.logger.warning("コンポーネントに画像情報がないため、正距円筒図を生成できません。")
             return "Skipped (no images in component)"
 
         # 2. カメラの内部・外部パラメータと画像パスを準備
         try:
-            first_image = cv2.imread(images_data[0]['path'])
+            first_image = cv2.imread(image_paths[0])
             if first_image is None:
-                raise FileNotFoundError(f"画像ファイルが読み込めません: {images_data[0]['path']}")
+                raise FileNotFoundError(f"画像ファイルが読み込めません: {image_paths[0]}")
             img_h, img_w, _ = first_image.shape
 
             # 視野角90度を仮定して焦点距離を計算
@@ -158,12 +179,10 @@ class OutputGenerator:
             K = np.array([[focal_length, 0, img_w / 2], [0, focal_length, img_h / 2], [0, 0, 1]])
 
             cameras = []
-            for img_data in images_data:
-                R_cw = np.array(img_data['pose']['rotation'])
-                C_w = np.array([img_data['pose']['tx'], img_data['pose']['ty'], img_data['pose']['tz']])
+            for path, R_cw, C_w in zip(image_paths, rotations, positions):
                 R_wc = R_cw.T
                 t_wc = -R_wc @ C_w
-                cameras.append({'path': img_data['path'], 'R': R_wc, 't': t_wc, 'C': C_w, 'view_dir': R_cw[:, 2]})
+                cameras.append({'path': path, 'R': R_wc, 't': t_wc, 'C': C_w, 'view_dir': R_cw[:, 2]})
         except (KeyError, IndexError, FileNotFoundError) as e:
             self.logger.error(f"カメラパラメータの準備中にエラー: {e}")
             return f"Skipped (error preparing camera data: {e})"
@@ -232,8 +251,9 @@ class OutputGenerator:
             equirectangular_image[eq_coords_valid[:, 0], eq_coords_valid[:, 1]] = colors
 
         # 6. 結果を保存
+        # 既存の利用側が参照するファイル名（設定の image_format そのままの拡張子）を保つ
         output_path = output_dir / f"equirectangular.{self.config.image_format}"
         self.logger.info(f"正距円筒図を保存中: {output_path}")
-        cv2.imwrite(str(output_path), equirectangular_image, [cv2.IMWRITE_JPEG_QUALITY, self.config.image_quality])
+        self.image_writer.submit(equirectangular_image, output_path)
 
         return str(output_path)
\ No newline at end of file
@@ -0,0 +1,269 @@
+# core/phash_index.py - 知覚ハッシュによる近似重複画像インデックス
+import cv2
+import numpy as np
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from models.config_models import DedupeConfig
+from utils.file_utils import process_file_lock
+
+INDEX_FILENAME = 'phash_index.json'
+
+
+def dhash(image: np.ndarray, hash_size: int = 8) -> int:
+    """差分ハッシュ（隣接画素の大小関係）を64bit整数で返す"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return _bits_to_int(bits)
+
+
+def phash(image: np.ndarray, hash_size: int = 8) -> int:
+    """DCT低周波成分の中央値比較による知覚ハッシュを64bit整数で返す"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(small))[:hash_size, :hash_size]
+    # 直流成分を除いた中央値で2値化する
+    bits = (low > np.median(low.ravel()[1:])).ravel()
+    return _bits_to_int(bits)
+
+
+HASH_FUNCTIONS = {'dhash': dhash, 'phash': phash}
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+class BKTree:
+    """ハミング距離による BK-tree（距離 d 以内の近傍探索）"""
+
+    def __init__(self):
+        # node = [hash, payloads, {distance: child}]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, payload: Any):
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [payload], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [payload], {}]
+                return
+            node = child
+
+    def remove(self, value: int, payload: Any) -> bool:
+        """value のノードから payload を取り除く（ノード自体は探索用に残す）"""
+        node = self._root
+        while node is not None:
+            d = hamming(value, node[0])
+            if d == 0:
+                for i, p in enumerate(node[1]):
+                    if p is payload:
+                        del node[1][i]
+                        self._size -= 1
+                        return True
+                return False
+            node = node[2].get(d)
+        return False
+
+    def query(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """距離 max_distance 以内の (距離, payload) を距離順に返す"""
+        if self._root is None:
+            return []
+        results = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= max_distance:
+                results.extend((d, payload) for payload in node[1])
+            # 三角不等式により |d - k| <= max_distance の子だけを探索する
+            for k, child in node[2].items():
+                if d - max_distance <= k <= d + max_distance:
+                    stack.append(child)
+        results.sort(key=lambda r: r[0])
+        return results
+
+
+class PerceptualHashIndex:
+    """出力ディレクトリに永続化される近似重複画像インデックス
+
+    各エントリは 'hash' と画像の識別情報（video_source, timestamp, face, image_path）を持つ。
+    同じ識別情報（同じ動画・時刻・面）の画像は再抽出とみなし、重複扱いしない。
+    """
+
+    def __init__(self, index_path: Path, config: DedupeConfig):
+        self.index_path = Path(index_path)
+        self.config = config
+        self.hash_function = HASH_FUNCTIONS[config.hash_method]
+        self.logger = logging.getLogger(__name__)
+        self._tree = BKTree()
+        self._records: Dict[Tuple, Dict[str, Any]] = {}
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def compute_hash(self, image: np.ndarray) -> int:
+        return self.hash_function(image)
+
+    def find_duplicate(self, image_hash: int, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """entry と異なる画像で、ハッシュ距離が閾値以内のものを返す"""
+        with self._lock:
+            return self._find_duplicate(image_hash, entry)
+
+    def check_and_add(self, image: np.ndarray, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """重複があればその既存エントリを返し、無ければ entry を登録して None を返す
+
+        照合と登録は1回のロックで行う（並列ワーカーが近似重複の両方を採用しないように）。
+        """
+        image_hash = self.compute_hash(image)
+        with self._lock:
+            duplicate = self._find_duplicate(image_hash, entry)
+            if duplicate is None:
+                self._add(image_hash, entry)
+        return duplicate
+
+    def add(self, image_hash: int, entry: Dict[str, Any]):
+        with self._lock:
+            self._add(image_hash, entry)
+
+    def remove(self, entry: Dict[str, Any]):
+        """登録済みのエントリを取り除く（書き出しを取り消した画像など）"""
+        key = self._entry_key(entry)
+        with self._lock:
+            record = self._records.pop(key, None)
+            if record is None:
+                return
+            self._tree.remove(int(record['hash'], 16), record)
+            self._removed.add(key)
+            self._dirty = True
+
+    def save(self):
+        """インデックスを保存する
+
+        他のプロセスが保存した分はファイルロックの中で読み直してマージし（メモリ上の索引にも取り込む）、
+        プロセスごとに別名の一時ファイルへ書いてから置き換える。保存に失敗しても抽出結果は失わない。
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = None
+            try:
+                with process_file_lock(self.index_path.with_name(self.index_path.name + '.lock')):
+                    self._merge_entries(self._read_file())
+                    data = {'hash_method': self.config.hash_method, 'entries': list(self._records.values())}
+                    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.index_path.parent,
+                                                     prefix=self.index_path.stem + '.', suffix='.tmp',
+                                                     delete=False) as f:
+                        tmp_path = Path(f.name)
+                        json.dump(data, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.index_path)
+                self._dirty = False
+            except OSError as e:
+                if tmp_path is not None:
+                    tmp_path.unlink(missing_ok=True)
+                self.logger.warning(f"知覚ハッシュインデックスを保存できませんでした: {e}")
+
+    def reload(self):
+        """他のプロセスが保存したエントリを取り込む"""
+        with self._lock:
+            self._merge_entries(self._read_file())
+
+    def cross_source_duplicates(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """entries を順に見て、先に現れた別の動画の画像と重複するものを返す
+
+        並列ワーカーは互いの抽出結果を見られないため、マージ後にこれで動画間の重複を除く
+        （順次処理で後の動画が先の動画と照合されるのと同じ結果になる）。
+        """
+        tree = BKTree()
+        duplicates = []
+        with self._lock:
+            for entry in entries:
+                record = self._records.get(self._entry_key(entry))
+                if record is None:
+                    continue
+                image_hash = int(record['hash'], 16)
+                if any(other.get('video_source') != entry.get('video_source')
+                       for _, other in tree.query(image_hash, self.config.max_distance)):
+                    duplicates.append(entry)
+                else:
+                    tree.add(image_hash, record)
+        return duplicates
+
+    def _find_duplicate(self, image_hash: int, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self._entry_key(entry)
+        for _, other in self._tree.query(image_hash, self.config.max_distance):
+            if self._entry_key(other) != key:
+                return other
+        return None
+
+    def _add(self, image_hash: int, entry: Dict[str, Any]):
+        record = {'hash': f"{image_hash:016x}", **entry}
+        key = self._entry_key(record)
+        if key in self._records:
+            return
+        self._records[key] = record
+        self._removed.discard(key)
+        self._tree.add(image_hash, record)
+        self._dirty = True
+
+    def _load(self):
+        self._merge_entries(self._read_file())
+        if self._records:
+            self.logger.info(f"知覚ハッシュインデックスを読み込みました: {len(self._records)}件 ({self.index_path})")
+
+    def _merge_entries(self, entries: List[Dict[str, Any]]):
+        """ファイルのエントリのうち未登録のもの（このインスタンスで削除したものを除く）を取り込む"""
+        for entry in entries:
+            key = self._entry_key(entry)
+            if key in self._records or key in self._removed:
+                continue
+            self._records[key] = entry
+            self._tree.add(int(entry['hash'], 16), entry)
+
+    def _read_file(self) -> List[Dict[str, Any]]:
+        if not self.index_path.exists():
+            return []
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"知覚ハッシュインデックスを読み込めませんでした: {e}")
+            return []
+        if data.get('hash_method') != self.config.hash_method:
+            # ハッシュ方式が異なると距離に意味がないため破棄する
+            return []
+        return data.get('entries', [])
+
+    @staticmethod
+    def _entry_key(entry: Dict[str, Any]) -> Tuple:
+        return (entry.get('video_source'), round(float(entry.get('timestamp', 0.0)), 3), entry.get('face'))
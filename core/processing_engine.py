@@ -1,6 +1,9 @@
 # core/processing_engine.py - 処理エンジン
 import subprocess
 import json
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import logging
@@ -8,9 +11,29 @@ import logging
 from models.config_models import AppConfig
 from .video_extractor import VideoExtractor
 from .quality_filter import QualityFilter
-from .realityscan_interface import RealityScanInterface
+from .realityscan_scheduler import AlignmentJob, RealityScanScheduler
 from .output_generator import OutputGenerator
 
+
+def _extract_video_worker(config: AppConfig, video_index: int, video_path: str, target_count: int,
+                          confidence: float, area_threshold: float, output_dir: str,
+                          stop_event, progress_queue) -> List[Dict[str, Any]]:
+    """ワーカープロセスで1本の動画からフレームを抽出する"""
+    # 各ワーカーは独自の VideoExtractor / QualityFilter を持つ
+    video_extractor = VideoExtractor(config)
+    quality_filter = QualityFilter(config.yolo)
+    return video_extractor.extract_adaptive_frames(
+        video_path,
+        target_count,
+        quality_filter,
+        confidence,
+        area_threshold,
+        output_dir,
+        stop_check=stop_event.is_set,
+        progress_callback=lambda ratio: progress_queue.put((video_index, ratio))
+    )
+
+
 class ProcessingEngine:
     """メイン処理エンジン"""
     
@@ -20,8 +43,14 @@ class ProcessingEngine:
         
         # 各処理モジュール初期化
         self.video_extractor = VideoExtractor(self.config)
+        # YOLOモデルは最初の推論まで読み込まない（同じプロセスの他のエンジンとも共有される）
         self.quality_filter = QualityFilter(self.config.yolo)
-        self.realityscan = RealityScanInterface(self.config.realityscan)
+        if self.config.yolo.background_warmup:
+            self.quality_filter.warm_up()
+        # RealityScan は max_instances 個まで同時に実行できる
+        self.realityscan_scheduler = RealityScanScheduler(
+            self.config.realityscan, progress_callback=self._update_alignment_progress
+        )
         self.output_generator = OutputGenerator(self.config.output)
         
         # 進捗管理
@@ -68,13 +97,33 @@ class ProcessingEngine:
         """初期フレーム抽出"""
         self.progress_info['current_phase'] = '初期フレーム抽出中'
         
-        all_frames = []
         target_per_video = self.config.processing.target_images_per_video // len(selected_videos)
         
         # GUIからのフィルタリング設定を取得
         confidence = self.config.yolo.filtering.person.confidence_threshold
         area_threshold = self.config.yolo.filtering.person.area_ratio_threshold
 
+        max_workers = min(self.config.processing.extraction_workers, len(selected_videos))
+        if max_workers > 1:
+            all_frames = self._extract_frames_parallel(
+                selected_videos, target_per_video, confidence, area_threshold, output_dir, max_workers
+            )
+        else:
+            all_frames = self._extract_frames_sequential(
+                selected_videos, target_per_video, confidence, area_threshold, output_dir
+            )
+        
+        self.progress_info['total_images'] = len(all_frames)
+        self.logger.info(f"初期フレーム抽出完了: {len(all_frames)}枚")
+        
+        return all_frames
+
+    def _extract_frames_sequential(self, selected_videos: List[str], target_per_video: int, confidence: float,
+                                   area_threshold: float, output_dir: str) -> List[Dict[str, Any]]:
+        """動画を1本ずつ順番に処理する"""
+        all_frames = []
+        video_progress = [0.0] * len(selected_videos)
+
         for i, video_path in enumerate(selected_videos):
             if self.stop_requested:
                 break
@@ -87,18 +136,83 @@ class ProcessingEngine:
                 self.quality_filter,
                 confidence,
                 area_threshold,
-                output_dir
+                output_dir,
+                stop_check=lambda: self.stop_requested,
+                progress_callback=lambda ratio, i=i: self._update_video_progress(video_progress, i, ratio)
             )
             
             all_frames.extend(frames)
             
             # 進捗更新
-            self.progress_info['phase_progress'] = (i + 1) / len(selected_videos) * 100
-        
-        self.progress_info['total_images'] = len(all_frames)
-        self.logger.info(f"初期フレーム抽出完了: {len(all_frames)}枚")
-        
+            self._update_video_progress(video_progress, i, 1.0)
+
         return all_frames
+
+    def _extract_frames_parallel(self, selected_videos: List[str], target_per_video: int, confidence: float,
+                                 area_threshold: float, output_dir: str, max_workers: int) -> List[Dict[str, Any]]:
+        """動画ごとにワーカープロセスを割り当てて並列に処理する"""
+        self.logger.info(f"{len(selected_videos)}本の動画を{max_workers}プロセスで並列抽出します。")
+        video_progress = [0.0] * len(selected_videos)
+        results: Dict[int, List[Dict[str, Any]]] = {}
+
+        # CUDA/torch を読み込んだ親プロセスを fork しないよう spawn を使う
+        mp_context = multiprocessing.get_context('spawn')
+        with mp_context.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            stop_event = manager.Event()
+            progress_queue = manager.Queue()
+
+            futures = {
+                executor.submit(
+                    _extract_video_worker, self.config, i, video_path, target_per_video,
+                    confidence, area_threshold, output_dir, stop_event, progress_queue
+                ): i
+                for i, video_path in enumerate(selected_videos)
+            }
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+
+                if self.stop_requested and not stop_event.is_set():
+                    self.logger.info("停止要求をワーカープロセスに通知します。")
+                    stop_event.set()
+
+                self._drain_progress_queue(progress_queue, video_progress)
+
+                for future in done:
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        self.logger.error(f"動画の抽出に失敗しました: {Path(selected_videos[i]).name}: {e}")
+                        results[i] = []
+                    self._update_video_progress(video_progress, i, 1.0)
+                    self.logger.info(f"動画{i+1}/{len(selected_videos)}の抽出完了: {len(results[i])}枚")
+
+            self._drain_progress_queue(progress_queue, video_progress)
+
+        # 完了順に関係なく動画の指定順でマージする
+        all_frames = []
+        for i in range(len(selected_videos)):
+            all_frames.extend(results.get(i, []))
+        # ワーカー同士は互いの抽出結果と照合できないため、動画間の重複はマージ後に除く
+        return self.video_extractor.drop_cross_video_duplicates(all_frames, output_dir)
+
+    def _drain_progress_queue(self, progress_queue, video_progress: List[float]):
+        """ワーカーから届いた進捗を反映する"""
+        while True:
+            try:
+                i, ratio = progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._update_video_progress(video_progress, i, ratio)
+
+    def _update_video_progress(self, video_progress: List[float], index: int, ratio: float):
+        """動画ごとの進捗からフェーズ進捗を更新する"""
+        video_progress[index] = max(video_progress[index], min(ratio, 1.0))
+        self.progress_info['video_progress'] = list(video_progress)
+        self.progress_info['phase_progress'] = sum(video_progress) / len(video_progress) * 100
     
     def _adaptive_alignment_process(self, initial_frames: List[Dict[str, Any]], output_dir: str) -> Dict[str, Any]:
         """適応的アライメント処理"""
@@ -127,15 +241,21 @@ class ProcessingEngine:
             except Exception:
                 images_to_pass = current_images
 
-            alignment_result = self.realityscan.run_alignment(images_to_pass)
+            alignment_result = self._run_alignment(images_to_pass)
             
             # 結果評価
             quality_score = self._calculate_quality_score(alignment_result)
+            staging = self.realityscan_scheduler.instance(alignment_result['slot']).last_staging
             iteration_history.append({
                 'iteration': iteration_count,
                 'image_count': len(current_images),
                 'component_count': len(alignment_result['components']),
-                'quality_score': quality_score
+                'quality_score': quality_score,
+                'alignment_status': alignment_result.get('status', 'completed'),
+                'alignment_cached': alignment_result.get('cached', False),
+                # 画像フォルダへの配置でコピーしたバイト数と所要時間（リンクできた分は 0）
+                'staging_bytes_copied': staging.bytes_copied if staging else 0,
+                'staging_sec': staging.elapsed_sec if staging else 0.0
             })
             
             # 終了条件チェック
@@ -164,6 +284,28 @@ class ProcessingEngine:
         
         return alignment_result
     
+    def _run_alignment(self, images: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """iteration_qualities の各品質でアライメントを並列実行し、品質スコアが最良の結果を返す"""
+        qualities = self.config.realityscan.iteration_qualities or ['normal']
+        self.progress_info['realityscan_progress'] = {q: 0.0 for q in qualities}
+        self.progress_info['phase_progress'] = 0
+        results = self.realityscan_scheduler.run([AlignmentJob(slot=q, images=images, quality=q) for q in qualities],
+                                                 stop_check=lambda: self.stop_requested)
+        candidates = [r for r in results if r.get('status') != 'cancelled'] or results
+        best = max(candidates, key=self._calculate_quality_score)
+        if len(results) > 1:
+            scores = {r['quality']: round(self._calculate_quality_score(r), 3) for r in results}
+            self.logger.info(f"アライメント候補の品質スコア: {scores} → {best['quality']} を採用")
+        self.realityscan_scheduler.share_result(best)
+        return best
+
+    def _update_alignment_progress(self, slot: str, percent: float, line: str):
+        """RealityScan の出力から読み取った進捗をフェーズ進捗に反映する（出力スレッドから呼ばれる）"""
+        slot_progress = dict(self.progress_info.get('realityscan_progress') or {})
+        slot_progress[slot] = max(slot_progress.get(slot, 0.0), percent)
+        self.progress_info['realityscan_progress'] = slot_progress
+        self.progress_info['phase_progress'] = sum(slot_progress.values()) / len(slot_progress)
+
     def _should_stop_iteration(self, alignment_result: Dict[str, Any], 
                               iteration_history: List[Dict[str, Any]]) -> tuple[bool, str]:
         """反復終了判定"""
@@ -203,7 +345,8 @@ class ProcessingEngine:
         """追加画像選定"""
         # 実装: コンポーネント分析に基づく追加画像選定
         problem_areas = self._analyze_alignment_problems(alignment_result, all_images)
-        additional_images = self.video_extractor.extract_targeted_frames(problem_areas, output_dir)
+        additional_images = self.video_extractor.extract_targeted_frames(problem_areas, output_dir,
+                                                                          existing_images=all_images)
         
         return additional_images
     
@@ -310,4 +453,4 @@ class ProcessingEngine:
     def stop_processing(self):
         """処理停止要求"""
         self.stop_requested = True
-        self.realityscan.abort_current_process()
\ No newline at end of file
+        self.realityscan_scheduler.cancel()
\ No newline at end of file
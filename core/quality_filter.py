@@ -1,64 +1,179 @@
 # core/quality_filter.py - YOLO画像品質フィルタ
-import torch
-from ultralytics import YOLO
-import cv2
 import numpy as np
-from typing import Dict, List, Any, Tuple
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Any, Optional
 import logging
 
 from models.config_models import YoloConfig
+from models.data_models import DetectionRecord, FrameVerdict
+from .yolo_backends import DetectorBackend, default_cache_dir, get_shared_backend
+from .detection_cache import CacheKey, DetectionCache, EntryKey
 
 class QualityFilter:
-    """YOLO画像品質フィルタリングクラス"""
+    """YOLO画像品質フィルタリングクラス
+
+    torch / ultralytics の読み込みとモデルのロードは最初の推論（または warm_up()）まで遅延し、
+    同じモデル設定のインスタンス間ではプロセス内で1つのモデルを共有する。全フレームが検出キャッシュに
+    ある場合は、キャッシュに保存したクラス名の対応表で判定するのでモデルを読み込まない。
+    """
     
     def __init__(self, config: YoloConfig):
         self.config = config
         self.logger = logging.getLogger(__name__)
-        
-        # YOLOモデル初期化
-        self.logger.info(f"YOLOモデルを読み込んでいます: {self.config.model_name}")
+        self._backend: Optional[DetectorBackend] = None
+        self._class_ids: Optional[List[int]] = None
+        self._class_names: Optional[Dict[int, str]] = None
+        self._load_lock = threading.Lock()
+        self.detection_cache = self._open_detection_cache()
+
+    @property
+    def backend(self) -> DetectorBackend:
+        if self._backend is None:
+            with self._load_lock:
+                if self._backend is None:
+                    self._backend = self._load_backend()
+                    if self.detection_cache is not None:
+                        self.detection_cache.put_class_names(self._backend.names)
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: DetectorBackend):
+        self._backend = backend
+
+    @property
+    def class_names(self) -> Dict[int, str]:
+        """モデルのクラス名（モデル未読み込みなら検出キャッシュに保存した対応表を使う）"""
+        if self._backend is not None:
+            return self._backend.names
+        if self._class_names is None and self.detection_cache is not None:
+            self._class_names = self.detection_cache.get_class_names()
+        if self._class_names is None:
+            return self.backend.names
+        return self._class_names
+
+    @property
+    def class_ids(self) -> List[int]:
+        if self._class_ids is None:
+            self._class_ids = self._resolve_class_ids(self.config.filtering.enabled_classes)
+        return self._class_ids
+
+    @class_ids.setter
+    def class_ids(self, class_ids: List[int]):
+        self._class_ids = class_ids
+
+    def _load_backend(self) -> DetectorBackend:
+        # YOLOモデル初期化（推論バックエンドは config.backend で選択）
+        self.logger.info(f"YOLOモデルを読み込んでいます: {self.config.model_name} (バックエンド: {self.config.backend})")
         try:
-            self.model = YOLO(self.config.model_name)
-            if torch.cuda.is_available() and self.config.device == 'cuda':
-                self.logger.info("CUDAが利用可能です。モデルをGPUに転送します。")
-                self.model.to('cuda')
-            else:
-                self.logger.info("CUDAが利用不可、または設定で無効化されています。CPUで実行します。")
+            return get_shared_backend(self.config)
         except Exception as e:
             self.logger.error(f"YOLOモデルの読み込みに失敗しました: {e}")
             raise
 
+    @property
+    def is_loaded(self) -> bool:
+        return self._backend is not None
+
+    def warm_up(self) -> threading.Thread:
+        """バックグラウンドスレッドでモデルを読み込んでおく（失敗時は最初の推論で改めて例外になる）"""
+        def load():
+            try:
+                self.backend
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=load, name='yolo-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def _open_detection_cache(self) -> Optional[DetectionCache]:
+        if not self.config.detection_cache_enabled:
+            return None
+        path = Path(self.config.detection_cache_path) if self.config.detection_cache_path \
+            else default_cache_dir() / 'detections.sqlite3'
+        try:
+            return DetectionCache(path, self.config.model_name, self.config.imgsz,
+                                  max_bytes=self.config.detection_cache_mb * 1024 * 1024, backend=self.config.backend)
+        except sqlite3.Error as e:
+            self.logger.warning(f"検出キャッシュを開けませんでした（キャッシュなしで続行します）: {e}")
+            return None
+
+    def cache_stats(self) -> Dict[str, float]:
+        """検出キャッシュのヒット・ミス数など"""
+        return self.detection_cache.stats_summary() if self.detection_cache is not None else {}
+
+    def _resolve_class_ids(self, class_names: List[str]) -> List[int]:
+        """enabled_classes のクラス名をモデルのクラスIDに変換する"""
+        name_to_id = {name: class_id for class_id, name in self.class_names.items()}
+        class_ids = []
+        for name in class_names:
+            if name in name_to_id:
+                class_ids.append(name_to_id[name])
+            else:
+                self.logger.warning(f"モデルに存在しないクラスのため判定対象から除外します: {name}")
+        return class_ids
+
     def is_frame_acceptable(self, image: np.ndarray, confidence_threshold: float, area_ratio_threshold: float) -> bool:
-        """フレームが品質基準を満たしているか判定する"""
+        """フレームが品質基準を満たしているか判定する
+
+        面積比は正規化座標で計算するため、縮小したプロキシ画像を渡しても結果は変わらない。
+        """
         if image is None:
             return False
+        return self.evaluate_batch([image], confidence_threshold, area_ratio_threshold)[0].accepted
+
+    def evaluate_batch(self, images: List[np.ndarray], confidence_threshold: float,
+                       area_ratio_threshold: float,
+                       cache_keys: Optional[List[Optional[CacheKey]]] = None) -> List[FrameVerdict]:
+        """複数フレームを1回のモデル呼び出しで推論し、フレームごとの判定と検出結果を返す
+
+        cache_keys に (動画ハッシュ, タイムスタンプ) を渡すと、検出キャッシュにあるフレームは推論しない。
+        キャッシュは入力画像の幅ごとに分けて保存する（縮小プロキシの幅を変えると推論し直す）。
+        """
+        records: List[Optional[DetectionRecord]] = [None] * len(images)
+        entry_keys: List[Optional[EntryKey]] = [None] * len(images)
+        if cache_keys is not None and self.detection_cache is not None:
+            entry_keys = [(*key, image.shape[1]) if key is not None and image is not None else None
+                          for key, image in zip(cache_keys, images)]
+            cached = self.detection_cache.get_many(key for key in entry_keys if key is not None)
+            for i, key in enumerate(entry_keys):
+                if key is not None and key in cached:
+                    records[i] = cached[key]
+
+        pending = [i for i, image in enumerate(images) if records[i] is None and image is not None]
+        if pending:
+            # 1回のモデル呼び出しでまとめて推論する
+            detections = self.backend.detect([images[i] for i in pending])
+            for i, dets in zip(pending, detections):
+                records[i] = DetectionRecord.from_array(dets)
+            if self.detection_cache is not None:
+                self.detection_cache.put_many((entry_keys[i], records[i]) for i in pending
+                                              if entry_keys[i] is not None)
+
+        verdicts = []
+        for record in records:
+            if record is None:
+                verdicts.append(FrameVerdict(accepted=False, detections=DetectionRecord.empty(),
+                                             rejection_reason='no_image'))
+            else:
+                verdicts.append(self.evaluate_detections(record, confidence_threshold, area_ratio_threshold))
+        return verdicts
+
+    def evaluate_detections(self, record: DetectionRecord, confidence_threshold: float,
+                            area_ratio_threshold: float) -> FrameVerdict:
+        """検出レコードを判定する（キャッシュ済みの検出を閾値を変えて再判定する場合にも使う）"""
+        violations = record.violations(self.class_ids, confidence_threshold, area_ratio_threshold,
+                                       self.config.filtering.person.center_distance_threshold)
+        if violations.any():
+            i = int(np.argmax(violations))
+            class_name = self.class_names.get(int(record.cls[i]), str(int(record.cls[i])))
+            self.logger.debug(f"フレーム却下: {class_name}検出 (信頼度: {record.conf[i]:.2f}, "
+                              f"面積比: {record.area_ratio[i]:.2f}, 中心距離: {record.center_distance[i]:.2f}) が閾値を超えました")
+            return FrameVerdict(accepted=False, detections=record, rejection_reason=class_name)
 
-        img_height, img_width, _ = image.shape
-        total_area = img_width * img_height
-
-        # YOLOで推論実行
-        results = self.model(image, verbose=False) # verbose=Falseでログ出力を抑制
-
-        for result in results:
-            # Person class is 0 in COCO dataset
-            person_detections = result.boxes.data[result.boxes.data[:, -1] == 0]
-
-            for det in person_detections:
-                conf = det[4].item()
-                if conf >= confidence_threshold:
-                    # バウンディングボックスの面積計算
-                    x1, y1, x2, y2 = det[:4]
-                    box_width = x2 - x1
-                    box_height = y2 - y1
-                    box_area = box_width * box_height
-                    
-                    # 面積比チェック
-                    area_ratio = box_area / total_area
-                    if area_ratio >= area_ratio_threshold:
-                        self.logger.debug(f"フレーム却下: 人物検出 (信頼度: {conf:.2f}, 面積比: {area_ratio:.2f}) が閾値を超えました")
-                        return False # 基準を満たさない
-
-        return True # すべてのチェックをパス
+        return FrameVerdict(accepted=True, detections=record) # すべてのチェックをパス
 
     def update_filter_settings(self, new_settings: Dict[str, Any]):
         """フィルタ設定更新 (現在は未使用)"""
@@ -2,21 +2,56 @@
 import subprocess
 import xml.etree.ElementTree as ET
 import json
+import re
 import tempfile
+import threading
+import time
+from collections import deque
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 import logging
 from datetime import datetime
-import shutil
-import os
 import numpy as np
 
 from models.config_models import RealityScanConfig
+from models.data_models import ComponentList, component_pose_arrays
+from .alignment_cache import AlignmentCache
+from .alignment_parser import parse_alignment_xml
+from .image_stager import ImageStager, StagingReport
+from .yolo_backends import default_cache_dir
+
+# ImageWriter が出力しうる画像拡張子
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# ウォッチドッグがプロセスの状態を確認する間隔（秒）
+WATCHDOG_INTERVAL_SEC = 0.2
+# 失敗時にログへ出す出力末尾の行数
+OUTPUT_TAIL_LINES = 20
+# プロセス終了後に出力読み取りスレッドを待つ秒数（孫プロセスがパイプを開いたままだと読み取りは終わらない）
+READER_JOIN_TIMEOUT_SEC = 5.0
+
+# キューブフェイス（画角 90°）の 35mm 換算焦点距離: 36mm / 2 / tan(45°)
+CUBE_FACE_FOCAL_35MM = 18.0
+
+XMP_TEMPLATE = """<x:xmpmeta xmlns:x="adobe:ns:meta/">
+  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+    <rdf:Description xmlns:xcr="http://www.capturingreality.com/ns/xcr/1.1#"
+       xcr:Version="3" xcr:PosePrior="{pose_prior}" xcr:Coordinates="absolute"
+       xcr:DistortionModel="brown3" xcr:FocalLength35mm="{focal}" xcr:Skew="0" xcr:AspectRatio="1"
+       xcr:PrincipalPointU="0" xcr:PrincipalPointV="0" xcr:CalibrationPrior="exact"
+       xcr:CalibrationGroup="-1" xcr:DistortionGroup="-1" xcr:InTexturing="1" xcr:InMeshing="1">
+      <xcr:Rotation>{rotation}</xcr:Rotation>
+      <xcr:Position>{position}</xcr:Position>
+      <xcr:DistortionCoeficients>0 0 0 0 0 0</xcr:DistortionCoeficients>
+    </rdf:Description>
+  </rdf:RDF>
+</x:xmpmeta>
+"""
 
 class RealityScanInterface:
     """RealityScan CLI連携クラス"""
     
-    def __init__(self, config: RealityScanConfig):
+    def __init__(self, config: RealityScanConfig, instance_name: Optional[str] = None):
         self.config = config
         self.logger = logging.getLogger(__name__)
         
@@ -27,8 +62,23 @@ class RealityScanInterface:
         
         # 処理状態管理
         self.current_process = None
-        self.instance_name = f"video3dgs_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.instance_name = instance_name or f"video3dgs_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # 直近の実行状態: 'completed' / 'failed' / 'timeout'
+        self.last_status: Optional[str] = None
+        # True を返すと起動直後のプロセスを中断する（スケジューラのキャンセル用）
+        self.stop_check: Optional[Callable[[], bool]] = None
+        # 出力から進捗（0〜100）を読み取るたびに (進捗, 行) で呼ばれる
+        self.progress_callback: Optional[Callable[[float, str], None]] = None
+        self.last_log_path: Optional[Path] = None
+        self._run_count = 0
+        # 書き出し済み XMP の内容（変化の無いファイルは書き直さない）
+        self._written_xmp: Dict[Path, str] = {}
         self.alignment_data = None
+        # 画像フォルダごとの差分配置（反復ごとに追加分だけをリンク・コピーする）
+        self._stagers: Dict[Path, ImageStager] = {}
+        self.last_staging: Optional[StagingReport] = None
+        # 同じ画像・品質の結果を再利用するキャッシュ（無効なら None）
+        self.result_cache = self._open_result_cache()
 
     def run_alignment(self, images: List[Dict[str, Any]], 
                      quality: str = 'normal') -> Dict[str, Any]:
@@ -50,51 +100,142 @@ class RealityScanInterface:
         # CLIコマンド構築
         commands = self._build_alignment_commands(temp_image_dir, quality)
 
-        # RealityScan実行
-        try:
-            # RealityScanのCLIを実行
-            result = self._execute_realityscan_commands(commands)
-            # 結果解析
-            alignment_result = self._parse_alignment_result()
-
-        except (RuntimeError, FileNotFoundError) as e:
-            self.logger.warning(f"RealityScanの実行に失敗しました: {e}。ダミーの結果を返します。")
-            # 実行ファイルがない場合などは、ダミーの結果を返す
-            alignment_result = self._get_empty_alignment_result()
-
+        # 配置済みフォルダの内容が同じ実行の結果があれば RealityScan を起動しない
+        components_dir = self.temp_dir / self.instance_name / 'components'
+        cache_key = self._result_cache_key(temp_image_dir, quality)
+        alignment_result = self.result_cache.get(cache_key, temp_image_dir, components_dir) if cache_key else None
+        cached = alignment_result is not None
+        if cached:
+            self.last_status = 'completed'
+            self.last_log_path = None
+            alignment_result['raw_output_path'] = str(self.temp_dir / self.instance_name)
+        else:
+            xml_path = self.temp_dir / self.instance_name / "alignment_result.xml"
+            xml_mtime_before = self._file_mtime(xml_path)
+            # RealityScan実行
+            try:
+                # RealityScanのCLIを実行
+                result = self._execute_realityscan_commands(commands)
+                # 結果解析
+                alignment_result = self._parse_alignment_result()
+
+            except (RuntimeError, FileNotFoundError) as e:
+                self.logger.warning(f"RealityScanの実行に失敗しました: {e}。ダミーの結果を返します。")
+                # 実行ファイルがない場合などは、ダミーの結果を返す
+                self.last_status = 'failed'
+                alignment_result = self._get_empty_alignment_result()
+
+            # キャッシュするのはこの実行で書き出された XML から1つ以上のコンポーネントを読めた結果だけ
+            # （XML が無い・前回の XML が残っているだけの場合の空の結果を次回以降に再利用しない）
+            xml_written = self._file_mtime(xml_path) not in (None, xml_mtime_before)
+            if cache_key and self.last_status == 'completed' and xml_written and len(alignment_result['components']) > 0:
+                self.result_cache.put(cache_key, alignment_result, temp_image_dir, components_dir)
+
+        alignment_result['cached'] = cached
         alignment_result['total_images'] = len(images)
+        alignment_result['quality'] = quality
+        alignment_result['status'] = self.last_status
+        alignment_result['log_path'] = str(self.last_log_path) if self.last_log_path else None
         self.alignment_data = alignment_result
         self.logger.info(f"アライメント完了 - コンポーネント数: {len(alignment_result['components'])}")
         return alignment_result
 
     def _prepare_temp_images(self, images: List[Dict[str, Any]], only_faces: bool = False) -> Path:
         """一時画像フォルダ準備
-        only_faces=True の場合は 'faces' サブフォルダに face 付き画像のみコピーする。
+        only_faces=True の場合は 'faces' サブフォルダに face 付き画像のみ配置する。
+        前回の反復で配置済みの画像はそのまま使い、新しい画像の追加と不要な画像の削除だけを行う。
         """
         subfolder = 'faces' if only_faces else 'images'
         image_dir = self.temp_dir / self.instance_name / subfolder
-        image_dir.mkdir(parents=True, exist_ok=True)
+        if image_dir not in self._stagers:
+            self._stagers[image_dir] = ImageStager(image_dir)
 
-        self.logger.info(f"画像を一時ディレクトリにコピー: {image_dir}")
-        for img_data in images:
-            if only_faces and not img_data.get('face'):
-                continue
-            src_path = Path(img_data['image_path'])
-            if src_path.exists():
-                shutil.copy(src_path, image_dir / src_path.name)
-            else:
-                self.logger.warning(f"画像ファイルが見つかりません: {src_path}")
+        sources = [Path(img['image_path']) for img in images if not only_faces or img.get('face')]
+        self.last_staging = self._stagers[image_dir].stage(sources)
+        self.logger.info(f"画像を一時ディレクトリに配置: {image_dir} - {self.last_staging.summary()}")
         return image_dir
 
+    @staticmethod
+    def _file_mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _open_result_cache(self) -> Optional[AlignmentCache]:
+        if not getattr(self.config, 'alignment_cache_enabled', False):
+            return None
+        cache_dir = Path(self.config.alignment_cache_dir) if self.config.alignment_cache_dir \
+            else default_cache_dir() / 'alignments'
+        try:
+            return AlignmentCache(cache_dir, max_bytes=self.config.alignment_cache_mb * 1024 * 1024)
+        except OSError as e:
+            self.logger.warning(f"アライメントキャッシュを開けませんでした（キャッシュなしで続行します）: {e}")
+            return None
+
+    def _result_cache_key(self, image_dir: Path, quality: str) -> Optional[str]:
+        """配置済みフォルダ（画像と XMP）・品質・結果に影響する設定から決まるキャッシュキー"""
+        if self.result_cache is None:
+            return None
+        settings = {'quality': quality, 'executable': Path(self.realityscan_exe).name,
+                    'pose_prior': getattr(self.config, 'pose_prior', 'initial')}
+        try:
+            return self.result_cache.key(image_dir, settings)
+        except OSError as e:
+            self.logger.warning(f"アライメントキャッシュのキーを計算できませんでした: {e}")
+            return None
+
     def _has_previous_alignment_data(self) -> bool:
         """前回のコンポーネント情報を持っているか"""
         return self.alignment_data is not None
 
     def _generate_xmp_files(self, images: List[Dict[str, Any]], image_dir: Path):
-        """XMPサイドカーファイルの生成"""
-        # 実装: 前回のコンポーネント情報を基にXMPファイルを作成
-        # TODO: 将来的に実装
-        pass
+        """XMPサイドカーファイルの生成
+
+        前回のアライメントで最大のコンポーネントに入った面画像に、その姿勢を事前情報として与える。
+        コンポーネントごとに座標系が異なるため、他のコンポーネントの姿勢は使わない。
+        新しく追加した画像と前回整列しなかった画像は XMP を持たず、通常どおり推定される。
+        rotation は列がカメラ軸（カメラ→ワールド）なので、XMP には転置（ワールド→カメラ）を書く。
+        """
+        if not getattr(self.config, 'use_pose_priors', True):
+            return
+        if self.alignment_data.get('status') not in (None, 'completed'):
+            self.logger.info("前回のアライメントが正常終了していないため、姿勢の事前情報は使いません。")
+            return
+        components = self.alignment_data.get('components', [])
+        if not components:
+            return
+        main_component = max(components, key=lambda comp: len(comp['images']))
+        names, _, rotations, positions = component_pose_arrays(main_component)
+        pose_index = {name: i for i, name in enumerate(names)}
+
+        pose_prior = getattr(self.config, 'pose_prior', 'initial')
+        written = kept = removed = 0
+        for img_data in images:
+            name = Path(img_data['image_path']).name
+            if not (image_dir / name).exists():
+                continue
+            xmp_path = image_dir / f"{Path(name).stem}.xmp"
+            i = pose_index.get(name) if img_data.get('face') else None
+            if i is None:
+                # 前回の最大コンポーネント外になった画像の古い事前情報は消す
+                if xmp_path.exists():
+                    xmp_path.unlink()
+                    removed += 1
+                self._written_xmp.pop(xmp_path, None)
+                continue
+
+            content = XMP_TEMPLATE.format(
+                pose_prior=pose_prior, focal=CUBE_FACE_FOCAL_35MM,
+                rotation=' '.join(f"{v:.12g}" for v in rotations[i].T.ravel()),
+                position=' '.join(f"{v:.12g}" for v in positions[i]))
+            if self._written_xmp.get(xmp_path) == content and xmp_path.exists():
+                kept += 1
+                continue
+            xmp_path.write_text(content, encoding='utf-8')
+            self._written_xmp[xmp_path] = content
+            written += 1
+        self.logger.info(f"XMP姿勢事前情報 ({pose_prior}): 書き出し {written}, 変更なし {kept}, 削除 {removed}")
 
     def _build_alignment_commands(self, image_dir: Path, quality: str) -> List[str]:
         """アライメントCLIコマンド構築"""
@@ -110,10 +251,19 @@ class RealityScanInterface:
         return commands
 
     def _execute_realityscan_commands(self, commands: List[str]) -> subprocess.CompletedProcess:
-        """RealityScanコマンド実行"""
+        """RealityScanコマンド実行
+
+        stdout / stderr はバックグラウンドスレッドで1行ずつ読み、ログファイルに書きながら
+        進捗を解析する。timeout_seconds を超えるか、stall_timeout_seconds の間出力が無ければ
+        プロセスを終了する。戻り値の stdout には出力の末尾だけを入れる。
+        """
         cmd = [self.realityscan_exe] + commands
         
-        self.logger.info(f"RealityScanコマンド実行: {' '.join(cmd)}")
+        self._run_count += 1
+        log_dir = self.temp_dir / self.instance_name / 'logs'
+        log_dir.mkdir(parents=True, exist_ok=True)
+        self.last_log_path = log_dir / f"realityscan_{self._run_count:03d}.log"
+        self.logger.info(f"RealityScanコマンド実行: {' '.join(cmd)} (ログ: {self.last_log_path})")
         # NOTE: 実行ファイルが存在しない場合のエラーハンドリング
         try:
             self.current_process = subprocess.Popen(
@@ -121,38 +271,108 @@ class RealityScanInterface:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
+                bufsize=1,
+                errors='replace',
                 cwd=self.temp_dir
             )
         except FileNotFoundError:
             raise FileNotFoundError(f"実行ファイルが見つかりません: {self.realityscan_exe}")
+        if self.stop_check is not None and self.stop_check():
+            self.current_process.terminate()
 
-        try:
-            timeout = getattr(self.config, 'timeout_seconds', None) or None
-            stdout, stderr = self.current_process.communicate(timeout=timeout)
-        except subprocess.TimeoutExpired:
-            self.logger.error(f"RealityScanがタイムアウトしました（{timeout}秒）。プロセスを終了します。")
-            try:
-                self.current_process.kill()
-            except Exception:
-                pass
-            # タイムアウト時はダミー出力を作成して継続
+        process = self.current_process
+        tail: deque = deque(maxlen=OUTPUT_TAIL_LINES)
+        last_output = [time.monotonic()]
+        write_lock = threading.Lock()
+        log_closed = threading.Event()
+        with open(self.last_log_path, 'w', encoding='utf-8', buffering=1) as log_file:
+            readers = [threading.Thread(target=self._read_output_stream,
+                                        args=(stream, label, log_file, write_lock, log_closed, tail, last_output),
+                                        name=f"realityscan-{label}", daemon=True)
+                       for stream, label in ((process.stdout, 'stdout'), (process.stderr, 'stderr'))]
+            for reader in readers:
+                reader.start()
+            killed_reason = self._watch_process(process, last_output)
+            for reader in readers:
+                reader.join(timeout=READER_JOIN_TIMEOUT_SEC)
+            # 終わらなかった読み取りスレッドは、以後ログファイルに書かない
+            with write_lock:
+                log_closed.set()
+
+        output_tail = ''.join(tail)
+        if killed_reason is not None:
+            self.last_status = killed_reason
+            # タイムアウト・停止時はダミー出力を作成して継続
             self._create_dummy_realityscan_output([], Path(cmd[cmd.index('-addFolder') + 1]) if '-addFolder' in cmd else self.temp_dir)
-            return subprocess.CompletedProcess(cmd, -1, '', 'timeout')
-
-        self.logger.info(f"RealityScan STDOUT:\n{stdout}")
-        self.logger.info(f"RealityScan STDERR:\n{stderr}")
+            return subprocess.CompletedProcess(cmd, -1, output_tail, killed_reason)
 
-        if self.current_process.returncode != 0:
-            self.logger.error(f"RealityScan実行エラー: プロセスが非ゼロの終了コードで終了しました ({self.current_process.returncode}).")
+        if process.returncode != 0:
+            self.last_status = 'failed'
+            self.logger.error(f"RealityScan実行エラー: プロセスが非ゼロの終了コードで終了しました ({process.returncode}). "
+                              f"出力の末尾:\n{output_tail}")
             # 失敗時はダミー出力を生成して呼び出し元で処理を継続できるようにする
             try:
                 image_dir = Path(cmd[cmd.index('-addFolder') + 1]) if '-addFolder' in cmd else self.temp_dir
             except Exception:
                 image_dir = self.temp_dir
             self._create_dummy_realityscan_output([], image_dir)
-            return subprocess.CompletedProcess(cmd, self.current_process.returncode, stdout, stderr)
+            return subprocess.CompletedProcess(cmd, process.returncode, output_tail, '')
+
+        self.last_status = 'completed'
+        return subprocess.CompletedProcess(cmd, process.returncode, output_tail, '')
+
+    def _watch_process(self, process: subprocess.Popen, last_output: List[float]) -> Optional[str]:
+        """プロセスの終了を待つ。タイムアウトまたは出力停止で終了させた場合はその理由を返す"""
+        timeout = getattr(self.config, 'timeout_seconds', 0) or 0
+        stall_timeout = getattr(self.config, 'stall_timeout_seconds', 0) or 0
+        start = time.monotonic()
+        while True:
+            try:
+                process.wait(timeout=WATCHDOG_INTERVAL_SEC)
+                return None
+            except subprocess.TimeoutExpired:
+                pass
+            now = time.monotonic()
+            if timeout and now - start > timeout:
+                self.logger.error(f"RealityScanがタイムアウトしました（{timeout}秒）。プロセスを終了します。")
+                reason = 'timeout'
+            elif stall_timeout and now - last_output[0] > stall_timeout:
+                self.logger.error(f"RealityScanの出力が{stall_timeout}秒間ありません。停止したとみなしてプロセスを終了します。")
+                reason = 'stalled'
+            else:
+                continue
+            try:
+                process.kill()
+                process.wait()
+            except Exception:
+                pass
+            return reason
+
+    def _read_output_stream(self, stream, label: str, log_file, write_lock: threading.Lock,
+                            log_closed: threading.Event, tail: deque, last_output: List[float]):
+        """出力ストリームを1行ずつ読み、ログファイルへの書き出しと進捗の通知を行う
 
-        return subprocess.CompletedProcess(cmd, self.current_process.returncode, stdout, stderr)
+        log_closed が立った後（実行が終わりログファイルを閉じた後）の出力は読み捨てる。
+        """
+        pattern = getattr(self.config, 'progress_pattern', '')
+        regex = re.compile(pattern) if pattern else None
+        for line in iter(stream.readline, ''):
+            last_output[0] = time.monotonic()
+            with write_lock:
+                if log_closed.is_set():
+                    continue
+                log_file.write(f"[{label}] {line}" if line.endswith('\n') else f"[{label}] {line}\n")
+                tail.append(line)
+            if regex is None or self.progress_callback is None:
+                continue
+            match = regex.search(line)
+            if match:
+                try:
+                    progress = float(match.group('percent') if 'percent' in regex.groupindex else match.group(1))
+                except (IndexError, ValueError):
+                    continue
+                self.progress_callback(min(max(progress, 0.0), 100.0), line.strip())
+        stream.close()
 
     def _create_dummy_realityscan_output(self, images: List[Dict[str, Any]], image_dir: Path):
         """ダミーのRealityScan出力XMLを生成する"""
@@ -219,67 +439,33 @@ class RealityScanInterface:
         self.logger.info(f"ダミーのXMLファイルを生成しました: {xml_path}")
 
     def _parse_alignment_result(self) -> Dict[str, Any]:
-        """アライメント結果解析"""
+        """アライメント結果解析
+
+        姿勢は AlignmentPoses の配列に読み込み、components は辞書形式でアクセスできるビューとして返す。
+        """
         xml_path = self.temp_dir / self.instance_name / "alignment_result.xml"
         if not xml_path.exists():
             self.logger.error(f"アライメント結果のXMLファイルが見つかりません: {xml_path}")
             return self._get_empty_alignment_result()
 
         self.logger.info(f"XML結果をパース中: {xml_path}")
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        summary = root.find('summary')
+        summary, poses = parse_alignment_xml(xml_path)
         total_images = int(summary.get('total_images', 0))
         aligned_images = int(summary.get('aligned_images', 0))
         mean_reprojection_error = float(summary.get('mean_reprojection_error', 99.0))
-
-        components = []
-        aligned_image_names = set()
-
-        for comp_node in root.findall('components/component'):
-            comp_id = comp_node.get('id')
-            comp_images = []
-            for img_node in comp_node.findall('image'):
-                img_name = img_node.get('name')
-                
-                pose = {
-                    'tx': float(img_node.get('tx', 0)),
-                    'ty': float(img_node.get('ty', 0)),
-                    'tz': float(img_node.get('tz', 0)),
-                    'rotation': [
-                        [float(img_node.get('r11', 1)), float(img_node.get('r12', 0)), float(img_node.get('r13', 0))],
-                        [float(img_node.get('r21', 0)), float(img_node.get('r22', 1)), float(img_node.get('r23', 0))],
-                        [float(img_node.get('r31', 0)), float(img_node.get('r32', 0)), float(img_node.get('r33', 1))]
-                    ]
-                }
-                
-                comp_images.append({
-                    'name': img_name,
-                    'path': img_node.get('path'),
-                    'pose': pose
-                })
-                aligned_image_names.add(img_name)
-
-            components.append({
-                'id': comp_id,
-                'image_count': int(comp_node.get('num_images', 0)),
-                'reprojection_error': float(comp_node.get('reprojection_error', 99.0)),
-                'images': comp_images
-            })
+        aligned_image_names = set(poses.names.tolist())
 
         # collect from both images and faces folders if they exist
         all_image_files = []
         images_folder = self.temp_dir / self.instance_name / 'images'
         faces_folder = self.temp_dir / self.instance_name / 'faces'
-        if images_folder.exists():
-            all_image_files.extend([p.name for p in images_folder.glob('*.jpg')])
-        if faces_folder.exists():
-            all_image_files.extend([p.name for p in faces_folder.glob('*.jpg')])
+        for folder in (images_folder, faces_folder):
+            if folder.exists():
+                all_image_files.extend([p.name for p in folder.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS])
         unaligned_images = [name for name in all_image_files if name not in aligned_image_names]
 
         return {
-            'components': components,
+            'components': ComponentList(poses),
             'total_images': total_images,
             'unaligned_images': unaligned_images,
             'alignment_ratio': (aligned_images / total_images) if total_images > 0 else 0,
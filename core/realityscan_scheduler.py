@@ -0,0 +1,120 @@
+# core/realityscan_scheduler.py - 複数 RealityScan インスタンスの並列実行
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from models.config_models import RealityScanConfig
+from .realityscan_interface import RealityScanInterface
+
+
+@dataclass
+class AlignmentJob:
+    """1回のアライメント実行
+
+    slot ごとに専用のインスタンスディレクトリ（RealityScanInterface）を持ち、同じ slot の
+    ジョブは前回の配置済み画像を再利用する。
+    """
+    slot: str
+    images: List[Dict[str, Any]]
+    quality: str = 'normal'
+
+
+class RealityScanScheduler:
+    """最大 max_instances 個の RealityScan を同時に実行するスケジューラ
+
+    タイムアウトは各インスタンスの timeout_seconds で処理される。cancel() は実行中の
+    プロセスを終了させ、未開始のジョブを取り消す（結果の status は 'cancelled'）。
+    取り消しは次の run()（または reset()）まで有効。
+    progress_callback には (slot, 進捗率 0-100, 出力行) が各インスタンスの出力スレッドから渡される。
+    """
+
+    def __init__(self, config: RealityScanConfig, base_name: Optional[str] = None,
+                 progress_callback: Optional[Callable[[str, float, str], None]] = None):
+        self.config = config
+        self.progress_callback = progress_callback
+        self.logger = logging.getLogger(__name__)
+        self.max_instances = max(1, config.max_instances)
+        self.base_name = base_name or f"video3dgs_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self._executor = ThreadPoolExecutor(max_workers=self.max_instances, thread_name_prefix='realityscan')
+        self._instances: Dict[str, RealityScanInterface] = {}
+        self._slot_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def instance(self, slot: str) -> RealityScanInterface:
+        """slot 専用のインターフェース（インスタンスディレクトリは <base_name>_<slot>）"""
+        with self._lock:
+            if slot not in self._instances:
+                interface = RealityScanInterface(self.config, instance_name=f"{self.base_name}_{slot}")
+                interface.stop_check = self._cancelled.is_set
+                if self.progress_callback is not None:
+                    callback = self.progress_callback
+                    interface.progress_callback = lambda percent, line, slot=slot: callback(slot, percent, line)
+                self._instances[slot] = interface
+                self._slot_locks[slot] = threading.Lock()
+            return self._instances[slot]
+
+    def submit(self, job: AlignmentJob) -> Future:
+        interface = self.instance(job.slot)
+        return self._executor.submit(self._run_job, job, interface, self._slot_locks[job.slot])
+
+    def run(self, jobs: List[AlignmentJob], stop_check: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        """ジョブを並列に実行し、jobs と同じ順序で結果を返す
+
+        前回の cancel() は取り消し、新しい実行として始める。stop_check が真を返す場合
+        （呼び出し元で停止要求済み）は全ジョブを取り消す。
+        """
+        self.reset(stop_check)
+        futures = [self.submit(job) for job in jobs]
+        return [future.result() for future in futures]
+
+    def reset(self, stop_check: Optional[Callable[[], bool]] = None):
+        """cancel() の状態を解除する
+
+        stop_check は解除した後に確認するため、呼び出し元が停止要求を立ててから cancel() する
+        順序であれば、解除と同時に届いた停止要求も失われない。
+        """
+        self._cancelled.clear()
+        if stop_check is not None and stop_check():
+            self._cancelled.set()
+
+    def share_result(self, alignment_result: Dict[str, Any]):
+        """採用した結果を全インスタンスの前回結果として設定する（次回の XMP 事前情報に使われる）"""
+        with self._lock:
+            for interface in self._instances.values():
+                interface.alignment_data = alignment_result
+
+    def cancel(self):
+        """実行中の全インスタンスを中断し、未開始のジョブを取り消す"""
+        self._cancelled.set()
+        with self._lock:
+            interfaces = list(self._instances.values())
+        for interface in interfaces:
+            interface.abort_current_process()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run_job(self, job: AlignmentJob, interface: RealityScanInterface, slot_lock: threading.Lock) -> Dict[str, Any]:
+        with slot_lock:
+            if self.cancelled:
+                return self._cancelled_result(interface, job)
+            self.logger.info(f"RealityScanインスタンス {interface.instance_name} でアライメント ({job.quality}, {len(job.images)}枚)")
+            result = interface.run_alignment(job.images, quality=job.quality)
+            if self.cancelled:
+                result['status'] = 'cancelled'
+            result.setdefault('quality', job.quality)
+            result['slot'] = job.slot
+            return result
+
+    def _cancelled_result(self, interface: RealityScanInterface, job: AlignmentJob) -> Dict[str, Any]:
+        result = interface._get_empty_alignment_result()
+        result.update({'total_images': len(job.images), 'quality': job.quality, 'status': 'cancelled', 'slot': job.slot})
+        return result
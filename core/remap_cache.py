@@ -0,0 +1,90 @@
+# core/remap_cache.py - キューブフェイス変換用 remap テーブルのキャッシュ
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Tuple
+import threading
+import logging
+
+# (入力高さ, 入力幅, face_size, yaw_deg, pitch_deg)
+RemapKey = Tuple[int, int, int, float, float]
+
+
+def build_face_maps(h: int, w: int, face_size: int, yaw_deg: float, pitch_deg: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular(h, w) から指定向きの透視投影面への float32 remap テーブルを生成する"""
+    # pixel coordinates on face
+    i = np.linspace(-1, 1, face_size)
+    j = np.linspace(-1, 1, face_size)
+    x_cam_base, y_cam_base = np.meshgrid(i, -j)  # y inverted for image coords
+    z_cam_base = np.ones_like(x_cam_base)
+    vec_base = np.stack([x_cam_base, y_cam_base, z_cam_base], axis=-1)
+    vec_base /= np.linalg.norm(vec_base, axis=-1, keepdims=True)
+
+    yaw = np.deg2rad(yaw_deg)
+    pitch = np.deg2rad(pitch_deg)
+    Ry = np.array([[np.cos(yaw), 0, np.sin(yaw)], [0, 1, 0], [-np.sin(yaw), 0, np.cos(yaw)]])
+    Rx = np.array([[1, 0, 0], [0, np.cos(pitch), -np.sin(pitch)], [0, np.sin(pitch), np.cos(pitch)]])
+    R = Ry @ Rx
+    vec_rot = vec_base @ R.T
+    lon = np.arctan2(vec_rot[..., 0], vec_rot[..., 2])
+    lat = np.arcsin(np.clip(vec_rot[..., 1], -1.0, 1.0))
+
+    map_x = (lon + np.pi) / (2 * np.pi) * (w - 1)
+    map_y = (np.pi / 2 - lat) / np.pi * (h - 1)
+    return map_x.astype(np.float32), map_y.astype(np.float32)
+
+
+class RemapCache:
+    """remap テーブルの LRU キャッシュ
+
+    テーブルは cv2.convertMaps で固定小数点形式（CV_16SC2 + 補間テーブル）に
+    変換して保持する。合計バイト数が max_bytes を超えると古いものから破棄する。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._entries: "OrderedDict[RemapKey, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, h: int, w: int, face_size: int, yaw_deg: float, pitch_deg: float) -> Tuple[np.ndarray, np.ndarray]:
+        """固定小数点 remap テーブル (map1, map2) を返す（無ければ生成してキャッシュ）"""
+        key = (h, w, face_size, float(yaw_deg), float(pitch_deg))
+        with self._lock:
+            maps = self._entries.get(key)
+            if maps is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return maps
+            self.stats['misses'] += 1
+
+        map_x, map_y = build_face_maps(h, w, face_size, yaw_deg, pitch_deg)
+        maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = maps
+                self._current_bytes += maps[0].nbytes + maps[1].nbytes
+                self._evict()
+        return maps
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return self._current_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        # 直近に追加したエントリは上限を超えていても残す
+        while self._current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (map1, map2) = self._entries.popitem(last=False)
+            self._current_bytes -= map1.nbytes + map2.nbytes
+            self.stats['evictions'] += 1
@@ -2,26 +2,84 @@
 
 import cv2
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import Counter
 # cupy は一旦コメントアウトし、CPUベースで確実に動くようにします
 # import cupy as cp 
 import logging
 from pathlib import Path # Path をインポート
 
 from models.config_models import AppConfig
+from models.data_models import DetectionRecord
 from .quality_filter import QualityFilter
+from utils.file_utils import file_fingerprint
+from .frame_reader import FrameReader, make_proxy
+from .frame_index import FrameIndex, FrameIndexStore
+from .remap_cache import RemapCache
+from .extraction_pipeline import StagedPipeline, PipelineStage
+from .image_writer import ImageWriter
+from .adaptive_sampler import AdaptiveSampler
+from .frame_prefilter import FramePrefilter
+from .face_pruner import FacePruner
+from .phash_index import PerceptualHashIndex, INDEX_FILENAME
+
+
+@dataclass
+class _FrameTask:
+    """抽出パイプラインを流れる1サンプル分の作業データ"""
+    index: int
+    timestamp: float
+    frame: Optional[np.ndarray]
+    # 品質判定・解析用の縮小画像（判定後に破棄する）
+    proxy: Optional[np.ndarray] = None
+    accepted: bool = False
+    # 品質フィルタの検出結果（閾値を変えた再判定に使える）
+    detections: Optional[DetectionRecord] = None
+    rejection_reason: Optional[str] = None
+    frame_number: int = -1
+    faces: Dict[str, np.ndarray] = field(default_factory=dict)
+    entries: List[Dict[str, Any]] = field(default_factory=list)
+    # 面単位フィルタで除外された面と理由
+    face_rejections: Dict[str, str] = field(default_factory=dict)
+    face_detections: Dict[str, DetectionRecord] = field(default_factory=dict)
+    writes: List[Future] = field(default_factory=list)
+    # 知覚ハッシュインデックスに登録した識別情報（書き出さなかった場合に取り消す）
+    hash_entries: List[Dict[str, Any]] = field(default_factory=list)
+
 
 class VideoExtractor:
     """360度動画フレーム抽出クラス"""
-    
+
+    # 各フェイスの向き (yaw_deg, pitch_deg)
+    FACE_ORIENTS = {
+        'front': (0, 0),
+        'right': (90, 0),
+        'back': (180, 0),
+        'left': (-90, 0),
+        'up': (0, 90),
+        'down': (0, -90)
+    }
+
     def __init__(self, config: AppConfig):
         self.config = config
         self.logger = logging.getLogger(__name__)
+        self.remap_cache = RemapCache(max_bytes=self.config.extraction.remap_cache_mb * 1024 * 1024)
+        self.image_writer = ImageWriter(self.config.output)
+        self.last_pipeline_stats: Dict[str, Dict[str, float]] = {}
+        self.last_rejections: List[Dict[str, Any]] = []
+        self._hash_indexes: Dict[str, PerceptualHashIndex] = {}
+        self.frame_indexes = FrameIndexStore(self.config.extraction.frame_index_dir)
     
     def extract_adaptive_frames(self, video_path: str, target_count: int, 
                               quality_filter: QualityFilter, confidence: float, 
-                              area_threshold: float, output_dir: str) -> List[Dict[str, Any]]:
-        """適応的フレーム抽出（基本的な実装を追加）"""
+                              area_threshold: float, output_dir: str,
+                              stop_check: Optional[Callable[[], bool]] = None,
+                              progress_callback: Optional[Callable[[float], None]] = None) -> List[Dict[str, Any]]:
+        """適応的フレーム抽出（基本的な実装を追加）
+        stop_check が True を返すと抽出を打ち切る。progress_callback には 0.0〜1.0 の進捗が渡される。
+        """
         self.logger.info(f"フレーム抽出開始: {Path(video_path).name}")
         
         cap = cv2.VideoCapture(video_path)
@@ -30,170 +88,455 @@ class VideoExtractor:
             return []
 
         fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps
+        frame_index = self._get_frame_index(video_path)
+        if frame_index is not None:
+            duration = frame_index.duration_sec
+        else:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            duration = total_frames / fps
         
         extracted_frames = []
-        current_time_sec = 0.0
         
         temp_image_dir = Path(output_dir) / 'temp_images'
         temp_image_dir.mkdir(parents=True, exist_ok=True)
         
-        frame_count = 0
-        base_interval = self.config.extraction.base_interval_sec
-
-        while current_time_sec < duration and len(extracted_frames) < target_count:
-            cap.set(cv2.CAP_PROP_POS_MSEC, int(current_time_sec * 1000))
-            ret, frame = cap.read()
-            
-            if not ret:
-                break
-
-            # 品質フィルタリングを実行
-            if not quality_filter.is_frame_acceptable(frame, confidence, area_threshold):
-                self.logger.debug(f"フレーム {current_time_sec:.2f}s は品質基準を満たさなかったためスキップします。")
-                current_time_sec += base_interval
-                continue
-
-            image_name = f"{Path(video_path).stem}_frame_{frame_count:05d}.jpg"
-            image_path = temp_image_dir / image_name
-            cv2.imwrite(str(image_path), frame)
-            
-            frame_data = {
-                'video_source': video_path,
-                'timestamp': current_time_sec,
-                'image_path': str(image_path),
-            }
-            extracted_frames.append(frame_data)
-            # 360パノラマ（equirectangular）を6面の透視投影に変換して保存
+        video_stem = Path(video_path).stem
+        video_hash = file_fingerprint(video_path)
+        sampler = AdaptiveSampler(self.config.extraction)
+        prefilter = FramePrefilter(self.config.extraction.prefilter)
+        face_pruner = FacePruner(self.config.extraction.face_pruning)
+        hash_index = self._get_hash_index(output_dir)
+        rejections: List[Dict[str, Any]] = []
+        reader = FrameReader(cap, fps,
+                             mode=self.config.extraction.decode_mode,
+                             seek_threshold_sec=self.config.extraction.seek_threshold_sec,
+                             frame_index=frame_index)
+        frame_counter = {'next': 0}
+        face_mode = self.config.extraction.filter_mode == 'faces'
+
+        def decode_frames():
+            current_time_sec = 0.0
+            index = 0
+            while current_time_sec < duration:
+                if stop_check is not None and stop_check():
+                    self.logger.info("停止要求によりフレーム抽出を中断します。")
+                    return
+                if progress_callback is not None:
+                    progress_callback(max(current_time_sec / duration, len(extracted_frames) / max(target_count, 1)))
+
+                ret, frame = reader.read_at(current_time_sec)
+                if not ret:
+                    return
+                proxy = make_proxy(frame, self.config.extraction.filter_proxy_width)
+                # 直前のサンプルとの動き量から次の間隔を決める（静止時は伸ばし、高速移動時は縮める）
+                interval = sampler.next_interval(proxy)
+                yield _FrameTask(index=index, timestamp=current_time_sec, frame=frame, proxy=proxy)
+                index += 1
+                current_time_sec += interval
+
+        def prefilter_stage(task: _FrameTask):
+            if pipeline.stopped:
+                return
+            # YOLO推論の前に露出・ブレ・重複を縮小画像で判定する
+            task.rejection_reason = prefilter.check(task.proxy)
+            if task.rejection_reason:
+                self.logger.debug(f"フレーム {task.timestamp:.2f}s を事前フィルタで除外: {task.rejection_reason}")
+                task.frame = None
+                task.proxy = None
+
+        def filter_stage(tasks: List[_FrameTask]):
+            candidates = [t for t in tasks if not t.rejection_reason]
+            if pipeline.stopped or not candidates:
+                return
+            # 品質フィルタリングは縮小プロキシに対してバッチで実行する（面積比は正規化座標なので解像度に依存しない）
+            # 同じ動画・時刻の検出結果がキャッシュにあれば推論は省略される
+            verdicts = quality_filter.evaluate_batch([t.proxy for t in candidates], confidence, area_threshold,
+                                                     cache_keys=[(video_hash, t.timestamp) for t in candidates])
+            for task, verdict in zip(candidates, verdicts):
+                task.accepted = verdict.accepted
+                task.detections = verdict.detections
+                task.proxy = None
+                if not task.accepted:
+                    self.logger.debug(f"フレーム {task.timestamp:.2f}s は品質基準を満たさなかったためスキップします。")
+                    task.rejection_reason = 'quality_filter'
+                    task.frame = None
+
+        def face_filter_stage(tasks: List[_FrameTask]):
+            candidates = [t for t in tasks if not t.rejection_reason]
+            if pipeline.stopped or not candidates:
+                return
+            # フレームごとの6面を1回の推論にまとめ、人物を含む面だけを除外する
+            images, keys, owners = [], [], []
+            for task in candidates:
+                task.proxy = None
+                for face_name, face_img in task.faces.items():
+                    images.append(make_proxy(face_img, self.config.extraction.filter_proxy_width))
+                    keys.append((f"{video_hash}:{face_name}", task.timestamp))
+                    owners.append((task, face_name))
+            verdicts = quality_filter.evaluate_batch(images, confidence, area_threshold, cache_keys=keys) if images else []
+            filtered = set()
+            for (task, face_name), verdict in zip(owners, verdicts):
+                if verdict.accepted:
+                    task.face_detections[face_name] = verdict.detections
+                else:
+                    task.face_rejections[face_name] = verdict.rejection_reason or 'quality_filter'
+                    del task.faces[face_name]
+                    filtered.add(task.index)
+
+            for task in candidates:
+                task.accepted = bool(task.faces)
+                if task.index in filtered:
+                    # 人物が写っている equirect は書き出さない（低テクスチャで除いた面は対象外）
+                    task.frame = None
+                    self.logger.debug(f"フレーム {task.timestamp:.2f}s の面を除外: {task.face_rejections}")
+                if not task.accepted:
+                    if task.index in filtered:
+                        task.rejection_reason = 'quality_filter'
+                    else:
+                        task.rejection_reason = FacePruner.REASON_LOW_TEXTURE if task.face_rejections else 'remap_failed'
+                    task.frame = None
+
+        def remap_stage(task: _FrameTask):
+            if pipeline.stopped or task.rejection_reason or not (task.accepted or face_mode):
+                return
+            # 360パノラマ（equirectangular）を6面の透視投影に変換
             try:
-                faces = self._equirectangular_to_cubefaces(frame, face_size=1024)
-                for face_name, face_img in faces.items():
-                    face_filename = f"{Path(video_path).stem}_frame_{frame_count:05d}__face_{face_name}.jpg"
-                    face_path = temp_image_dir / face_filename
-                    cv2.imwrite(str(face_path), face_img)
-                    face_data = {
-                        'video_source': video_path,
-                        'timestamp': current_time_sec,
-                        'image_path': str(face_path),
-                        'face': face_name
-                    }
-                    extracted_frames.append(face_data)
+                task.faces = self._equirectangular_to_cubefaces(task.frame, face_size=1024)
             except Exception as e:
                 self.logger.warning(f"フェイス画像生成に失敗しました: {e}")
-            frame_count += 1
-            
-            current_time_sec += base_interval
+                return
+            # 空・天井・無地の壁など特徴の乏しい面は書き出さない（面単位フィルタでは推論も省略される）
+            pruned = face_pruner.prune(task.faces)
+            if pruned:
+                task.face_rejections.update(pruned)
+                self.logger.debug(f"フレーム {task.timestamp:.2f}s の低テクスチャ面を除外: {sorted(pruned)}")
+
+        def sequence_stage(task: _FrameTask):
+            if not task.accepted or pipeline.stopped:
+                return
+            # 近似重複（他の動画・過去の反復で抽出済み）の画像を書き出し前に除外する
+            if hash_index is not None and self._drop_hash_duplicates(task, video_path, hash_index):
+                task.accepted = False
+                task.rejection_reason = 'duplicate_hash'
+                task.frame = None
+                return
+            # 採用フレームの通し番号はタイムスタンプ順に振る
+            task.frame_number = frame_counter['next']
+            frame_counter['next'] += 1
+
+        def detection_dicts(record: Optional[DetectionRecord]) -> Optional[List[Dict[str, Any]]]:
+            if record is None:
+                return None
+            # クラス名は検出があるときだけ引く（全てキャッシュから判定した場合もモデルは読み込まれない）
+            return record.to_dicts(quality_filter.class_names if len(record) else None)
+
+        def encode_stage(task: _FrameTask):
+            if not task.accepted or pipeline.stopped:
+                return
+            # エンコードと保存は ImageWriter のワーカーで非同期に行う
+            if task.frame is not None:
+                image_path = self.image_writer.image_path(temp_image_dir, f"{video_stem}_frame_{task.frame_number:05d}")
+                task.writes.append(self.image_writer.submit(task.frame, image_path))
+                task.entries.append({
+                    'video_source': video_path,
+                    'timestamp': task.timestamp,
+                    'image_path': str(image_path),
+                    # JSON にそのまま書き出せるよう辞書リストで持つ
+                    'detections': detection_dicts(task.detections),
+                })
+            for face_name, face_img in task.faces.items():
+                face_path = self.image_writer.image_path(
+                    temp_image_dir, f"{video_stem}_frame_{task.frame_number:05d}__face_{face_name}")
+                task.writes.append(self.image_writer.submit(face_img, face_path))
+                task.entries.append({
+                    'video_source': video_path,
+                    'timestamp': task.timestamp,
+                    'image_path': str(face_path),
+                    'face': face_name,
+                    'detections': detection_dicts(task.face_detections.get(face_name)),
+                })
+            task.frame = None
+            task.faces = {}
+
+        def collect_stage(task: _FrameTask):
+            # 目標枚数到達後（または停止後）に書き出されたフレームは破棄する
+            if pipeline.stopped or len(extracted_frames) >= target_count:
+                self._discard_entries(task, hash_index)
+                return
+            for face_name, reason in task.face_rejections.items():
+                rejections.append({
+                    'video_source': video_path,
+                    'timestamp': task.timestamp,
+                    'face': face_name,
+                    'rejection_reason': reason,
+                })
+            if task.rejection_reason:
+                rejections.append({
+                    'video_source': video_path,
+                    'timestamp': task.timestamp,
+                    'rejection_reason': task.rejection_reason,
+                })
+                return
+            extracted_frames.extend(task.entries)
+            if len(extracted_frames) >= target_count:
+                pipeline.stop()
+
+        extraction = self.config.extraction
+        if face_mode:
+            # 面単位: 先に6面へ変換し、1バッチに収まるフレーム数ずつ推論する
+            frames_per_batch = max(1, self.config.yolo.batch_size // len(self.FACE_ORIENTS))
+            filter_stages = [
+                PipelineStage('remap', remap_stage, workers=extraction.remap_workers),
+                PipelineStage('filter', face_filter_stage if frames_per_batch > 1 else lambda t: face_filter_stage([t]),
+                              workers=extraction.filter_workers, batch_size=frames_per_batch),
+            ]
+        else:
+            filter_stages = [
+                PipelineStage('filter', filter_stage if self.config.yolo.batch_size > 1 else lambda t: filter_stage([t]),
+                              workers=extraction.filter_workers, batch_size=self.config.yolo.batch_size),
+                PipelineStage('remap', remap_stage, workers=extraction.remap_workers),
+            ]
+        pipeline = StagedPipeline([
+            PipelineStage('prefilter', prefilter_stage, ordered=True),
+            *filter_stages,
+            PipelineStage('sequence', sequence_stage, ordered=True),
+            PipelineStage('encode', encode_stage),
+            PipelineStage('collect', collect_stage, ordered=True),
+        ], queue_depth=extraction.pipeline_queue_depth)
 
-        cap.release()
+        try:
+            pipeline.run(decode_frames())
+        finally:
+            cap.release()
+            # 呼び出し元（アライメント）には全ファイルがディスク上にある状態で返す
+            self.image_writer.flush()
+            if hash_index is not None:
+                hash_index.save()
+
+        if progress_callback is not None:
+            progress_callback(1.0)
+        self.last_pipeline_stats = pipeline.stats_summary()
+        self.last_rejections = rejections
+        if rejections:
+            reason_counts = Counter(r['rejection_reason'] for r in rejections)
+            self.logger.info(f"除外フレーム: {dict(reason_counts)}")
+        if face_pruner.stats:
+            self.logger.debug(f"低テクスチャ面の判定: {dict(face_pruner.stats)}")
+        cache_stats = quality_filter.cache_stats()
+        if cache_stats:
+            self.logger.info(f"検出キャッシュ: {cache_stats}")
+        self.logger.debug(f"デコード統計 ({reader.mode}): {reader.stats}")
+        self.logger.debug(f"パイプライン統計: {self.last_pipeline_stats}")
         self.logger.info(f"フレーム抽出完了: {len(extracted_frames)}枚")
         return extracted_frames
 
+    def _discard_entries(self, task: "_FrameTask", hash_index: Optional[PerceptualHashIndex] = None):
+        """採用されなかったフレームの書き出し済みファイルとハッシュ登録を取り消す
+
+        停止後に書き出しを省いたフレームもハッシュは登録済みのため、登録した識別情報ごとに取り除く。
+        """
+        for future in task.writes:
+            future.exception()
+        for entry in task.entries:
+            Path(entry['image_path']).unlink(missing_ok=True)
+        if hash_index is not None:
+            for entry in task.hash_entries:
+                hash_index.remove(entry)
+
+    def _get_hash_index(self, output_dir: str) -> Optional[PerceptualHashIndex]:
+        """出力先ごとの知覚ハッシュインデックス（出力先に保存され再実行時にも使われる）"""
+        if not self.config.extraction.dedupe.enabled:
+            return None
+        key = str(Path(output_dir))
+        if key not in self._hash_indexes:
+            self._hash_indexes[key] = PerceptualHashIndex(Path(output_dir) / INDEX_FILENAME,
+                                                          self.config.extraction.dedupe)
+        return self._hash_indexes[key]
+
+    def drop_cross_video_duplicates(self, frames: List[Dict[str, Any]], output_dir: str) -> List[Dict[str, Any]]:
+        """別プロセスで抽出した動画間の重複画像を取り除く（並列抽出の結果をマージした後に呼ぶ）
+
+        frames の順序で先に現れた動画の画像を残し、後の動画の重複画像はファイルとインデックスから削除する。
+        """
+        hash_index = self._get_hash_index(output_dir)
+        if hash_index is None or not frames:
+            return frames
+        hash_index.reload()
+        duplicates = hash_index.cross_source_duplicates(frames)
+        if not duplicates:
+            return frames
+        for entry in duplicates:
+            Path(entry['image_path']).unlink(missing_ok=True)
+            hash_index.remove(entry)
+        hash_index.save()
+        self.logger.info(f"動画間の重複画像を除外しました: {len(duplicates)}枚")
+        dropped = {id(entry) for entry in duplicates}
+        return [frame for frame in frames if id(frame) not in dropped]
+
+    def _get_frame_index(self, video_path: str) -> Optional[FrameIndex]:
+        """動画のフレームインデックス（初回のみパケット走査し、以後はサイドカーから読む）"""
+        if not self.config.extraction.use_frame_index:
+            return None
+        return self.frame_indexes.get(video_path)
+
+    def _drop_hash_duplicates(self, task: "_FrameTask", video_path: str, hash_index: PerceptualHashIndex) -> bool:
+        """重複する面を task から取り除く。equirect と全ての面が重複なら True を返す"""
+        identity = {'video_source': video_path, 'timestamp': task.timestamp}
+        kept_faces = {}
+        for face_name, face_img in task.faces.items():
+            face_identity = {**identity, 'face': face_name}
+            duplicate = hash_index.check_and_add(face_img, face_identity)
+            if duplicate is None:
+                kept_faces[face_name] = face_img
+                task.hash_entries.append(face_identity)
+            else:
+                self.logger.debug(f"重複画像を除外: {task.timestamp:.2f}s {face_name} ≈ "
+                                  f"{Path(duplicate['video_source']).name} {duplicate['timestamp']:.2f}s")
+        task.faces = kept_faces
+        # 面単位フィルタで equirect を書き出さないフレームは面だけで判定する
+        equirect_duplicate = task.frame is None or hash_index.check_and_add(task.frame, identity) is not None
+        if not equirect_duplicate:
+            task.hash_entries.append(identity)
+        return equirect_duplicate and not kept_faces
+
     def _equirectangular_to_cubefaces(self, eqp_img: np.ndarray, face_size: int = 1024) -> Dict[str, np.ndarray]:
         """Equirectangular 画像を6面の透視投影（cube faces）に変換して返す。
         戻り値は {face_name: image} の辞書。
+        remap テーブルは (入力 h, w, face_size, 向き) ごとにキャッシュされる。
         """
         h, w = eqp_img.shape[:2]
         faces: Dict[str, np.ndarray] = {}
 
-        face_orients = {
-            'front': (0, 0),
-            'right': (90, 0),
-            'back': (180, 0),
-            'left': (-90, 0),
-            'up': (0, 90),
-            'down': (0, -90)
-        }
-
-        def sph_to_equirect(lon, lat):
-            x = (lon + np.pi) / (2 * np.pi) * (w - 1)
-            y = (np.pi / 2 - lat) / np.pi * (h - 1)
-            return x, y
-
-        # pixel coordinates on face
-        i = np.linspace(-1, 1, face_size)
-        j = np.linspace(-1, 1, face_size)
-        x_cam_base, y_cam_base = np.meshgrid(i, -j)  # y inverted for image coords
-        z_cam_base = np.ones_like(x_cam_base)
-        vec_base = np.stack([x_cam_base, y_cam_base, z_cam_base], axis=-1)
-        vec_base /= np.linalg.norm(vec_base, axis=-1, keepdims=True)
-
-        for name, (yaw_deg, pitch_deg) in face_orients.items():
-            yaw = np.deg2rad(yaw_deg)
-            pitch = np.deg2rad(pitch_deg)
-            Ry = np.array([[np.cos(yaw), 0, np.sin(yaw)], [0, 1, 0], [-np.sin(yaw), 0, np.cos(yaw)]])
-            Rx = np.array([[1, 0, 0], [0, np.cos(pitch), -np.sin(pitch)], [0, np.sin(pitch), np.cos(pitch)]])
-            R = Ry @ Rx
-            vec_rot = vec_base @ R.T
-            lon = np.arctan2(vec_rot[..., 0], vec_rot[..., 2])
-            lat = np.arcsin(np.clip(vec_rot[..., 1], -1.0, 1.0))
-            map_x, map_y = sph_to_equirect(lon, lat)
-            map_x = map_x.astype(np.float32)
-            map_y = map_y.astype(np.float32)
-            face = cv2.remap(eqp_img, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_WRAP)
-            faces[name] = face
+        for name, (yaw_deg, pitch_deg) in self.FACE_ORIENTS.items():
+            map1, map2 = self.remap_cache.get(h, w, face_size, yaw_deg, pitch_deg)
+            faces[name] = cv2.remap(eqp_img, map1, map2, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_WRAP)
 
         return faces
 
-    def extract_targeted_frames(self, problem_areas: List[Dict[str, Any]], output_dir: str) -> List[Dict[str, Any]]:
-        """問題領域からターゲットを絞ってフレームを抽出する"""
+    # 問題区間1秒あたりに抽出するフレーム数
+    TARGETED_FRAMES_PER_SEC = 3
+
+    def extract_targeted_frames(self, problem_areas: List[Dict[str, Any]], output_dir: str,
+                                existing_images: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """問題領域からターゲットを絞ってフレームを抽出する
+        動画ごとに問題区間をマージし、時刻順に1回の前方スイープでデコードする。
+        existing_images に含まれる時刻（同一フレーム）は再抽出しない。
+        """
         if not problem_areas:
             return []
 
         self.logger.info(f"{len(problem_areas)}件の問題領域から追加フレームを抽出します。")
-        additional_frames = []
 
         from collections import defaultdict
         problems_by_video = defaultdict(list)
         for problem in problem_areas:
             problems_by_video[problem['video_source']].append(problem)
 
+        existing_by_video = defaultdict(list)
+        for img in existing_images or []:
+            existing_by_video[img['video_source']].append(img['timestamp'])
+
         temp_image_dir = Path(output_dir) / 'temp_images'
         temp_image_dir.mkdir(parents=True, exist_ok=True)
+        hash_index = self._get_hash_index(output_dir)
 
-        for video_path, problems in problems_by_video.items():
-            try:
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened():
-                    self.logger.error(f"動画ファイルを開けませんでした: {video_path}")
+        video_paths = list(problems_by_video)
+        max_workers = max(1, min(self.config.extraction.targeted_workers, len(video_paths)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='targeted') as executor:
+            futures = [
+                executor.submit(self._extract_targeted_from_video, video_path, problems_by_video[video_path],
+                                existing_by_video.get(video_path, []), temp_image_dir, hash_index)
+                for video_path in video_paths
+            ]
+            # 動画の順序は問題領域の出現順で固定する
+            additional_frames = []
+            for future in futures:
+                additional_frames.extend(future.result())
+
+        self.image_writer.flush()
+        if hash_index is not None:
+            hash_index.save()
+        self.logger.info(f"ターゲットフレーム抽出完了: {len(additional_frames)}枚")
+        return additional_frames
+
+    def _extract_targeted_from_video(self, video_path: str, problems: List[Dict[str, Any]],
+                                     existing_timestamps: List[float], temp_image_dir: Path,
+                                     hash_index: Optional[PerceptualHashIndex]) -> List[Dict[str, Any]]:
+        """1本の動画について、マージ済み区間の時刻を前方スイープで抽出する"""
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            self.logger.error(f"動画ファイルを開けませんでした: {video_path}")
+            return []
+
+        frames = []
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            reader = FrameReader(cap, fps,
+                                 mode=self.config.extraction.decode_mode,
+                                 seek_threshold_sec=self.config.extraction.seek_threshold_sec,
+                                 frame_index=self._get_frame_index(video_path))
+
+            intervals = merge_intervals([(p['start_time'], p['end_time']) for p in problems])
+            time_points = self._targeted_time_points(intervals, reader, existing_timestamps)
+            self.logger.info(f"  - {Path(video_path).name}: {len(problems)}件の問題領域 → {len(intervals)}区間, "
+                             f"{len(time_points)}フレームを抽出します。")
+
+            for t in time_points:
+                ret, frame = reader.read_at(t)
+                if not ret:
                     continue
 
-                for problem in problems:
-                    start_time = problem['start_time']
-                    end_time = problem['end_time']
-                    duration = end_time - start_time
+                # 既存画像とほぼ同一のフレームは書き出さない
+                if hash_index is not None:
+                    duplicate = hash_index.check_and_add(frame, {'video_source': video_path, 'timestamp': t})
+                    if duplicate is not None:
+                        self.logger.debug(f"重複フレームをスキップ: {t:.2f}s ≈ {Path(duplicate['video_source']).name} {duplicate['timestamp']:.2f}s")
+                        continue
 
-                    num_frames_to_extract = max(1, int(duration * 3))
+                image_stem = f"{Path(video_path).stem}_targeted_{f'{t:.3f}'.replace('.', '_')}s"
+                image_path = self.image_writer.image_path(temp_image_dir, image_stem)
+                self.image_writer.submit(frame, image_path)
 
-                    self.logger.info(f"  - Problem ({problem['type']}): {start_time:.2f}s - {end_time:.2f}s in {Path(video_path).name}. Extracting {num_frames_to_extract} frames.")
+                frames.append({
+                    'video_source': video_path,
+                    'timestamp': t,
+                    'image_path': str(image_path),
+                    'type': 'targeted'
+                })
+        finally:
+            cap.release()
+        return frames
 
-                    if duration <= 0:
-                        time_points = [start_time]
-                    else:
-                        interval = duration / (num_frames_to_extract + 1)
-                        time_points = [start_time + interval * (i + 1) for i in range(num_frames_to_extract)]
-
-                    for t in time_points:
-                        cap.set(cv2.CAP_PROP_POS_MSEC, int(t * 1000))
-                        ret, frame = cap.read()
-
-                        if not ret:
-                            continue
-
-                        image_name = f"{Path(video_path).stem}_targeted_{f'{t:.3f}'.replace('.', '_')}s.jpg"
-                        image_path = temp_image_dir / image_name
-                        cv2.imwrite(str(image_path), frame)
-
-                        frame_data = {
-                            'video_source': video_path,
-                            'timestamp': t,
-                            'image_path': str(image_path),
-                            'type': 'targeted'
-                        }
-                        additional_frames.append(frame_data)
-            finally:
-                if cap and cap.isOpened():
-                    cap.release()
+    def _targeted_time_points(self, intervals: List[Tuple[float, float]], reader: FrameReader,
+                              existing_timestamps: List[float]) -> List[float]:
+        """マージ済み区間から抽出時刻を生成する（同一フレーム・既存フレームは除く）"""
+        existing_frames = {reader.frame_number(t) for t in existing_timestamps}
+        seen_frames = set()
+        time_points = []
+        for start_time, end_time in intervals:
+            duration = end_time - start_time
+            num_frames_to_extract = max(1, int(duration * self.TARGETED_FRAMES_PER_SEC))
+            if duration <= 0:
+                candidates = [start_time]
+            else:
+                interval = duration / (num_frames_to_extract + 1)
+                candidates = [start_time + interval * (i + 1) for i in range(num_frames_to_extract)]
 
-        self.logger.info(f"ターゲットフレーム抽出完了: {len(additional_frames)}枚")
-        return additional_frames
+            for t in candidates:
+                frame_index = reader.frame_number(t)
+                if frame_index in existing_frames or frame_index in seen_frames:
+                    continue
+                seen_frames.add(frame_index)
+                time_points.append(t)
+        return time_points
+
+
+def merge_intervals(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """重なる・接する区間をマージして開始時刻順に返す"""
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted((min(s, e), max(s, e)) for s, e in intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,343 @@
+# core/yolo_backends.py - YOLO推論バックエンド（PyTorch / ONNX Runtime / OpenVINO）
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from models.config_models import YoloConfig
+from utils.file_utils import process_file_lock, weights_fingerprint
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnxruntime', 'openvino')
+
+# エクスポート先ごとのロックファイル（プロセス間でエクスポートを直列化する）
+EXPORT_LOCK_FILENAME = '.export.lock'
+
+# プロセス内で共有するバックエンド（同じモデル設定なら ProcessingEngine を作り直しても再読み込みしない）
+_shared_backends: Dict[Tuple, 'DetectorBackend'] = {}
+_shared_lock = threading.Lock()
+
+
+def default_cache_dir() -> Path:
+    return Path.home() / '.cache' / 'video_3dgs'
+
+
+def default_export_dir() -> Path:
+    return default_cache_dir() / 'models'
+
+
+class DetectorBackend:
+    """画像のリストを受け取り、画像ごとの検出結果を返す推論バックエンド
+
+    検出結果は (N, 6) の float32 配列で、各行は正規化座標 x1, y1, x2, y2, 信頼度, クラスID。
+    """
+
+    name = 'base'
+    # 推論時の信頼度・IoU 閾値（ultralytics の predict 既定値と同じ）
+    CONF_THRESHOLD = 0.25
+    IOU_THRESHOLD = 0.7
+    MAX_DETECTIONS = 300
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        self.conf_threshold = self.CONF_THRESHOLD
+
+    def detect(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        raise NotImplementedError
+
+
+class TorchBackend(DetectorBackend):
+    """ultralytics の PyTorch モデルによる推論"""
+
+    name = 'torch'
+
+    def __init__(self, config: YoloConfig):
+        super().__init__()
+        import torch
+        from ultralytics import YOLO
+
+        self.config = config
+        if config.num_threads > 0:
+            torch.set_num_threads(config.num_threads)
+        self.model = YOLO(config.model_name)
+        if torch.cuda.is_available() and config.device == 'cuda':
+            logger.info("CUDAが利用可能です。モデルをGPUに転送します。")
+            self.model.to('cuda')
+        else:
+            logger.info("CUDAが利用不可、または設定で無効化されています。CPUで実行します。")
+        self.names = dict(self.model.names)
+
+    def detect(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        import torch
+
+        # リストを渡すと1バッチで推論される。verbose=Falseでログ出力を抑制
+        results = self.model(images, imgsz=self.config.imgsz, conf=self.conf_threshold,
+                             iou=self.IOU_THRESHOLD, max_det=self.MAX_DETECTIONS, verbose=False)
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            data = torch.cat([boxes.xyxyn, boxes.conf[:, None], boxes.cls[:, None]], dim=1)
+            detections.append(data.cpu().numpy().astype(np.float32))
+        return detections
+
+
+class ExportedBackend(DetectorBackend):
+    """エクスポート済みモデルの推論（前処理・後処理は ultralytics の predict と同じ手順で行う）"""
+
+    STRIDE = 32
+    PAD_VALUE = 114
+    # クラスごとの NMS をまとめて行うためのクラス別オフセット
+    MAX_WH = 7680
+
+    def __init__(self, config: YoloConfig, names: Dict[int, str]):
+        super().__init__()
+        self.config = config
+        self.names = names
+
+    def detect(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        if not images:
+            return []
+        # 同じサイズの画像だけのバッチは余白を最小にした矩形入力、混在時は正方形入力にする
+        same_shape = len({image.shape[:2] for image in images}) == 1
+        batch = []
+        for image in images:
+            padded = letterbox(image, self.config.imgsz, self.STRIDE, auto=same_shape, pad_value=self.PAD_VALUE)
+            batch.append(padded)
+        blob = np.stack(batch)[..., ::-1].transpose(0, 3, 1, 2)  # BGR→RGB, BHWC→BCHW
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+        output = self._infer(blob)
+        input_shape = blob.shape[2:]
+        return [self._postprocess(pred, input_shape, image.shape[:2]) for pred, image in zip(output, images)]
+
+    def _infer(self, blob: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _postprocess(self, pred: np.ndarray, input_shape: Tuple[int, int],
+                     image_shape: Tuple[int, int]) -> np.ndarray:
+        num_classes = len(self.names)
+        if pred.shape[0] == 4 + num_classes:
+            # (4 + nc, anchors): xywh とクラススコア → 信頼度閾値と NMS
+            pred = pred.T
+            scores = pred[:, 4:]
+            cls = scores.argmax(axis=1)
+            conf = scores[np.arange(len(scores)), cls]
+            keep = conf > self.conf_threshold
+            boxes = xywh_to_xyxy(pred[keep, :4])
+            conf, cls = conf[keep], cls[keep]
+            order = np.argsort(-conf, kind='stable')
+            boxes, conf, cls = boxes[order], conf[order], cls[order]
+            keep = nms(boxes + cls[:, None] * self.MAX_WH, self.IOU_THRESHOLD)[:self.MAX_DETECTIONS]
+            boxes, conf, cls = boxes[keep], conf[keep], cls[keep]
+        else:
+            # NMS 込みでエクスポートされたモデル: (max_det, 6) = x1, y1, x2, y2, conf, cls
+            pred = pred[pred[:, 4] > self.conf_threshold]
+            boxes, conf, cls = pred[:, :4], pred[:, 4], pred[:, 5]
+
+        h, w = image_shape
+        boxes = scale_boxes(boxes, input_shape, image_shape)
+        boxes /= np.array([w, h, w, h], dtype=np.float32)
+        return np.concatenate([boxes, conf[:, None], cls[:, None]], axis=1).astype(np.float32)
+
+
+class OnnxRuntimeBackend(ExportedBackend):
+    name = 'onnxruntime'
+
+    def __init__(self, config: YoloConfig, model_path: Path, names: Dict[int, str]):
+        super().__init__(config, names)
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if config.num_threads > 0:
+            options.intra_op_num_threads = config.num_threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _infer(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    name = 'openvino'
+
+    def __init__(self, config: YoloConfig, model_path: Path, names: Dict[int, str]):
+        super().__init__(config, names)
+        import openvino as ov
+
+        core = ov.Core()
+        ov_config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if config.num_threads > 0:
+            ov_config['INFERENCE_NUM_THREADS'] = config.num_threads
+        self.compiled_model = core.compile_model(core.read_model(str(model_path)), 'CPU', ov_config)
+        # compiled_model の推論リクエストはスレッドセーフでないため直列化する
+        self._lock = threading.Lock()
+
+    def _infer(self, blob: np.ndarray) -> np.ndarray:
+        with self._lock:
+            return self.compiled_model(blob)[0]
+
+
+def create_backend(config: YoloConfig) -> DetectorBackend:
+    """設定に応じたバックエンドを作成する（ライブラリが無い場合は PyTorch にフォールバック）"""
+    backend = config.backend
+    if backend not in BACKENDS:
+        raise ValueError(f"未対応の推論バックエンドです: {backend} (対応: {', '.join(BACKENDS)})")
+    if backend == 'torch':
+        return TorchBackend(config)
+
+    try:
+        if backend == 'onnxruntime':
+            import onnxruntime  # noqa: F401
+        else:
+            import openvino  # noqa: F401
+    except ImportError:
+        logger.warning(f"{backend} がインストールされていないため PyTorch で推論します。")
+        return TorchBackend(config)
+
+    onnx_path, names = export_onnx(config)
+    if backend == 'onnxruntime':
+        logger.info(f"ONNX Runtime で推論します: {onnx_path}")
+        return OnnxRuntimeBackend(config, onnx_path, names)
+
+    xml_path = convert_openvino(onnx_path)
+    logger.info(f"OpenVINO で推論します: {xml_path}")
+    return OpenVinoBackend(config, xml_path, names)
+
+
+def get_shared_backend(config: YoloConfig) -> DetectorBackend:
+    """モデル設定ごとにプロセスで1つだけ作成したバックエンドを返す
+
+    読み込み中に別スレッド（バックグラウンドのウォームアップなど）から呼ばれた場合は
+    読み込みの完了を待って同じインスタンスを返す。
+    """
+    key = (config.backend, config.model_name, config.device, config.imgsz, config.export_dir, config.num_threads)
+    with _shared_lock:
+        if key not in _shared_backends:
+            _shared_backends[key] = create_backend(config)
+        return _shared_backends[key]
+
+
+def clear_shared_backends():
+    """共有バックエンドを破棄する（次回の利用時に読み込み直す）"""
+    with _shared_lock:
+        _shared_backends.clear()
+
+
+def export_stem(config: YoloConfig) -> str:
+    """エクスポート済みモデルのファイル名（拡張子なし）
+
+    ローカルの重みファイルは内容の識別子も含める（同名の別モデル・同じパスに再学習した重みを取り違えない）。
+    """
+    stem = Path(config.model_name).stem
+    fingerprint = weights_fingerprint(config.model_name)
+    if fingerprint:
+        stem = f"{stem}_{fingerprint[:16]}"
+    return f"{stem}_{config.imgsz}"
+
+
+def export_onnx(config: YoloConfig) -> Tuple[Path, Dict[int, str]]:
+    """モデルを ONNX にエクスポートしてキャッシュする（モデル名・重みの内容・入力サイズごとに1回だけ）
+
+    並列抽出ワーカーが同時にエクスポートしないよう、確認からエクスポートまでをファイルロックで排他する
+    （ultralytics は重みの隣に書き出すため、入力サイズが違っても同じファイルを使う）。
+    """
+    export_dir = Path(config.export_dir) if config.export_dir else default_export_dir()
+    stem = export_stem(config)
+    onnx_path = export_dir / f"{stem}.onnx"
+    names_path = export_dir / f"{stem}.names.json"
+
+    export_dir.mkdir(parents=True, exist_ok=True)
+    with process_file_lock(export_dir / EXPORT_LOCK_FILENAME):
+        if not (onnx_path.exists() and names_path.exists()):
+            from ultralytics import YOLO
+
+            logger.info(f"YOLOモデルを ONNX にエクスポートしています: {config.model_name} (imgsz={config.imgsz})")
+            model = YOLO(config.model_name)
+            exported = model.export(format='onnx', imgsz=config.imgsz, dynamic=True, verbose=False)
+            shutil.move(str(exported), str(onnx_path))
+            names_path.write_text(json.dumps({str(k): v for k, v in model.names.items()}, ensure_ascii=False),
+                                  encoding='utf-8')
+        names = {int(k): v for k, v in json.loads(names_path.read_text(encoding='utf-8')).items()}
+    return onnx_path, names
+
+
+def convert_openvino(onnx_path: Path) -> Path:
+    """エクスポート済みの ONNX を OpenVINO IR（.xml / .bin）に変換してキャッシュする
+
+    ONNX のエクスポートと同じロックで排他し、一時ディレクトリに書いてから .bin、.xml の順に置き換える
+    （.xml があれば変換済みとみなすため、読み込み側が書きかけの IR を読むことはない）。
+    """
+    xml_path = onnx_path.with_suffix('.xml')
+    with process_file_lock(onnx_path.parent / EXPORT_LOCK_FILENAME):
+        if not xml_path.exists():
+            import openvino as ov
+
+            logger.info(f"ONNX モデルを OpenVINO IR に変換しています: {onnx_path}")
+            with tempfile.TemporaryDirectory(dir=onnx_path.parent, prefix='.convert_') as tmp_dir:
+                tmp_xml = Path(tmp_dir) / xml_path.name
+                ov.save_model(ov.convert_model(str(onnx_path)), str(tmp_xml))
+                os.replace(tmp_xml.with_suffix('.bin'), xml_path.with_suffix('.bin'))
+                os.replace(tmp_xml, xml_path)
+    return xml_path
+
+
+def letterbox(image: np.ndarray, imgsz: int, stride: int = 32, auto: bool = True,
+              pad_value: int = 114) -> np.ndarray:
+    """アスペクト比を保って imgsz に縮小し、余白を埋める（auto=True なら余白を stride の倍数まで削る）"""
+    h, w = image.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = imgsz - new_w, imgsz - new_h
+    if auto:
+        dw, dh = dw % stride, dh % stride
+    dw, dh = dw / 2, dh / 2
+
+    if (w, h) != (new_w, new_h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                              value=(pad_value, pad_value, pad_value))
+
+
+def scale_boxes(boxes: np.ndarray, input_shape: Tuple[int, int], image_shape: Tuple[int, int]) -> np.ndarray:
+    """レターボックス入力の座標を元画像のピクセル座標に戻す"""
+    gain = min(input_shape[0] / image_shape[0], input_shape[1] / image_shape[1])
+    pad_x = round((input_shape[1] - image_shape[1] * gain) / 2 - 0.1)
+    pad_y = round((input_shape[0] - image_shape[0] * gain) / 2 - 0.1)
+    boxes = (boxes - np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)) / gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+    return boxes.astype(np.float32)
+
+
+def xywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+    xy, half = boxes[:, :2], boxes[:, 2:4] / 2
+    return np.concatenate([xy - half, xy + half], axis=1)
+
+
+def nms(boxes: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """信頼度順に並んだ boxes に対する貪欲 NMS。残す行のインデックスを返す"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.arange(len(boxes))
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        ih = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
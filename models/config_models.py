@@ -9,6 +9,43 @@ class ProcessingConfig:
     cuda_enabled: bool = True
     max_iterations: int = 10
     memory_limit_gb: int = 16
+    # 初期フレーム抽出の並列ワーカープロセス数（1以下で動画を逐次処理）
+    extraction_workers: int = 1
+
+@dataclass
+class PrefilterConfig:
+    # YOLO推論前の軽量チェック（縮小画像上で露出・ブレ・重複を判定）
+    enabled: bool = True
+    proxy_width: int = 1024
+    # ラプラシアン分散がこれ未満ならブレとみなす
+    min_sharpness: float = 30.0
+    # dark_level 未満 / bright_level 以上の画素の割合が上限を超えると露出不良
+    dark_level: int = 16
+    bright_level: int = 240
+    max_dark_ratio: float = 0.8
+    max_bright_ratio: float = 0.5
+    # 直前の通過フレームとの平均差分（0〜1）がこれ未満なら重複
+    duplicate_threshold: float = 0.01
+
+@dataclass
+class DedupeConfig:
+    # 知覚ハッシュによる近似重複画像の除外（動画間・反復間で共有し出力先に保存）
+    enabled: bool = True
+    # 'phash' または 'dhash'
+    hash_method: str = 'phash'
+    # ハミング距離がこれ以下なら重複とみなす（64bit中）
+    max_distance: int = 4
+
+@dataclass
+class FacePruningConfig:
+    # 空・天井・無地の壁など特徴の乏しいキューブフェイスを書き出し前に除外する
+    enabled: bool = True
+    # 判定に使う縮小画像の長辺（px）
+    proxy_size: int = 256
+    # Sobel 勾配強度がこれを超える画素をエッジとみなす
+    gradient_threshold: float = 40.0
+    # エッジ画素の割合がこれ未満の面を低テクスチャとして除外する
+    min_edge_ratio: float = 0.02
 
 @dataclass
 class ExtractionConfig:
@@ -16,23 +53,75 @@ class ExtractionConfig:
     min_interval_sec: float = 1.0
     max_interval_sec: float = 8.0
     direction_offset_range: int = 15
+    # 動き量に応じて min_interval_sec〜max_interval_sec の範囲で間隔を伸縮するか
+    adaptive_interval: bool = True
+    # 1サンプルあたりの目標動き量（縮小画像の幅に対する移動量の比）
+    target_motion_ratio: float = 0.05
+    # 動き推定に使う縮小画像の幅（px）
+    motion_proxy_width: int = 320
+    # フレームデコード方式: 'sequential'（前方デコード＋grab読み飛ばし）または 'seek'（サンプル毎にシーク）
+    decode_mode: str = 'sequential'
+    # sequential 時、次のサンプルがこの秒数より離れていればシークに切り替える
+    seek_threshold_sec: float = 10.0
+    # フレームインデックス（PTS・キーフレーム位置）を作成し、正確なランダムアクセスに使うか
+    use_frame_index: bool = True
+    # フレームインデックスの保存先（空なら動画の隣にサイドカーとして保存）
+    frame_index_dir: str = ''
+    # 品質フィルタ・動き推定・事前フィルタに使う縮小プロキシの幅（px, 0 なら原寸のまま）
+    # フル解像度のフレームは品質フィルタを通過したものだけ保持・リマップする
+    filter_proxy_width: int = 1280
+    # 品質フィルタの単位: 'equirect'（人物がいればフレームごと除外）または
+    # 'faces'（6面をまとめて推論し、人物を含む面だけを除外する）
+    filter_mode: str = 'equirect'
+    # キューブフェイス remap テーブルキャッシュの上限（MB）
+    remap_cache_mb: int = 256
+    # 抽出パイプライン（デコード→フィルタ→リマップ→エンコード）のステージ間キュー深さ
+    pipeline_queue_depth: int = 4
+    # ステージごとのスレッド数（YOLOモデルはスレッドセーフでないためフィルタは通常1）
+    # エンコード・保存は ImageWriter のワーカー（output.writer_workers）が担当する
+    filter_workers: int = 1
+    remap_workers: int = 2
+    # ターゲット再抽出で並列に処理する動画数
+    targeted_workers: int = 2
+    prefilter: PrefilterConfig = field(default_factory=PrefilterConfig)
+    dedupe: DedupeConfig = field(default_factory=DedupeConfig)
+    face_pruning: FacePruningConfig = field(default_factory=FacePruningConfig)
     cube_faces: List[str] = field(default_factory=lambda: ['front', 'back', 'left', 'right', 'up', 'down'])
 
 @dataclass
 class PersonFilterConfig:
     confidence_threshold: float = 0.5
     area_ratio_threshold: float = 0.15
-    center_distance_threshold: float = 0.3
+    # 0 より大きい場合、面積比の条件を満たす検出のうち画像中心からこの距離（正規化座標）以内のものだけで不採用にする（0 で無効）
+    center_distance_threshold: float = 0.0
 
 @dataclass
 class YoloFilteringConfig:
     person: PersonFilterConfig = field(default_factory=PersonFilterConfig)
+    # 判定対象のクラス名（閾値は person の設定を共通で使う）
     enabled_classes: List[str] = field(default_factory=lambda: ['person'])
 
 @dataclass
 class YoloConfig:
     model_name: str = 'yolov8n.pt'
     device: str = 'cuda'
+    # 1回のモデル呼び出しで推論するフレーム数
+    batch_size: int = 8
+    # 推論バックエンド: 'torch' / 'onnxruntime' / 'openvino'（未インストールなら torch にフォールバック）
+    backend: str = 'torch'
+    # 推論入力サイズ（px）。エクスポート済みモデルはモデル名と入力サイズごとにキャッシュされる
+    imgsz: int = 640
+    # エクスポート済みモデルの保存先（空なら ~/.cache/video_3dgs/models）
+    export_dir: str = ''
+    # 推論スレッド数（0 ならライブラリの既定値）
+    num_threads: int = 0
+    # 検出結果の永続キャッシュ（閾値だけを変えた再実行では推論を省略する）
+    detection_cache_enabled: bool = True
+    # キャッシュファイル（空なら ~/.cache/video_3dgs/detections.sqlite3）
+    detection_cache_path: str = ''
+    detection_cache_mb: int = 256
+    # ProcessingEngine 作成時にバックグラウンドでモデルを読み込んでおくか（False なら最初の推論時に読み込む）
+    background_warmup: bool = False
     filtering: YoloFilteringConfig = field(default_factory=YoloFilteringConfig)
 
 @dataclass
@@ -49,9 +138,25 @@ class RealityScanConfig:
     max_instances: int = 2
     # タイムアウト（秒）: RealityScan が応答しない場合の待機時間
     timeout_seconds: int = 600
+    # 出力がこの秒数途絶えたら停止とみなして終了する（0 で無効）
+    stall_timeout_seconds: int = 300
+    # 出力行から進捗（%）を読み取る正規表現（percent グループまたは最初のグループ）
+    progress_pattern: str = r'(?P<percent>\d{1,3}(?:\.\d+)?)\s*%'
     # キューブフェイス画像のみを RealityScan に渡すか
     use_cube_faces: bool = True
     alignment_qualities: List[str] = field(default_factory=lambda: ['draft', 'normal', 'high'])
+    # 各反復で実行するアライメント品質。複数指定すると max_instances 個まで同時に実行し、
+    # 品質スコアが最良の結果を採用する（例: ['draft', 'normal']）
+    iteration_qualities: List[str] = field(default_factory=lambda: ['normal'])
+    # 2回目以降の反復で、前回アライメント済みの画像に XMP サイドカーで姿勢の事前情報を与えるか
+    use_pose_priors: bool = True
+    # XMP の姿勢の扱い: 'initial'（初期値として再調整）/ 'exact'（ほぼ固定）/ 'locked'（固定）
+    pose_prior: str = 'initial'
+    # 配置した画像・XMP の内容と品質が同じ実行はキャッシュ済みの結果を使い、RealityScan を起動しない
+    alignment_cache_enabled: bool = True
+    # キャッシュディレクトリ（空なら ~/.cache/video_3dgs/alignments）
+    alignment_cache_dir: str = ''
+    alignment_cache_mb: int = 512
     stop_conditions: StopConditionsConfig = field(default_factory=StopConditionsConfig)
 
 @dataclass
@@ -61,6 +166,9 @@ class OutputConfig:
     generate_pointcloud: bool = True
     image_format: str = 'jpeg'
     image_quality: int = 95
+    # ImageWriter のエンコードスレッド数と未完了書き出しの上限
+    writer_workers: int = 2
+    writer_max_backlog: int = 32
 
 @dataclass
 class LoggingConfig:
@@ -1,9 +1,12 @@
 # models/data_models.py - データモデル定義
+from collections.abc import Mapping, Sequence
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
+
 @dataclass
 class VideoData:
     """動画データモデル"""
@@ -28,6 +31,269 @@ class FrameData:
     is_valid: bool
     rejection_reason: Optional[str] = None
 
+class DetectionRecord:
+    """1フレーム分の検出結果を配列で保持するレコード
+
+    座標は画像サイズで正規化した x1, y1, x2, y2。推論をやり直さずに閾値を変えて
+    再判定できるよう、面積比・中心距離はまとめて配列で計算する。
+    """
+
+    __slots__ = ('boxes', 'conf', 'cls')
+
+    def __init__(self, boxes: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.int16).reshape(-1)
+
+    @classmethod
+    def from_array(cls, data: np.ndarray) -> 'DetectionRecord':
+        """(N, 6) = x1, y1, x2, y2, 信頼度, クラスID の配列から作る"""
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        return cls(data[:, :4], data[:, 4], data[:, 5])
+
+    @classmethod
+    def empty(cls) -> 'DetectionRecord':
+        return cls.from_array(np.empty((0, 6), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+    def to_array(self) -> np.ndarray:
+        return np.concatenate([self.boxes, self.conf[:, None], self.cls[:, None].astype(np.float32)], axis=1)
+
+    @property
+    def area_ratio(self) -> np.ndarray:
+        """画像全体に対するボックス面積の比"""
+        return (self.boxes[:, 2] - self.boxes[:, 0]) * (self.boxes[:, 3] - self.boxes[:, 1])
+
+    @property
+    def center_distance(self) -> np.ndarray:
+        """ボックス中心と画像中心の距離（正規化座標）"""
+        centers = (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+        return np.hypot(centers[:, 0] - 0.5, centers[:, 1] - 0.5)
+
+    def violations(self, class_ids: List[int], confidence_threshold: float, area_ratio_threshold: float,
+                   center_distance_threshold: float) -> np.ndarray:
+        """フレームを不採用にする検出のマスク
+
+        対象クラスで信頼度が閾値以上、かつ面積比が閾値以上の検出が該当する。center_distance_threshold > 0 なら
+        さらに画像中心から center_distance_threshold 以内にあるものに限る（端に写り込んだ大きな検出は許容する）。
+        """
+        dominant = self.area_ratio >= area_ratio_threshold
+        if center_distance_threshold > 0:
+            dominant &= self.center_distance <= center_distance_threshold
+        return np.isin(self.cls, class_ids) & (self.conf >= confidence_threshold) & dominant
+
+    def to_dicts(self, names: Optional[Dict[int, str]] = None) -> List[Dict[str, Any]]:
+        """FrameData.yolo_detections 形式の辞書リスト"""
+        names = names or {}
+        return [{'class_id': int(c), 'class_name': names.get(int(c), str(int(c))), 'confidence': float(p),
+                 'box': [float(v) for v in box]}
+                for box, p, c in zip(self.boxes, self.conf, self.cls)]
+
+@dataclass
+class FrameVerdict:
+    """品質フィルタの1フレーム分の判定結果"""
+    accepted: bool
+    detections: DetectionRecord
+    rejection_reason: Optional[str] = None
+
+class AlignmentPoses:
+    """アライメント結果の全画像の姿勢を連続した配列で保持するレコード
+
+    rotations は (N, 3, 3)、positions は (N, 3)。画像はコンポーネント順に並び、
+    コンポーネント c の画像は offsets[c]:offsets[c + 1] の範囲にある。
+    ComponentList / ComponentView / ImageView が従来の辞書形式のアクセスを提供する。
+    """
+
+    __slots__ = ('names', 'paths', 'rotations', 'positions', 'component_index',
+                 'component_ids', 'component_image_counts', 'component_errors', 'offsets')
+
+    def __init__(self, names: np.ndarray, paths: np.ndarray, rotations: np.ndarray, positions: np.ndarray,
+                 component_index: np.ndarray, component_ids: np.ndarray,
+                 component_image_counts: np.ndarray, component_errors: np.ndarray):
+        self.names = np.asarray(names, dtype=str)
+        self.paths = np.asarray(paths, dtype=str)
+        self.rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3)
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.component_index = np.asarray(component_index, dtype=np.int32)
+        self.component_ids = np.asarray(component_ids, dtype=str)
+        self.component_image_counts = np.asarray(component_image_counts, dtype=np.int64)
+        self.component_errors = np.asarray(component_errors, dtype=np.float64)
+        if len(self.component_index) and np.any(np.diff(self.component_index) < 0):
+            order = np.argsort(self.component_index, kind='stable')
+            self.names, self.paths = self.names[order], self.paths[order]
+            self.rotations, self.positions = self.rotations[order], self.positions[order]
+            self.component_index = self.component_index[order]
+        counts = np.bincount(self.component_index, minlength=len(self.component_ids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def num_components(self) -> int:
+        return len(self.component_ids)
+
+    def component_slice(self, c: int) -> slice:
+        return slice(int(self.offsets[c]), int(self.offsets[c + 1]))
+
+
+class ImageView(Mapping):
+    """AlignmentPoses の1画像を {'name', 'path', 'pose'} の辞書として見せるビュー"""
+
+    __slots__ = ('_poses', '_i')
+    _KEYS = ('name', 'path', 'pose')
+
+    def __init__(self, poses: AlignmentPoses, i: int):
+        self._poses = poses
+        self._i = i
+
+    @property
+    def rotation(self) -> np.ndarray:
+        return self._poses.rotations[self._i]
+
+    @property
+    def position(self) -> np.ndarray:
+        return self._poses.positions[self._i]
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'name':
+            return str(self._poses.names[self._i])
+        if key == 'path':
+            return str(self._poses.paths[self._i])
+        if key == 'pose':
+            tx, ty, tz = (float(v) for v in self.position)
+            return {'tx': tx, 'ty': ty, 'tz': tz, 'rotation': self.rotation.tolist()}
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+
+class _SequenceView(Sequence):
+    """リストと比較できる読み取り専用の列ビュー"""
+
+    __slots__ = ()
+    __hash__ = None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+
+class ImageListView(_SequenceView):
+    """コンポーネント内の画像列のビュー"""
+
+    __slots__ = ('_poses', '_slice')
+
+    def __init__(self, poses: AlignmentPoses, index_slice: slice):
+        self._poses = poses
+        self._slice = index_slice
+
+    def __len__(self) -> int:
+        return self._slice.stop - self._slice.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return ImageView(self._poses, self._slice.start + i)
+
+
+class ComponentView(Mapping):
+    """1コンポーネントを {'id', 'image_count', 'reprojection_error', 'images'} の辞書として見せるビュー
+
+    names / paths / rotations / positions は配列をそのまま（コピーせずに）返す。
+    """
+
+    __slots__ = ('_poses', '_c')
+    _KEYS = ('id', 'image_count', 'reprojection_error', 'images')
+
+    def __init__(self, poses: AlignmentPoses, c: int):
+        self._poses = poses
+        self._c = c
+
+    @property
+    def names(self) -> np.ndarray:
+        return self._poses.names[self._poses.component_slice(self._c)]
+
+    @property
+    def paths(self) -> np.ndarray:
+        return self._poses.paths[self._poses.component_slice(self._c)]
+
+    @property
+    def rotations(self) -> np.ndarray:
+        return self._poses.rotations[self._poses.component_slice(self._c)]
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._poses.positions[self._poses.component_slice(self._c)]
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'id':
+            return str(self._poses.component_ids[self._c])
+        if key == 'image_count':
+            return int(self._poses.component_image_counts[self._c])
+        if key == 'reprojection_error':
+            return float(self._poses.component_errors[self._c])
+        if key == 'images':
+            return ImageListView(self._poses, self._poses.component_slice(self._c))
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self['id'], 'image_count': self['image_count'], 'reprojection_error': self['reprojection_error'],
+                'images': [dict(image) for image in self['images']]}
+
+
+class ComponentList(_SequenceView):
+    """アライメント結果の components（ComponentView の列）"""
+
+    __slots__ = ('poses',)
+
+    def __init__(self, poses: AlignmentPoses):
+        self.poses = poses
+
+    def __len__(self) -> int:
+        return self.poses.num_components
+
+    def __getitem__(self, c):
+        if isinstance(c, slice):
+            return [self[i] for i in range(*c.indices(len(self)))]
+        if c < 0:
+            c += len(self)
+        if not 0 <= c < len(self):
+            raise IndexError(c)
+        return ComponentView(self.poses, c)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """JSON 出力用の辞書リスト"""
+        return [component.to_dict() for component in self]
+
+
+def component_pose_arrays(component: Mapping) -> Tuple[List[str], List[str], np.ndarray, np.ndarray]:
+    """コンポーネントの画像名・パス・回転 (N, 3, 3)・位置 (N, 3) を返す（辞書形式のコンポーネントにも対応）"""
+    if isinstance(component, ComponentView):
+        return component.names.tolist(), component.paths.tolist(), component.rotations, component.positions
+    images = component.get('images', [])
+    rotations = np.array([img['pose']['rotation'] for img in images], dtype=np.float64).reshape(-1, 3, 3)
+    positions = np.array([[img['pose'][k] for k in ('tx', 'ty', 'tz')] for img in images],
+                         dtype=np.float64).reshape(-1, 3)
+    return [img['name'] for img in images], [img.get('path') for img in images], rotations, positions
+
 @dataclass
 class AlignmentResult:
     """アライメント結果モデル"""
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""scripts/realityscan_simulator.py
+RealityScan CLI のローカルシミュレータ（実機の無い環境で適応的アライメントを計測する用途）
+
+RealityScanInterface が渡す引数（-headless / -set / -addFolder / -align / -exportXMP /
+-exportLatestComponents）を受け取り、配置済みフォルダの画像を読んでアライメント結果 XML を書き出す。
+標準ライブラリのみを使うので、どの python3 でもすぐに起動できる。
+
+モデル:
+  - 画像名 "<動画名>_frame_<フレーム番号>[__face_<面>]" と、ターゲット抽出の
+    "<動画名>_targeted_<秒>s"（例: walk_targeted_12_500s）から動画上の位置（フレーム単位、秒は FPS で換算）を読み、
+    動画ごとに位置の間隔が MAX_GAP_FRAMES を超える箇所でコンポーネントを分ける（1フレームしか無いグループは未整列）
+  - 画像名のハッシュで DROP_RATIO の割合の画像を未整列にする（毎回同じ画像）
+  - 姿勢は半径 5 の円軌道上のカメラ＋面の向き。同じ名前の XMP サイドカーがあればその姿勢を使う
+  - 最大のコンポーネント以外は先頭のカメラを原点とする独立した座標系で出力する
+  - 所要時間は 画像数 × LATENCY × 品質係数（draft 0.5 / normal 1 / high 2）。XMP の事前情報が
+    ある画像は半分の時間で済む。処理中は "Aligning images N%" を出力する
+
+設定は環境変数で行う:
+  REALITYSCAN_SIM_LATENCY         1枚あたりの秒数（既定 0.01）
+  REALITYSCAN_SIM_MAX_GAP_FRAMES  同じコンポーネントとみなすフレーム間隔の上限（既定 45）
+  REALITYSCAN_SIM_DROP_RATIO      未整列にする画像の割合（既定 0.02）
+  REALITYSCAN_SIM_FPS             ターゲット抽出画像の秒をフレーム位置に換算するフレームレート（既定 30）
+
+使い方（Linux / macOS）:
+  chmod +x scripts/realityscan_simulator.py
+  # configs/*.yaml の realityscan.executable_path にこのスクリプトのパスを指定する
+"""
+import math
+import os
+import re
+import sys
+import time
+import zlib
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff'}
+# 値を1つ取るオプション
+VALUE_OPTIONS = {'-set', '-addFolder', '-exportXMP', '-exportLatestComponents', '-load', '-save'}
+QUALITY_FACTORS = {'draft': 0.5, 'normal': 1.0, 'high': 2.0}
+QUALITY_ERROR_OFFSETS = {'draft': 0.4, 'normal': 0.0, 'high': -0.2}
+PRIOR_LATENCY_FACTOR = 0.5
+FRAME_NAME_PATTERN = re.compile(r'^(?P<video>.*?)_?frame_(?P<frame>\d+)(?:__face_(?P<face>\w+))?$')
+TARGETED_NAME_PATTERN = re.compile(
+    r'^(?P<video>.*?)_targeted_(?P<seconds>\d+)_(?P<fraction>\d+)s(?:__face_(?P<face>\w+))?$')
+# 面ごとのカメラの向き（ヨー, ピッチ: 度）。VideoExtractor.FACE_ORIENTS と同じ（起動を軽くするため複製）
+FACE_DIRECTIONS = {'front': (0, 0), 'right': (90, 0), 'back': (180, 0), 'left': (-90, 0),
+                   'up': (0, 90), 'down': (0, -90)}
+ORBIT_RADIUS = 5.0
+ORBIT_STEP_RAD = 0.01
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def parse_args(argv):
+    """引数を (オプション, 値) の列に分解する"""
+    commands = []
+    i = 0
+    while i < len(argv):
+        option = argv[i]
+        if option in VALUE_OPTIONS:
+            if i + 1 >= len(argv):
+                raise SystemExit(f"{option} requires a value")
+            commands.append((option, argv[i + 1]))
+            i += 2
+        else:
+            commands.append((option, None))
+            i += 1
+    return commands
+
+
+def parse_image_name(stem: str, fallback_index: int, fps: float):
+    """画像名から (動画名, フレーム位置, 面) を読む。形式が違う場合は並び順をフレーム位置とする"""
+    match = FRAME_NAME_PATTERN.match(stem)
+    if match is not None:
+        return match.group('video'), float(match.group('frame')), match.group('face')
+    match = TARGETED_NAME_PATTERN.match(stem)
+    if match is not None:
+        seconds = float(f"{match.group('seconds')}.{match.group('fraction')}")
+        return match.group('video'), seconds * fps, match.group('face')
+    return '', float(fallback_index), None
+
+
+def read_xmp_pose(path: Path):
+    """XMP サイドカーの姿勢を読む。Rotation はワールド→カメラなので転置して返す"""
+    try:
+        text = path.read_text(encoding='utf-8')
+    except OSError:
+        return None
+    rotation = re.search(r'<xcr:Rotation>([^<]*)</xcr:Rotation>', text)
+    position = re.search(r'<xcr:Position>([^<]*)</xcr:Position>', text)
+    if rotation is None or position is None:
+        return None
+    try:
+        r = [float(v) for v in rotation.group(1).split()]
+        t = [float(v) for v in position.group(1).split()]
+    except ValueError:
+        return None
+    if len(r) != 9 or len(t) != 3:
+        return None
+    return [[r[0], r[3], r[6]], [r[1], r[4], r[7]], [r[2], r[5], r[8]]], t
+
+
+def synthetic_pose(frame: float, face):
+    """円軌道上のカメラ位置と面の向きから (カメラ→ワールド回転, 位置) を作る"""
+    angle = frame * ORBIT_STEP_RAD
+    position = [ORBIT_RADIUS * math.cos(angle), 0.0, ORBIT_RADIUS * math.sin(angle)]
+    yaw_deg, pitch_deg = FACE_DIRECTIONS.get(face or 'front', (0, 0))
+    yaw = angle + math.radians(yaw_deg)
+    pitch = math.radians(pitch_deg)
+    cy, sy, cp, sp = math.cos(yaw), math.sin(yaw), math.cos(pitch), math.sin(pitch)
+    rotation = [[cy, sy * sp, sy * cp],
+                [0.0, cp, -sp],
+                [-sy, cy * sp, cy * cp]]
+    return rotation, position
+
+
+def is_dropped(name: str, drop_ratio: float) -> bool:
+    return (zlib.crc32(name.encode('utf-8')) % 10000) / 10000.0 < drop_ratio
+
+
+def build_components(image_dir: Path, max_gap_frames: float, drop_ratio: float, fps: float = 30.0):
+    """フォルダの画像をコンポーネントに分ける。戻り値は (全画像数, コンポーネント, 事前情報付き画像数)"""
+    paths = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    frames = {}
+    for index, path in enumerate(paths):
+        video, frame, face = parse_image_name(path.stem, index, fps)
+        frames.setdefault((video, frame), []).append((path, face))
+
+    groups = []
+    for video in sorted({video for video, _ in frames}):
+        frame_numbers = sorted(frame for v, frame in frames if v == video)
+        current = []
+        for frame in frame_numbers:
+            if current and frame - current[-1] > max_gap_frames:
+                groups.append((video, current))
+                current = []
+            current.append(frame)
+        if current:
+            groups.append((video, current))
+
+    components = []
+    with_priors = 0
+    for video, frame_numbers in groups:
+        if len(frame_numbers) < 2:
+            continue
+        images = []
+        for frame in frame_numbers:
+            for path, face in frames[(video, frame)]:
+                if is_dropped(path.name, drop_ratio):
+                    continue
+                prior = read_xmp_pose(path.with_suffix('.xmp'))
+                if prior is not None:
+                    with_priors += 1
+                rotation, position = prior or synthetic_pose(frame, face)
+                images.append({'name': path.name, 'path': str(path), 'rotation': rotation, 'position': position})
+        if images:
+            components.append(images)
+
+    components.sort(key=len, reverse=True)
+    # 最大以外のコンポーネントは独立した座標系（先頭カメラが原点）
+    for images in components[1:]:
+        origin = list(images[0]['position'])
+        for image in images:
+            image['position'] = [p - o for p, o in zip(image['position'], origin)]
+    return len(paths), components, with_priors
+
+
+def simulate_work(image_count: int, prior_count: int, latency: float, quality: str):
+    """画像数に比例した時間を待ちながら進捗を出力する"""
+    factor = QUALITY_FACTORS.get(quality, 1.0)
+    total = latency * factor * ((image_count - prior_count) + prior_count * PRIOR_LATENCY_FACTOR)
+    for step in range(1, 11):
+        time.sleep(total / 10)
+        print(f"Aligning images {step * 10}%", flush=True)
+
+
+def write_result(xml_path: Path, total_images: int, components, quality: str):
+    root = ET.Element('RealityScanProject')
+    error_offset = QUALITY_ERROR_OFFSETS.get(quality, 0.0)
+    errors = [max(0.3, 0.8 + 0.002 * len(images) + error_offset + 0.1 * i) for i, images in enumerate(components)]
+    aligned = sum(len(images) for images in components)
+    mean_error = sum(e * len(images) for e, images in zip(errors, components)) / aligned if aligned else 99.0
+    ET.SubElement(root, 'summary', total_images=str(total_images), aligned_images=str(aligned),
+                  mean_reprojection_error=f"{mean_error:.4f}")
+    components_node = ET.SubElement(root, 'components')
+    for component_id, (images, error) in enumerate(zip(components, errors)):
+        node = ET.SubElement(components_node, 'component', id=str(component_id), num_images=str(len(images)),
+                             reprojection_error=f"{error:.4f}")
+        for image in images:
+            attrs = {'name': image['name'], 'path': image['path']}
+            attrs.update({k: f"{v:.12g}" for k, v in zip(('tx', 'ty', 'tz'), image['position'])})
+            for r, row in enumerate(image['rotation']):
+                for c, value in enumerate(row):
+                    attrs[f"r{r + 1}{c + 1}"] = f"{value:.12g}"
+            ET.SubElement(node, 'image', **attrs)
+    xml_path.parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(root).write(xml_path, encoding='utf-8', xml_declaration=True)
+
+
+def write_components(output_dir: Path, components):
+    """コンポーネントごとの画像一覧を書き出す（-exportLatestComponents 相当）"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for component_id, images in enumerate(components):
+        (output_dir / f"component_{component_id}.txt").write_text(
+            ''.join(f"{image['name']}\n" for image in images), encoding='utf-8')
+
+
+def main(argv=None) -> int:
+    commands = parse_args(sys.argv[1:] if argv is None else argv)
+    latency = env_float('REALITYSCAN_SIM_LATENCY', 0.01)
+    max_gap_frames = env_float('REALITYSCAN_SIM_MAX_GAP_FRAMES', 45)
+    drop_ratio = env_float('REALITYSCAN_SIM_DROP_RATIO', 0.02)
+    fps = env_float('REALITYSCAN_SIM_FPS', 30.0)
+
+    settings = {}
+    folders = []
+    total_images, components = 0, []
+    for option, value in commands:
+        if option == '-headless':
+            continue
+        if option == '-set':
+            key, _, setting = value.partition('=')
+            settings[key] = setting
+        elif option == '-addFolder':
+            folder = Path(value)
+            if not folder.is_dir():
+                print(f"error: folder not found: {folder}", file=sys.stderr, flush=True)
+                return 2
+            folders.append(folder)
+        elif option == '-align':
+            quality = settings.get('alignQuality', 'normal')
+            total_images, components, with_priors = 0, [], 0
+            for folder in folders:
+                count, folder_components, priors = build_components(folder, max_gap_frames, drop_ratio, fps)
+                total_images += count
+                components.extend(folder_components)
+                with_priors += priors
+            components.sort(key=len, reverse=True)
+            print(f"Aligning {total_images} images ({quality}, {with_priors} with pose priors)", flush=True)
+            simulate_work(total_images, with_priors, latency, quality)
+        elif option == '-exportXMP':
+            write_result(Path(value), total_images, components, settings.get('alignQuality', 'normal'))
+        elif option == '-exportLatestComponents':
+            write_components(Path(value), components)
+        else:
+            print(f"warning: unsupported option {option}", file=sys.stderr, flush=True)
+    print(f"Done: {sum(len(c) for c in components)}/{total_images} images in {len(components)} components",
+          flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
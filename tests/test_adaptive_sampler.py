@@ -0,0 +1,57 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from core.adaptive_sampler import AdaptiveSampler
+from models.config_models import ExtractionConfig
+
+
+def textured_panorama(shift_px: int = 0, h: int = 320, w: int = 640) -> np.ndarray:
+    """ぼかしたノイズのパノラマを水平方向に shift_px だけ回転させた画像"""
+    rng = np.random.default_rng(1)
+    base = rng.integers(0, 256, size=(h, w), dtype=np.uint8)
+    base = cv2.GaussianBlur(base, (0, 0), 3)
+    base = cv2.normalize(base, None, 0, 255, cv2.NORM_MINMAX)
+    return cv2.cvtColor(np.roll(base, shift_px, axis=1), cv2.COLOR_GRAY2BGR)
+
+
+class TestAdaptiveSampler(unittest.TestCase):
+    def setUp(self):
+        self.config = ExtractionConfig(base_interval_sec=3.0, min_interval_sec=1.0, max_interval_sec=8.0)
+
+    def test_static_camera_stretches_interval(self):
+        sampler = AdaptiveSampler(self.config)
+        frame = textured_panorama()
+        intervals = [sampler.next_interval(frame) for _ in range(5)]
+
+        self.assertEqual(intervals[0], 3.0)
+        self.assertEqual(intervals[-1], 8.0)
+        self.assertLess(sampler.last_motion, 0.01)
+
+    def test_fast_motion_shrinks_interval(self):
+        sampler = AdaptiveSampler(self.config)
+        intervals = [sampler.next_interval(textured_panorama(shift_px=i * 96)) for i in range(5)]
+
+        self.assertEqual(intervals[0], 3.0)
+        self.assertEqual(intervals[-1], 1.0)
+        self.assertGreater(sampler.last_motion, self.config.target_motion_ratio)
+
+    def test_interval_stays_near_base_for_target_motion(self):
+        sampler = AdaptiveSampler(self.config)
+        # 幅の5% (= target_motion_ratio) ずつ動く
+        intervals = [sampler.next_interval(textured_panorama(shift_px=i * 32)) for i in range(5)]
+
+        for interval in intervals:
+            self.assertAlmostEqual(interval, 3.0, delta=0.75)
+
+    def test_disabled_uses_base_interval(self):
+        self.config.adaptive_interval = False
+        sampler = AdaptiveSampler(self.config)
+        intervals = [sampler.next_interval(textured_panorama(shift_px=i * 96)) for i in range(3)]
+
+        self.assertEqual(intervals, [3.0, 3.0, 3.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
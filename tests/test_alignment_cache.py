@@ -0,0 +1,155 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from core.alignment_cache import AlignmentCache
+from core.realityscan_interface import RealityScanInterface
+from models.config_models import RealityScanConfig
+
+SIMULATOR = Path(__file__).resolve().parent.parent / 'scripts' / 'realityscan_simulator.py'
+
+
+def make_images(image_dir: Path, frames, content: bytes = b'jpeg'):
+    image_dir.mkdir(parents=True, exist_ok=True)
+    images = []
+    for frame in frames:
+        path = image_dir / f"walk_frame_{frame:05d}__face_front.jpg"
+        path.write_bytes(content + str(frame).encode())
+        images.append({'image_path': str(path), 'face': 'front', 'timestamp': frame / 30.0})
+    return images
+
+
+def component_dicts(count: int, image_dir: str = '/stage/faces'):
+    images = [{'name': f"img_{i}.jpg", 'path': f"{image_dir}/img_{i}.jpg",
+               'pose': {'tx': float(i), 'ty': 0.0, 'tz': 0.0, 'rotation': np.eye(3).tolist()}} for i in range(count)]
+    return {'components': [{'id': '0', 'image_count': count, 'reprojection_error': 1.0, 'images': images}],
+            'total_images': count, 'unaligned_images': [], 'alignment_ratio': 1.0, 'mean_reprojection_error': 1.0}
+
+
+class TestAlignmentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        env = patch.dict(os.environ, {'REALITYSCAN_SIM_LATENCY': '0.001', 'REALITYSCAN_SIM_DROP_RATIO': '0'})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def make_interface(self, instance_name: str = 'cache_test') -> RealityScanInterface:
+        config = RealityScanConfig(executable_path=str(SIMULATOR), alignment_cache_dir=str(self.root / 'cache'))
+        interface = RealityScanInterface(config, instance_name=instance_name)
+        interface.temp_dir = self.root / 'instances'
+        return interface
+
+    def test_rerun_reuses_result_without_subprocess(self):
+        images = make_images(self.root / 'frames', range(0, 120, 30))
+        first = self.make_interface().run_alignment(images)
+        self.assertFalse(first['cached'])
+
+        # クラッシュ後の再実行を想定し、別のインスタンス名（別の配置フォルダ）で同じ画像を渡す
+        interface = self.make_interface('cache_test_rerun')
+        with patch('subprocess.Popen', side_effect=AssertionError('RealityScan was launched')):
+            second = interface.run_alignment(images)
+
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['status'], 'completed')
+        self.assertEqual(second['components'].poses.names.tolist(), first['components'].poses.names.tolist())
+        np.testing.assert_array_equal(second['components'].poses.rotations, first['components'].poses.rotations)
+        np.testing.assert_array_equal(second['components'].poses.positions, first['components'].poses.positions)
+        # 画像パスは新しい配置フォルダを指す
+        self.assertEqual({str(Path(p).parent) for p in second['components'].poses.paths},
+                         {str(self.root / 'instances' / 'cache_test_rerun' / 'faces')})
+        self.assertTrue((self.root / 'instances' / 'cache_test_rerun' / 'components' / 'component_0.txt').exists())
+        self.assertEqual(interface.result_cache.stats['hits'], 1)
+
+    def test_changed_content_or_quality_misses(self):
+        images = make_images(self.root / 'frames', range(0, 120, 30))
+        interface = self.make_interface()
+        interface.run_alignment(images)
+        self.assertFalse(interface.run_alignment(images, quality='high')['cached'])
+
+        time.sleep(0.01)
+        make_images(self.root / 'frames', [0], content=b'retouched')
+        self.assertFalse(interface.run_alignment(images)['cached'])
+        self.assertEqual(interface.result_cache.stats['hits'], 0)
+        self.assertEqual(interface.result_cache.stats['stores'], 3)
+
+    def test_failed_runs_are_not_cached(self):
+        images = make_images(self.root / 'frames', range(0, 120, 30))
+        interface = self.make_interface()
+        interface.realityscan_exe = str(self.root / 'missing_realityscan')
+        self.assertEqual(interface.run_alignment(images)['status'], 'failed')
+        self.assertEqual(interface.result_cache.stats['stores'], 0)
+
+    def test_missing_xml_result_is_not_cached(self):
+        # 正常終了しても XML を書き出さない実行ファイル（空の結果を次回以降に再利用してはいけない）
+        fake_exe = self.root / 'realityscan_no_output.py'
+        fake_exe.write_text('#!/usr/bin/env python3\nprint("Aligning images 100%")\n', encoding='utf-8')
+        fake_exe.chmod(0o755)
+        images = make_images(self.root / 'frames', range(0, 120, 30))
+        interface = self.make_interface()
+        interface.realityscan_exe = str(fake_exe)
+
+        first = interface.run_alignment(images)
+        self.assertEqual(first['status'], 'completed')
+        self.assertEqual(len(first['components']), 0)
+        self.assertEqual(interface.result_cache.stats['stores'], 0)
+
+        # 実際の RealityScan に戻すと、同じ画像でも起動して結果を読む
+        interface.realityscan_exe = str(SIMULATOR)
+        second = interface.run_alignment(images)
+        self.assertFalse(second['cached'])
+        self.assertEqual(len(second['components']), 1)
+
+    def test_stale_xml_is_not_cached(self):
+        images = make_images(self.root / 'frames', range(0, 120, 30))
+        interface = self.make_interface()
+        interface.run_alignment(images)
+
+        # 前回の XML が残ったまま、XML を書き出さずに終了した実行の結果はキャッシュしない
+        fake_exe = self.root / 'realityscan_no_output.py'
+        fake_exe.write_text('#!/usr/bin/env python3\n', encoding='utf-8')
+        fake_exe.chmod(0o755)
+        interface.realityscan_exe = str(fake_exe)
+        interface.run_alignment(images, quality='high')
+        self.assertEqual(interface.result_cache.stats['stores'], 1)
+
+    def test_lru_eviction_keeps_recently_used_entries(self):
+        cache = AlignmentCache(self.root / 'cache', max_bytes=10 ** 9)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, component_dicts(200), Path('/stage/faces'))
+            os.utime(self.root / 'cache' / key / 'result.json', (time.time() - 100, time.time() - 100))
+        entry_bytes = sum(p.stat().st_size for p in (self.root / 'cache' / 'a').rglob('*') if p.is_file())
+
+        self.assertIsNotNone(cache.get('a', Path('/other/faces')))
+        cache.max_bytes = int(entry_bytes * 3.5)
+        cache.put('d', component_dicts(200), Path('/stage/faces'))
+
+        self.assertEqual(sorted(p.name for p in (self.root / 'cache').iterdir()), ['a', 'c', 'd'])
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertEqual(cache.get('a', Path('/other/faces'))['components'][0]['images'][0]['path'],
+                         str(Path('/other/faces/img_0.jpg')))
+
+    def test_benchmark_cache_hit_vs_realityscan_run(self):
+        """シミュレータの実行（1枚 10ms）とキャッシュヒットの所要時間を比較する"""
+        os.environ['REALITYSCAN_SIM_LATENCY'] = '0.01'
+        images = make_images(self.root / 'frames', range(0, 3000, 30))
+        timings = {}
+        for name in ('miss', 'hit'):
+            interface = self.make_interface(f"cache_bench_{name}")
+            start = time.perf_counter()
+            result = interface.run_alignment(images)
+            timings[name] = time.perf_counter() - start
+            self.assertEqual(result['cached'], name == 'hit')
+        print(f"[benchmark] alignment of {len(images)} images: run {timings['miss'] * 1000:.0f} ms, "
+              f"cache hit {timings['hit'] * 1000:.0f} ms")
+        self.assertLess(timings['hit'], timings['miss'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import tempfile
+import time
+import tracemalloc
+import unittest
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+from core.alignment_parser import parse_alignment_xml
+from models.data_models import ComponentList, component_pose_arrays
+
+
+def write_alignment_xml(path: Path, component_sizes, seed: int = 0):
+    """ランダムな姿勢を持つアライメント結果 XML を書き出す"""
+    rng = np.random.default_rng(seed)
+    root = ET.Element('RealityScanProject')
+    ET.SubElement(root, 'summary', total_images=str(sum(component_sizes) + 5),
+                  aligned_images=str(sum(component_sizes)), mean_reprojection_error='1.5')
+    components = ET.SubElement(root, 'components')
+    n = 0
+    for c, size in enumerate(component_sizes):
+        node = ET.SubElement(components, 'component', id=str(c), num_images=str(size),
+                             reprojection_error=str(1.0 + c))
+        for _ in range(size):
+            attrs = {'name': f"img_{n:05d}.jpg", 'path': f"/data/img_{n:05d}.jpg"}
+            attrs.update({k: repr(float(v)) for k, v in zip(('tx', 'ty', 'tz'), rng.normal(size=3))})
+            for i, v in enumerate(rng.normal(size=9)):
+                attrs[f"r{i // 3 + 1}{i % 3 + 1}"] = repr(float(v))
+            ET.SubElement(node, 'image', **attrs)
+            n += 1
+    ET.ElementTree(root).write(path, encoding='utf-8', xml_declaration=True)
+
+
+def parse_as_dicts(path: Path):
+    """以前の実装と同じ、ツリー全体を読んで辞書を組み立てる解析"""
+    root = ET.parse(path).getroot()
+    components = []
+    for comp_node in root.findall('components/component'):
+        images = []
+        for img in comp_node.findall('image'):
+            images.append({'name': img.get('name'), 'path': img.get('path'), 'pose': {
+                'tx': float(img.get('tx', 0)), 'ty': float(img.get('ty', 0)), 'tz': float(img.get('tz', 0)),
+                'rotation': [[float(img.get(f"r{r}{c}", 1 if r == c else 0)) for c in range(1, 4)]
+                             for r in range(1, 4)]}})
+        components.append({'id': comp_node.get('id'), 'image_count': int(comp_node.get('num_images', 0)),
+                           'reprojection_error': float(comp_node.get('reprojection_error', 99.0)),
+                           'images': images})
+    return components
+
+
+class TestAlignmentParser(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.xml_path = Path(self.tmp.name) / 'alignment_result.xml'
+
+    def test_views_match_dict_parse(self):
+        write_alignment_xml(self.xml_path, [5, 0, 3])
+        summary, poses = parse_alignment_xml(self.xml_path)
+        components = ComponentList(poses)
+
+        self.assertEqual(summary['aligned_images'], '8')
+        self.assertEqual(poses.rotations.shape, (8, 3, 3))
+        self.assertEqual(poses.component_index.tolist(), [0] * 5 + [2] * 3)
+        self.assertEqual(components, parse_as_dicts(self.xml_path))
+        self.assertEqual(components[2]['images'][-1]['name'], 'img_00007.jpg')
+        self.assertEqual(max(components, key=lambda c: c['image_count'])['id'], '0')
+        self.assertEqual(json.loads(json.dumps(components.to_list())), parse_as_dicts(self.xml_path))
+
+    def test_summary_after_components(self):
+        write_alignment_xml(self.xml_path, [20, 2])
+        tree = ET.parse(self.xml_path)
+        root = tree.getroot()
+        summary_node = root.find('summary')
+        root.remove(summary_node)
+        root.append(summary_node)
+        tree.write(self.xml_path, encoding='utf-8', xml_declaration=True)
+
+        summary, poses = parse_alignment_xml(self.xml_path)
+        components = ComponentList(poses)
+        self.assertEqual(summary['aligned_images'], '22')
+        self.assertEqual(poses.positions.shape, (22, 3))
+        self.assertEqual(components[1]['images'][1]['pose'], parse_as_dicts(self.xml_path)[1]['images'][1]['pose'])
+        self.assertEqual(components, parse_as_dicts(self.xml_path))
+
+    def test_pose_arrays_are_shared(self):
+        write_alignment_xml(self.xml_path, [4, 2])
+        _, poses = parse_alignment_xml(self.xml_path)
+        names, paths, rotations, positions = component_pose_arrays(ComponentList(poses)[1])
+        self.assertEqual(names, ['img_00004.jpg', 'img_00005.jpg'])
+        self.assertTrue(np.shares_memory(rotations, poses.rotations))
+        np.testing.assert_array_equal(positions, poses.positions[4:])
+
+        dict_component = parse_as_dicts(self.xml_path)[1]
+        _, dict_paths, dict_rotations, _ = component_pose_arrays(dict_component)
+        self.assertEqual(dict_paths, paths)
+        np.testing.assert_array_equal(dict_rotations, rotations)
+
+    def test_benchmark_streaming_vs_tree_parse(self):
+        """ツリー全体＋辞書の解析とストリーミング配列解析の時間・ピークメモリを比較する"""
+        write_alignment_xml(self.xml_path, [12000, 3000])
+        results = {}
+        for name, parse in (('tree+dicts', parse_as_dicts), ('iterparse+arrays', parse_alignment_xml)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            parsed = parse(self.xml_path)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name] = (elapsed, peak)
+            del parsed
+        for name, (elapsed, peak) in results.items():
+            print(f"[benchmark] {name}: {elapsed * 1000:.0f} ms, peak {peak / 1e6:.1f} MB for 15000 images")
+        self.assertLess(results['iterparse+arrays'][1], results['tree+dicts'][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from core.detection_cache import DetectionCache, ROW_OVERHEAD_BYTES
+from models.data_models import DetectionRecord
+from tests.test_quality_filter import make_filter
+
+
+def make_record(n: int, seed: int = 0) -> DetectionRecord:
+    rng = np.random.default_rng(seed)
+    data = rng.random((n, 6), dtype=np.float32)
+    data[:, 5] = rng.integers(0, 3, size=n)
+    return DetectionRecord.from_array(data)
+
+
+class TestDetectionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'detections.sqlite3'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_persists_and_counts_hits(self):
+        cache = DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=1 << 20)
+        record = make_record(5)
+        cache.put_many([(('video', 1.5, 640), record)])
+        cache.close()
+
+        cache = DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=1 << 20)
+        found = cache.get_many([('video', 1.5, 640), ('video', 2.0, 640)])
+        np.testing.assert_array_equal(found[('video', 1.5, 640)].to_array(), record.to_array())
+        self.assertNotIn(('video', 2.0, 640), found)
+        self.assertEqual((cache.stats['hits'], cache.stats['misses']), (1, 1))
+        self.assertEqual(cache.stats_summary()['hit_rate'], 0.5)
+
+    def test_model_and_input_size_are_part_of_the_key(self):
+        DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=1 << 20).put_many([(('video', 1.0, 640), make_record(2))])
+
+        self.assertEqual(DetectionCache(self.path, 'yolov8s.pt', 640, max_bytes=1 << 20).get_many([('video', 1.0, 640)]), {})
+        self.assertEqual(DetectionCache(self.path, 'yolov8n.pt', 320, max_bytes=1 << 20).get_many([('video', 1.0, 640)]), {})
+
+    def test_input_width_and_backend_are_part_of_the_key(self):
+        DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=1 << 20).put_many([(('video', 1.0, 640), make_record(2))])
+
+        cache = DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=1 << 20)
+        self.assertIn(('video', 1.0, 640), cache.get_many([('video', 1.0, 640)]))
+        # 縮小プロキシの幅が違う入力・別の推論バックエンドの結果は使わない
+        self.assertEqual(cache.get_many([('video', 1.0, 320)]), {})
+        self.assertEqual(DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=1 << 20,
+                                        backend='onnxruntime').get_many([('video', 1.0, 640)]), {})
+
+    def test_old_schema_is_recreated(self):
+        conn = sqlite3.connect(str(self.path))
+        conn.execute('CREATE TABLE detections (video_hash TEXT NOT NULL, timestamp_ms INTEGER NOT NULL, '
+                     'model TEXT NOT NULL, imgsz INTEGER NOT NULL, data BLOB NOT NULL, last_used REAL NOT NULL, '
+                     'PRIMARY KEY (video_hash, timestamp_ms, model, imgsz))')
+        conn.execute("INSERT INTO detections VALUES ('video', 1000, 'yolov8n.pt', 640, x'00', 0)")
+        conn.commit()
+        conn.close()
+
+        cache = DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=1 << 20)
+        self.assertEqual(len(cache), 0)
+        cache.put_many([(('video', 1.0, 640), make_record(2))])
+        self.assertIn(('video', 1.0, 640), cache.get_many([('video', 1.0, 640)]))
+
+    def test_retrained_local_weights_miss(self):
+        weights = Path(self.tmp.name) / 'custom.pt'
+        weights.write_bytes(b'weights v1')
+        DetectionCache(self.path, str(weights), 640, max_bytes=1 << 20).put_many([(('video', 1.0, 640), make_record(2))])
+        self.assertIn(('video', 1.0, 640), DetectionCache(self.path, str(weights), 640, max_bytes=1 << 20).get_many([('video', 1.0, 640)]))
+
+        weights.write_bytes(b'weights v2')
+        self.assertEqual(DetectionCache(self.path, str(weights), 640, max_bytes=1 << 20).get_many([('video', 1.0, 640)]), {})
+
+    def test_least_recently_used_rows_are_evicted(self):
+        row_bytes = 10 * 6 * 4 + ROW_OVERHEAD_BYTES
+        cache = DetectionCache(self.path, 'yolov8n.pt', 640, max_bytes=row_bytes * 10)
+        for t in range(10):
+            cache.put_many([(('video', float(t), 640), make_record(10, seed=t))])
+        # 先頭の行を使って新しくしてから上限を超えさせる
+        cache.get_many([('video', 0.0, 640)])
+        cache.put_many([(('video', 10.0, 640), make_record(10))])
+
+        self.assertGreater(cache.stats['evictions'], 0)
+        self.assertLessEqual(len(cache), 9)
+        self.assertIn(('video', 0.0, 640), cache.get_many([('video', 0.0, 640)]))
+        self.assertEqual(cache.get_many([('video', 1.0, 640)]), {})
+
+
+class TestQualityFilterCache(unittest.TestCase):
+    def test_rerun_with_new_thresholds_skips_inference(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            quality_filter = make_filter([(0.0, 0.0, 0.5, 0.4, 0.9, 0)])
+            quality_filter.detection_cache = DetectionCache(Path(tmp) / 'cache.sqlite3', 'yolov8n.pt', 640,
+                                                            max_bytes=1 << 20)
+            images = [np.zeros((64, 128, 3), dtype=np.uint8)] * 2
+            keys = [('video', 1.0), ('video', 2.0)]
+
+            first = quality_filter.evaluate_batch(images, 0.5, 0.15, cache_keys=keys)
+            second = quality_filter.evaluate_batch(images, 0.5, 0.25, cache_keys=keys)
+            quality_filter.detection_cache.close()
+
+        self.assertEqual([v.accepted for v in first], [False, False])
+        self.assertEqual([v.accepted for v in second], [True, True])
+        self.assertEqual(quality_filter.backend.model.calls, [2])
+        self.assertEqual(quality_filter.cache_stats()['hits'], 2)
+
+    def test_other_proxy_width_is_inferred_again(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            quality_filter = make_filter([(0.0, 0.0, 0.5, 0.4, 0.9, 0)])
+            quality_filter.detection_cache = DetectionCache(Path(tmp) / 'cache.sqlite3', 'yolov8n.pt', 640,
+                                                            max_bytes=1 << 20)
+            keys = [('video', 1.0)]
+            quality_filter.evaluate_batch([np.zeros((64, 128, 3), dtype=np.uint8)], 0.5, 0.15, cache_keys=keys)
+            quality_filter.evaluate_batch([np.zeros((32, 64, 3), dtype=np.uint8)], 0.5, 0.15, cache_keys=keys)
+            quality_filter.evaluate_batch([np.zeros((64, 128, 3), dtype=np.uint8)], 0.5, 0.15, cache_keys=keys)
+            quality_filter.detection_cache.close()
+
+        self.assertEqual(quality_filter.backend.model.calls, [1, 1])
+        self.assertEqual(quality_filter.cache_stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,266 @@
+import unittest
+import random
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import json
+
+import cv2
+import numpy as np
+
+from core.extraction_pipeline import StagedPipeline, PipelineStage
+from core.output_generator import OutputGenerator
+from core.phash_index import INDEX_FILENAME
+from core.video_extractor import VideoExtractor
+from models.config_models import AppConfig
+from models.data_models import DetectionRecord, FrameVerdict
+from tests.test_frame_reader import make_synthetic_clip
+
+
+class TestStagedPipeline(unittest.TestCase):
+    def test_ordered_stage_restores_source_order(self):
+        rng = random.Random(0)
+        delays = [rng.uniform(0, 0.01) for _ in range(50)]
+        collected = []
+
+        def work(item):
+            time.sleep(delays[item.index])
+            item.value = item.index * 2
+
+        pipeline = StagedPipeline([
+            PipelineStage('work', work, workers=4),
+            PipelineStage('collect', lambda item: collected.append(item.value), ordered=True),
+        ], queue_depth=2)
+        pipeline.run(SimpleNamespace(index=i, value=None) for i in range(50))
+
+        self.assertEqual(collected, [i * 2 for i in range(50)])
+        stats = pipeline.stats_summary()
+        self.assertEqual(stats['decode']['items'], 50)
+        self.assertEqual(stats['work']['items'], 50)
+        self.assertEqual(stats['collect']['items'], 50)
+
+    def test_stop_halts_source(self):
+        produced = []
+
+        def source():
+            for i in range(1000):
+                produced.append(i)
+                yield SimpleNamespace(index=i)
+
+        def collect(item):
+            if item.index == 5:
+                pipeline.stop()
+
+        pipeline = StagedPipeline([PipelineStage('collect', collect, ordered=True)], queue_depth=2)
+        pipeline.run(source())
+
+        self.assertTrue(pipeline.stopped)
+        self.assertLess(len(produced), 20)
+
+    def test_stage_error_is_raised(self):
+        def fail(item):
+            if item.index == 3:
+                raise ValueError("boom")
+
+        pipeline = StagedPipeline([PipelineStage('fail', fail, workers=2)], queue_depth=2)
+        with self.assertRaises(ValueError):
+            pipeline.run(SimpleNamespace(index=i) for i in range(100))
+
+
+class TestPipelinedExtraction(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video_path = Path(cls.tmp.name) / 'clip.mp4'
+        make_synthetic_clip(cls.video_path, num_frames=300, fps=30.0, size=(256, 128))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def _extract(self, target_count, workers, batch_size=None, dedupe=False, writer_delay=0.0):
+        config = AppConfig()
+        config.extraction.base_interval_sec = 0.5
+        if batch_size is not None:
+            config.yolo.batch_size = batch_size
+        config.extraction.filter_workers = workers
+        config.extraction.remap_workers = workers
+        config.extraction.dedupe.enabled = dedupe
+        config.extraction.face_pruning.enabled = False
+        extractor = VideoExtractor(config)
+        if writer_delay:
+            # 書き出しを遅くして、目標枚数到達時に未書き出しのフレームが残るようにする
+            submit = extractor.image_writer.submit
+            extractor.image_writer.submit = lambda image, path: (time.sleep(writer_delay), submit(image, path))[1]
+
+        # フレームの輝度に応じて一部のサンプルを不採用にするフィルタ
+        def accept(frame, confidence, area_threshold):
+            brightness = int(np.median(frame))
+            return (brightness // 15) % 2 == 0
+
+        quality_filter = MagicMock()
+        quality_filter.evaluate_batch.side_effect = lambda frames, confidence, area_threshold, **kwargs: [
+            FrameVerdict(accept(f, confidence, area_threshold), DetectionRecord.empty()) for f in frames]
+        output_dir = Path(self.tmp.name) / f"out_{target_count}_{workers}_{batch_size}_{dedupe}_{writer_delay}"
+        frames = extractor.extract_adaptive_frames(str(self.video_path), target_count, quality_filter,
+                                                   0.5, 0.15, str(output_dir))
+        self.quality_filter = quality_filter
+        return frames, output_dir, extractor
+
+    def test_output_is_identical_across_worker_counts(self):
+        single, _, _ = self._extract(target_count=1000, workers=1)
+        multi, _, extractor = self._extract(target_count=1000, workers=3)
+
+        strip = lambda frames: [(f['timestamp'], Path(f['image_path']).name, f.get('face')) for f in frames]
+        self.assertEqual(strip(single), strip(multi))
+        timestamps = [f['timestamp'] for f in multi]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(len(multi) % 7, 0)
+        self.assertIn('encode', extractor.last_pipeline_stats)
+
+    def test_single_frame_batches_match_batched_output(self):
+        # batch_size=1 ではフィルタ段が1件ずつ呼ばれる
+        batched, _, _ = self._extract(target_count=1000, workers=2)
+        single, _, _ = self._extract(target_count=1000, workers=2, batch_size=1)
+
+        strip = lambda frames: [(f['timestamp'], Path(f['image_path']).name, f.get('face')) for f in frames]
+        self.assertEqual(strip(single), strip(batched))
+        for call in self.quality_filter.evaluate_batch.call_args_list:
+            self.assertEqual(len(call.args[0]), 1)
+
+    def test_extracted_frames_can_be_written_to_metadata(self):
+        config = AppConfig()
+        config.extraction.base_interval_sec = 0.5
+        config.extraction.dedupe.enabled = False
+        config.extraction.face_pruning.enabled = False
+        # 小さな人物の検出を持つが採用されるフレーム
+        person = DetectionRecord([[0.4, 0.4, 0.5, 0.6]], [0.3], [0])
+        quality_filter = MagicMock()
+        quality_filter.evaluate_batch.side_effect = lambda frames, confidence, area_threshold, **kwargs: [
+            FrameVerdict(True, person) for _ in frames]
+        quality_filter.class_names = {0: 'person'}
+        output_dir = Path(self.tmp.name) / 'metadata'
+        frames = VideoExtractor(config).extract_adaptive_frames(
+            str(self.video_path), 7, quality_filter, 0.5, 0.15, str(output_dir))
+
+        metadata_path = OutputGenerator(config.output)._generate_metadata(
+            {'images': frames, 'components': []}, output_dir)
+        with open(metadata_path, encoding='utf-8') as f:
+            metadata = json.load(f)
+        self.assertEqual(len(metadata['images']), len(frames))
+        self.assertGreater(len(frames), 0)
+        self.assertEqual(metadata['images'][0]['detections'][0]['class_id'], 0)
+        self.assertEqual(metadata['images'][0]['detections'][0]['class_name'], 'person')
+        self.assertAlmostEqual(metadata['images'][0]['detections'][0]['confidence'], 0.3, places=5)
+        self.assertFalse((output_dir / 'metadata.json.tmp').exists())
+
+    def test_target_count_cuts_off_and_discards_extra_files(self):
+        frames, output_dir, _ = self._extract(target_count=10, workers=3)
+
+        # 1サンプル = equirect 1枚 + 6面。10枚に達したサンプルで打ち切る
+        self.assertEqual(len(frames), 14)
+        written = sorted(p.name for p in (output_dir / 'temp_images').glob('*.jpg'))
+        self.assertEqual(written, sorted(Path(f['image_path']).name for f in frames))
+
+    def test_hash_index_holds_only_written_images(self):
+        frames, output_dir, _ = self._extract(target_count=14, workers=3, dedupe=True, writer_delay=0.02)
+
+        written = sorted(p.name for p in (output_dir / 'temp_images').glob('*.jpg'))
+        self.assertEqual(written, sorted(Path(f['image_path']).name for f in frames))
+        # 打ち切りで書き出さなかったフレームのハッシュはインデックスに残らない
+        with open(output_dir / INDEX_FILENAME, encoding='utf-8') as f:
+            indexed = {(round(e['timestamp'], 3), e.get('face')) for e in json.load(f)['entries']}
+        self.assertTrue(indexed)
+        self.assertLessEqual(indexed, {(round(f['timestamp'], 3), f.get('face')) for f in frames})
+
+    def test_prefilter_rejections_skip_quality_filter(self):
+        frames, _, extractor = self._extract(target_count=1000, workers=2)
+
+        reasons = [r['rejection_reason'] for r in extractor.last_rejections]
+        # 先頭の暗いフレームは露出不良として YOLO 前に除外される
+        self.assertEqual(extractor.last_rejections[0]['timestamp'], 0.0)
+        self.assertEqual(reasons[0], 'underexposed')
+        prefiltered = sum(1 for r in reasons if r != 'quality_filter')
+        sampled = len(frames) // 7 + len(reasons)
+        evaluated = sum(len(call.args[0]) for call in self.quality_filter.evaluate_batch.call_args_list)
+        self.assertEqual(evaluated, sampled - prefiltered)
+
+    def test_quality_filter_sees_proxy_and_full_resolution_is_written(self):
+        config = AppConfig()
+        config.extraction.base_interval_sec = 1.0
+        config.extraction.filter_proxy_width = 128
+        config.extraction.dedupe.enabled = False
+        config.extraction.face_pruning.enabled = False
+        quality_filter = MagicMock()
+        quality_filter.evaluate_batch.side_effect = lambda frames, confidence, area_threshold, **kwargs: [
+            FrameVerdict(True, DetectionRecord.empty()) for _ in frames]
+        output_dir = Path(self.tmp.name) / 'out_proxy'
+        frames = VideoExtractor(config).extract_adaptive_frames(str(self.video_path), 1000, quality_filter,
+                                                                0.5, 0.15, str(output_dir))
+
+        self.assertGreater(quality_filter.evaluate_batch.call_count, 0)
+        for call in quality_filter.evaluate_batch.call_args_list:
+            self.assertLessEqual(len(call.args[0]), config.yolo.batch_size)
+            for proxy in call.args[0]:
+                self.assertEqual(proxy.shape[:2], (64, 128))
+        equirect = cv2.imread(next(f['image_path'] for f in frames if 'face' not in f))
+        self.assertEqual(equirect.shape[:2], (128, 256))
+
+    def test_face_mode_drops_only_rejected_faces(self):
+        config = AppConfig()
+        config.extraction.base_interval_sec = 1.0
+        config.extraction.filter_mode = 'faces'
+        config.extraction.dedupe.enabled = False
+        config.extraction.face_pruning.enabled = False
+        config.extraction.prefilter.enabled = False
+
+        # 各フレームの2番目の面だけに人物がいるとみなす
+        def evaluate(frames, confidence, area_threshold, **kwargs):
+            return [FrameVerdict(i % 6 != 1, DetectionRecord.empty(), None if i % 6 != 1 else 'person')
+                    for i in range(len(frames))]
+
+        quality_filter = MagicMock()
+        quality_filter.evaluate_batch.side_effect = evaluate
+        output_dir = Path(self.tmp.name) / 'out_faces'
+        extractor = VideoExtractor(config)
+        frames = extractor.extract_adaptive_frames(str(self.video_path), 1000, quality_filter,
+                                                   0.5, 0.15, str(output_dir))
+
+        # 6面を1回の推論にまとめる
+        calls = quality_filter.evaluate_batch.call_args_list
+        self.assertTrue(all(len(call.args[0]) == 6 for call in calls))
+        self.assertEqual(len(frames), len(calls) * 5)
+        self.assertTrue(all('face' in f for f in frames))
+        face_rejections = [r for r in extractor.last_rejections if 'face' in r]
+        self.assertEqual(len(face_rejections), len(calls))
+        self.assertEqual({r['rejection_reason'] for r in face_rejections}, {'person'})
+
+    def test_low_texture_faces_are_not_written(self):
+        config = AppConfig()
+        config.extraction.base_interval_sec = 1.0
+        config.extraction.dedupe.enabled = False
+        config.extraction.prefilter.enabled = False
+        quality_filter = MagicMock()
+        quality_filter.evaluate_batch.side_effect = lambda frames, confidence, area_threshold, **kwargs: [
+            FrameVerdict(True, DetectionRecord.empty()) for _ in frames]
+        output_dir = Path(self.tmp.name) / 'out_pruned'
+        extractor = VideoExtractor(config)
+        frames = extractor.extract_adaptive_frames(str(self.video_path), 1000, quality_filter,
+                                                   0.5, 0.15, str(output_dir))
+
+        # 合成クリップの面はほぼ一様なので大半が除外され、理由が面ごとに記録される
+        pruned = [r for r in extractor.last_rejections if 'face' in r]
+        self.assertTrue(pruned)
+        self.assertEqual({r['rejection_reason'] for r in pruned}, {'low_texture'})
+        written = {(f['timestamp'], f.get('face')) for f in frames}
+        self.assertFalse(written & {(r['timestamp'], r['face']) for r in pruned})
+        # equirect はそのまま書き出される
+        self.assertEqual(sum(1 for f in frames if 'face' not in f), len({f['timestamp'] for f in frames}))
+        self.assertEqual(len(list((output_dir / 'temp_images').iterdir())), len(frames))
+
+
+if __name__ == '__main__':
+    unittest.main()
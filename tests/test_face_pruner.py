@@ -0,0 +1,51 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from core.face_pruner import FacePruner
+from models.config_models import FacePruningConfig
+from tests.test_frame_prefilter import textured_frame
+
+
+def sky_face(size: int = 1024) -> np.ndarray:
+    """上から下へ緩やかに明るくなる、特徴のない空のような面"""
+    ramp = np.linspace(120, 220, size, dtype=np.float32)[:, None].repeat(size, axis=1)
+    return cv2.cvtColor(ramp.astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+
+class TestFacePruner(unittest.TestCase):
+    def setUp(self):
+        self.pruner = FacePruner(FacePruningConfig())
+
+    def test_textured_face_passes(self):
+        self.assertIsNone(self.pruner.check(textured_frame(h=1024, w=1024)))
+
+    def test_sky_and_blank_faces_are_low_texture(self):
+        self.assertEqual(self.pruner.check(sky_face()), FacePruner.REASON_LOW_TEXTURE)
+        blank = np.full((1024, 1024, 3), 90, dtype=np.uint8)
+        cv2.putText(blank, '1', (500, 520), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        self.assertEqual(self.pruner.check(blank), FacePruner.REASON_LOW_TEXTURE)
+
+    def test_score_is_scale_independent(self):
+        face = textured_frame(seed=3, h=1024, w=1024)
+        small = cv2.resize(face, (256, 256), interpolation=cv2.INTER_AREA)
+        self.assertAlmostEqual(self.pruner.score(face), self.pruner.score(small), places=6)
+
+    def test_prune_removes_faces_and_reports_reasons(self):
+        faces = {'front': textured_frame(h=512, w=512), 'up': sky_face(512), 'down': sky_face(512)}
+        pruned = self.pruner.prune(faces)
+        self.assertEqual(pruned, {'up': FacePruner.REASON_LOW_TEXTURE, 'down': FacePruner.REASON_LOW_TEXTURE})
+        self.assertEqual(list(faces), ['front'])
+        self.assertEqual(self.pruner.stats['passed'], 1)
+        self.assertEqual(self.pruner.stats[FacePruner.REASON_LOW_TEXTURE], 2)
+
+    def test_disabled_keeps_everything(self):
+        pruner = FacePruner(FacePruningConfig(enabled=False))
+        faces = {'up': sky_face(64)}
+        self.assertEqual(pruner.prune(faces), {})
+        self.assertIn('up', faces)
+
+
+if __name__ == '__main__':
+    unittest.main()
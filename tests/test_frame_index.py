@@ -0,0 +1,104 @@
+import unittest
+import os
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+
+from core.frame_index import FrameIndex, FrameIndexStore, sidecar_path
+from core.frame_reader import FrameReader
+from tests.test_frame_reader import make_synthetic_clip
+
+
+class TestFrameIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video_path = Path(cls.tmp.name) / 'synthetic.mp4'
+        make_synthetic_clip(cls.video_path, num_frames=300, size=(320, 160))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_build_records_pts_and_keyframes(self):
+        index = FrameIndex.build(str(self.video_path))
+
+        self.assertEqual(len(index), 300)
+        self.assertTrue(np.all(np.diff(index.pts_ms) > 0))
+        self.assertAlmostEqual(index.duration_sec, 10.0, places=2)
+        self.assertEqual(index.keyframes[0], 0)
+        self.assertGreater(len(index.keyframes), 1)
+        self.assertEqual(index.frame_at(2.0), 60)
+        self.assertEqual(index.keyframe_before(index.keyframes[1] + 3), index.keyframes[1])
+
+    def test_sidecar_is_reused_and_invalidated_on_change(self):
+        cache_dir = Path(self.tmp.name) / 'cache'
+        video_path = Path(self.tmp.name) / 'copy.mp4'
+        video_path.write_bytes(self.video_path.read_bytes())
+
+        FrameIndexStore(str(cache_dir)).get(str(video_path))
+        self.assertTrue(sidecar_path(str(video_path), str(cache_dir)).exists())
+
+        with patch.object(FrameIndex, 'build') as build:
+            index = FrameIndexStore(str(cache_dir)).get(str(video_path))
+        build.assert_not_called()
+        self.assertEqual(len(index), 300)
+
+        # 動画が差し替えられたらサイドカーは使わずに作り直す
+        make_synthetic_clip(video_path, num_frames=150, size=(320, 160))
+        os.utime(video_path, ns=(0, 12345))
+        self.assertEqual(len(FrameIndexStore(str(cache_dir)).get(str(video_path))), 150)
+
+    def test_different_videos_are_indexed_in_parallel(self):
+        store = FrameIndexStore(str(Path(self.tmp.name) / 'cache'))
+        # 2本の動画の作成が同時に進まなければ barrier がタイムアウトする
+        barrier = threading.Barrier(2, timeout=5)
+        builds = []
+
+        def load_or_build(video_path):
+            builds.append(video_path)
+            barrier.wait()
+            return FrameIndex(np.arange(3, dtype=np.float64), np.array([0]))
+
+        results = {}
+        with patch.object(store, '_load_or_build', side_effect=load_or_build):
+            threads = [threading.Thread(target=lambda v=v: results.setdefault(v, store.get(v)))
+                       for v in ('a.mp4', 'b.mp4')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # 作成済みの動画は再作成しない
+            self.assertIs(store.get('a.mp4'), results['a.mp4'])
+
+        self.assertFalse(barrier.broken)
+        self.assertEqual(sorted(builds), ['a.mp4', 'b.mp4'])
+
+    def test_indexed_reader_matches_seek_and_skips_by_keyframe(self):
+        index = FrameIndex.build(str(self.video_path))
+        time_points = [0.0, 0.5, 2.0, 7.5, 3.0, 9.9]
+
+        cap = cv2.VideoCapture(str(self.video_path))
+        reference = FrameReader(cap, cap.get(cv2.CAP_PROP_FPS), mode='seek')
+        expected = [reference.read_at(t)[1] for t in time_points]
+        cap.release()
+
+        cap = cv2.VideoCapture(str(self.video_path))
+        reader = FrameReader(cap, cap.get(cv2.CAP_PROP_FPS), mode='sequential',
+                             seek_threshold_sec=60.0, frame_index=index)
+        frames = [reader.read_at(t)[1] for t in time_points]
+        cap.release()
+
+        for a, b in zip(expected, frames):
+            self.assertLess(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean(), 1.0)
+        # 閾値に関係なく、キーフレームを跨ぐ遠いサンプル (2.0s→7.5s) と後方のサンプルでシークする
+        self.assertGreaterEqual(reader.stats['seeks'], 2)
+        self.assertEqual(reader.next_frame_index, index.frame_at(9.9) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from core.frame_prefilter import FramePrefilter
+from models.config_models import PrefilterConfig
+
+
+def textured_frame(seed: int = 0, h: int = 512, w: int = 1024) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    gray = rng.integers(0, 256, size=(h // 8, w // 8), dtype=np.uint8)
+    gray = cv2.resize(gray, (w, h), interpolation=cv2.INTER_NEAREST)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+class TestFramePrefilter(unittest.TestCase):
+    def setUp(self):
+        self.prefilter = FramePrefilter(PrefilterConfig())
+
+    def test_sharp_frame_passes(self):
+        self.assertIsNone(self.prefilter.check(textured_frame()))
+
+    def test_black_frame_is_underexposed(self):
+        frame = np.full((512, 1024, 3), 5, dtype=np.uint8)
+        self.assertEqual(self.prefilter.check(frame), FramePrefilter.REASON_UNDEREXPOSED)
+
+    def test_blown_out_frame_is_overexposed(self):
+        frame = textured_frame()
+        frame[:, :800] = 255
+        self.assertEqual(self.prefilter.check(frame), FramePrefilter.REASON_OVEREXPOSED)
+
+    def test_blurred_frame_is_rejected(self):
+        frame = cv2.GaussianBlur(textured_frame(), (0, 0), 25)
+        self.assertEqual(self.prefilter.check(frame), FramePrefilter.REASON_BLUR)
+
+    def test_near_duplicate_of_previous_pass_is_rejected(self):
+        frame = textured_frame(seed=1)
+        self.assertIsNone(self.prefilter.check(frame))
+        noisy = cv2.add(frame, np.full_like(frame, 1))
+        self.assertEqual(self.prefilter.check(noisy), FramePrefilter.REASON_DUPLICATE)
+        self.assertIsNone(self.prefilter.check(textured_frame(seed=2)))
+        self.assertEqual(self.prefilter.stats['passed'], 2)
+        self.assertEqual(self.prefilter.stats[FramePrefilter.REASON_DUPLICATE], 1)
+
+    def test_disabled_passes_everything(self):
+        prefilter = FramePrefilter(PrefilterConfig(enabled=False))
+        self.assertIsNone(prefilter.check(np.zeros((64, 128, 3), dtype=np.uint8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
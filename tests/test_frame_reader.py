@@ -0,0 +1,105 @@
+import unittest
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from core.frame_reader import FrameReader, make_proxy, make_proxy_gray
+
+
+def make_synthetic_clip(path: Path, num_frames: int = 300, fps: float = 30.0,
+                        size=(640, 320)) -> None:
+    """フレーム番号を輝度と文字で埋め込んだ合成クリップを書き出す"""
+    w, h = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+    for i in range(num_frames):
+        frame = np.full((h, w, 3), i % 256, dtype=np.uint8)
+        cv2.putText(frame, str(i), (10, h // 2), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+
+
+def read_samples(video_path: Path, mode: str, time_points) -> tuple:
+    cap = cv2.VideoCapture(str(video_path))
+    reader = FrameReader(cap, cap.get(cv2.CAP_PROP_FPS), mode=mode, seek_threshold_sec=5.0)
+    frames = []
+    start = time.perf_counter()
+    for t in time_points:
+        ret, frame = reader.read_at(t)
+        if not ret:
+            break
+        frames.append(frame)
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return frames, elapsed, reader.stats
+
+
+class TestFrameReader(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video_path = Path(cls.tmp.name) / 'synthetic.mp4'
+        make_synthetic_clip(cls.video_path, num_frames=600)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_sequential_matches_seek(self):
+        time_points = [0.0, 0.5, 1.0, 3.0, 9.0, 15.0]
+        seek_frames, _, _ = read_samples(self.video_path, 'seek', time_points)
+        seq_frames, _, stats = read_samples(self.video_path, 'sequential', time_points)
+
+        self.assertEqual(len(seek_frames), len(time_points))
+        self.assertEqual(len(seq_frames), len(time_points))
+        for a, b in zip(seek_frames, seq_frames):
+            self.assertLess(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean(), 1.0)
+
+        # 3.0s -> 9.0s は閾値(5s)を超えるためシーク、それ以外は grab で前進する
+        self.assertEqual(stats['seeks'], 2)
+        self.assertGreater(stats['grabs'], 0)
+
+    def test_backward_sample_seeks(self):
+        cap = cv2.VideoCapture(str(self.video_path))
+        reader = FrameReader(cap, cap.get(cv2.CAP_PROP_FPS), mode='sequential')
+        reader.read_at(2.0)
+        ret, _ = reader.read_at(1.0)
+        cap.release()
+
+        self.assertTrue(ret)
+        self.assertEqual(reader.stats['seeks'], 1)
+        self.assertEqual(reader.next_frame_index, 31)
+
+    def test_benchmark_seek_vs_sequential(self):
+        """サンプル毎シークと逐次デコードの所要時間を比較する"""
+        time_points = [i * 0.5 for i in range(40)]
+        results = {}
+        for mode in ('seek', 'sequential'):
+            frames, elapsed, stats = read_samples(self.video_path, mode, time_points)
+            self.assertEqual(len(frames), len(time_points))
+            results[mode] = (elapsed, stats)
+
+        for mode, (elapsed, stats) in results.items():
+            print(f"[benchmark] {mode:>10}: {elapsed * 1000:.1f} ms for {len(time_points)} samples {stats}")
+
+
+class TestMakeProxy(unittest.TestCase):
+    def test_width_and_long_side_limits(self):
+        frame = np.zeros((400, 800, 3), dtype=np.uint8)
+        self.assertEqual(make_proxy(frame, max_width=320).shape, (160, 320, 3))
+        self.assertEqual(make_proxy(frame, max_side=200).shape, (100, 200, 3))
+        # 0 または原寸以下の指定では縮小しない
+        self.assertIs(make_proxy(frame, max_width=0), frame)
+        self.assertIs(make_proxy(frame, max_width=1600), frame)
+
+    def test_gray_proxy(self):
+        frame = np.full((400, 800, 3), 128, dtype=np.uint8)
+        gray = make_proxy_gray(frame, max_width=320)
+        self.assertEqual(gray.shape, (160, 320))
+        self.assertEqual(int(gray[0, 0]), 128)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import errno
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from core.image_stager import ImageStager
+
+
+class TestImageStager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src_dir = Path(self.tmp.name) / 'src'
+        self.src_dir.mkdir()
+        self.stage_dir = Path(self.tmp.name) / 'stage'
+
+    def make_images(self, start: int, count: int, size: int = 1000):
+        paths = []
+        for i in range(start, start + count):
+            path = self.src_dir / f"img_{i:04d}.jpg"
+            path.write_bytes(bytes([i % 256]) * size)
+            paths.append(path)
+        return paths
+
+    def test_only_new_images_are_staged(self):
+        first = self.make_images(0, 5)
+        report = ImageStager(self.stage_dir).stage(first)
+        self.assertEqual(report.added, 5)
+
+        stager = ImageStager(self.stage_dir)
+        stager.stage(first)
+        report = stager.stage(first + self.make_images(5, 3))
+        self.assertEqual((report.added, report.unchanged, report.removed), (3, 5, 0))
+        self.assertEqual(sorted(p.name for p in self.stage_dir.iterdir()), stager.staged_names)
+        self.assertEqual(len(stager.staged_names), 8)
+
+    def test_hardlinks_copy_no_bytes(self):
+        report = ImageStager(self.stage_dir).stage(self.make_images(0, 4))
+        self.assertEqual(report.methods, {'hardlink': 4})
+        self.assertEqual(report.bytes_copied, 0)
+        self.assertTrue(os.path.samefile(self.stage_dir / 'img_0000.jpg', self.src_dir / 'img_0000.jpg'))
+
+    def test_dropped_and_changed_images_are_updated(self):
+        images = self.make_images(0, 4)
+        stager = ImageStager(self.stage_dir)
+        with patch('os.link', side_effect=OSError(errno.EXDEV, 'cross-device')), \
+                patch('os.symlink', side_effect=OSError(errno.EPERM, 'not permitted')), \
+                patch.object(ImageStager, '_reflink', side_effect=OSError(errno.EOPNOTSUPP, 'not supported')):
+            stager.stage(images)
+            time.sleep(0.01)
+            images[0].write_bytes(b'changed')
+            report = stager.stage(images[:3])
+        self.assertEqual((report.added, report.removed, report.unchanged), (1, 1, 2))
+        self.assertEqual(report.methods, {'copy': 1})
+        self.assertEqual(report.bytes_copied, len(b'changed'))
+        self.assertEqual((self.stage_dir / 'img_0000.jpg').read_bytes(), b'changed')
+        self.assertFalse((self.stage_dir / 'img_0003.jpg').exists())
+
+    def test_symlink_fallback_and_missing_sources(self):
+        images = self.make_images(0, 2)
+        stager = ImageStager(self.stage_dir)
+        with patch('os.link', side_effect=OSError(errno.EXDEV, 'cross-device')), \
+                patch.object(ImageStager, '_reflink', side_effect=OSError(errno.EOPNOTSUPP, 'not supported')):
+            report = stager.stage(images + [self.src_dir / 'missing.jpg'])
+        self.assertEqual(report.methods, {'symlink': 2})
+        self.assertEqual(report.missing, 1)
+        self.assertTrue((self.stage_dir / 'img_0001.jpg').is_symlink())
+
+    def test_transient_error_falls_back_for_that_file_only(self):
+        images = self.make_images(0, 3)
+        real_link = os.link
+
+        def link(src, dst):
+            if Path(src).name == 'img_0000.jpg':
+                raise OSError(errno.EACCES, 'permission denied')
+            real_link(src, dst)
+
+        stager = ImageStager(self.stage_dir)
+        with patch('os.link', side_effect=link), \
+                patch.object(ImageStager, '_reflink', side_effect=OSError(errno.EOPNOTSUPP, 'not supported')):
+            report = stager.stage(images)
+        # 1枚だけシンボリックリンクで配置し、残りは引き続きハードリンクを使う
+        self.assertEqual(report.methods, {'symlink': 1, 'hardlink': 2})
+        self.assertTrue((self.stage_dir / 'img_0000.jpg').is_symlink())
+        self.assertTrue(os.path.samefile(self.stage_dir / 'img_0002.jpg', self.src_dir / 'img_0002.jpg'))
+
+    def test_benchmark_incremental_vs_full_copy(self):
+        """反復ごとに全画像をコピーする方式と差分配置の所要時間・コピー量を比較する"""
+        images, full_sec, full_bytes = [], 0.0, 0
+        stager = ImageStager(self.stage_dir)
+        incremental_sec, incremental_bytes = 0.0, 0
+        full_dir = Path(self.tmp.name) / 'full'
+        full_dir.mkdir()
+        for iteration in range(5):
+            images += self.make_images(len(images), 100, size=50_000)
+            start = time.perf_counter()
+            for path in images:
+                shutil.copy(path, full_dir / path.name)
+                full_bytes += path.stat().st_size
+            full_sec += time.perf_counter() - start
+            report = stager.stage(images)
+            incremental_sec += report.elapsed_sec
+            incremental_bytes += report.bytes_copied
+            self.assertEqual(report.added, 100)
+
+        print(f"[benchmark] staging 5 iterations: full copy {full_sec * 1000:.0f} ms / {full_bytes / 1e6:.1f} MB, "
+              f"incremental {incremental_sec * 1000:.0f} ms / {incremental_bytes / 1e6:.1f} MB")
+        self.assertLess(incremental_bytes, full_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
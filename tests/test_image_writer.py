@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from core.image_writer import ImageWriter, ImageEncoder, register_encoder, create_encoder
+from models.config_models import OutputConfig
+
+
+class TestImageWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out_dir = Path(self.tmp.name)
+        self.image = np.zeros((32, 48, 3), dtype=np.uint8)
+        self.image[:, :24] = (0, 128, 255)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writes_each_format(self):
+        for image_format, extension in (('jpeg', '.jpg'), ('png', '.png'), ('webp', '.webp')):
+            writer = ImageWriter(OutputConfig(image_format=image_format, image_quality=90))
+            path = writer.image_path(self.out_dir, f"sample_{image_format}")
+            self.assertEqual(path.suffix, extension)
+
+            writer.submit(self.image, path)
+            writer.close()
+
+            loaded = cv2.imread(str(path))
+            self.assertIsNotNone(loaded, image_format)
+            self.assertEqual(loaded.shape, self.image.shape)
+
+    def test_flush_waits_for_all_writes(self):
+        writer = ImageWriter(OutputConfig(), workers=4, max_backlog=2)
+        paths = [writer.image_path(self.out_dir, f"img_{i:03d}") for i in range(20)]
+        for path in paths:
+            writer.submit(self.image, path)
+        writer.flush()
+
+        self.assertTrue(all(p.exists() for p in paths))
+        writer.close()
+
+    def test_flush_raises_write_error(self):
+        writer = ImageWriter(OutputConfig())
+        writer.submit(self.image, self.out_dir / 'missing_dir' / 'img.jpg')
+        with self.assertRaises(OSError):
+            writer.flush()
+        # エラーは一度だけ報告される
+        writer.flush()
+        writer.close()
+
+    def test_backlog_is_bounded(self):
+        release = threading.Event()
+        in_flight = []
+
+        class BlockingEncoder(ImageEncoder):
+            extension = '.raw'
+
+            def encode(self, image):
+                in_flight.append(1)
+                release.wait(5)
+                return image.tobytes()
+
+        register_encoder('blocking', lambda quality: BlockingEncoder())
+        writer = ImageWriter(OutputConfig(image_format='blocking'), workers=1, max_backlog=2)
+        writer.submit(self.image, self.out_dir / 'a.raw')
+        writer.submit(self.image, self.out_dir / 'b.raw')
+
+        blocked = threading.Thread(target=writer.submit, args=(self.image, self.out_dir / 'c.raw'))
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+
+        release.set()
+        blocked.join(5)
+        writer.close()
+        self.assertEqual(len(in_flight), 3)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            create_encoder('bmp2', 95)
+
+
+if __name__ == '__main__':
+    unittest.main()
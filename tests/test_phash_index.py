@@ -0,0 +1,185 @@
+import unittest
+import multiprocessing
+import random
+import tempfile
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from core.phash_index import BKTree, PerceptualHashIndex, hamming, phash, dhash, INDEX_FILENAME
+from core.video_extractor import VideoExtractor
+from models.config_models import AppConfig, DedupeConfig
+from tests.test_frame_reader import make_synthetic_clip
+
+
+def textured_image(seed: int, h: int = 128, w: int = 128) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    gray = rng.integers(0, 256, size=(h // 8, w // 8), dtype=np.uint8)
+    gray = cv2.resize(gray, (w, h), interpolation=cv2.INTER_CUBIC)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def save_entries_worker(index_path: str, worker: int, count: int):
+    """別プロセスからエントリを1件ずつ追加しながら保存する"""
+    index = PerceptualHashIndex(Path(index_path), DedupeConfig())
+    for i in range(count):
+        index.add((worker << 32) | i, {'video_source': f"video_{worker}.mp4", 'timestamp': float(i)})
+        index.save()
+
+
+class TestBKTree(unittest.TestCase):
+    def test_query_matches_brute_force(self):
+        rng = random.Random(0)
+        values = [rng.getrandbits(64) for _ in range(500)]
+        tree = BKTree()
+        for i, v in enumerate(values):
+            tree.add(v, i)
+
+        for _ in range(20):
+            probe = values[rng.randrange(len(values))] ^ (1 << rng.randrange(64))
+            expected = sorted(i for i, v in enumerate(values) if hamming(v, probe) <= 6)
+            found = sorted(payload for _, payload in tree.query(probe, 6))
+            self.assertEqual(found, expected)
+
+    def test_remove(self):
+        tree = BKTree()
+        payload = {'id': 1}
+        tree.add(0b1010, payload)
+        self.assertTrue(tree.remove(0b1010, payload))
+        self.assertEqual(tree.query(0b1010, 0), [])
+        self.assertEqual(len(tree), 0)
+
+
+class TestPerceptualHash(unittest.TestCase):
+    def test_hash_is_robust_to_small_changes(self):
+        image = textured_image(0)
+        brighter = cv2.add(image, np.full_like(image, 10))
+        resized = cv2.resize(cv2.resize(image, (96, 96)), (128, 128))
+        for hash_function in (phash, dhash):
+            self.assertLessEqual(hamming(hash_function(image), hash_function(brighter)), 4)
+            self.assertLessEqual(hamming(hash_function(image), hash_function(resized)), 4)
+            self.assertGreater(hamming(hash_function(image), hash_function(textured_image(1))), 10)
+
+
+class TestPerceptualHashIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index_path = Path(self.tmp.name) / INDEX_FILENAME
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_duplicates_persist_across_instances(self):
+        index = PerceptualHashIndex(self.index_path, DedupeConfig())
+        image = textured_image(0)
+        self.assertIsNone(index.check_and_add(image, {'video_source': 'a.mp4', 'timestamp': 1.0}))
+        index.save()
+
+        reloaded = PerceptualHashIndex(self.index_path, DedupeConfig())
+        self.assertEqual(len(reloaded), 1)
+        duplicate = reloaded.check_and_add(cv2.add(image, np.full_like(image, 5)),
+                                           {'video_source': 'b.mp4', 'timestamp': 7.0})
+        self.assertEqual(duplicate['video_source'], 'a.mp4')
+        # 同じ動画・時刻の画像は再抽出なので重複扱いしない
+        self.assertIsNone(reloaded.check_and_add(image, {'video_source': 'a.mp4', 'timestamp': 1.0}))
+
+    def test_removed_entries_are_not_saved(self):
+        index = PerceptualHashIndex(self.index_path, DedupeConfig())
+        entry = {'video_source': 'a.mp4', 'timestamp': 1.0, 'face': 'front'}
+        index.check_and_add(textured_image(0), entry)
+        index.save()
+        index.remove(entry)
+        index.save()
+
+        self.assertEqual(len(PerceptualHashIndex(self.index_path, DedupeConfig())), 0)
+
+    def test_concurrent_threads_keep_one_of_near_duplicates(self):
+        # 複数ワーカーが同時に近似重複を照合しても、登録されるのは1枚だけ
+        index = PerceptualHashIndex(self.index_path, DedupeConfig())
+        image = textured_image(0)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def check(worker):
+            barrier.wait()
+            results.append(index.check_and_add(image, {'video_source': f"video_{worker}.mp4", 'timestamp': 1.0}))
+
+        threads = [threading.Thread(target=check, args=(w,)) for w in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(r is None for r in results), 1)
+        self.assertEqual(len(index), 1)
+
+    def test_concurrent_process_saves_keep_all_entries(self):
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=save_entries_worker, args=(str(self.index_path), w, 15))
+                     for w in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+        self.assertEqual([p.exitcode for p in processes], [0, 0, 0])
+        self.assertEqual(len(PerceptualHashIndex(self.index_path, DedupeConfig())), 45)
+        self.assertEqual(list(Path(self.tmp.name).glob('*.tmp')), [])
+
+    def test_cross_video_duplicates_are_dropped_after_merge(self):
+        # 2つのワーカーがそれぞれ同じ見た目の画像を別の動画から登録した状態
+        frames = []
+        worker_indexes = {video: PerceptualHashIndex(self.index_path, DedupeConfig()) for video in ('a.mp4', 'b.mp4')}
+        for video, worker_index in worker_indexes.items():
+            for t, seed in ((1.0, 0), (2.0, 1 if video == 'a.mp4' else 2)):
+                path = Path(self.tmp.name) / f"{Path(video).stem}_{t}.jpg"
+                path.write_bytes(b'jpeg')
+                entry = {'video_source': video, 'timestamp': t, 'image_path': str(path)}
+                self.assertIsNone(worker_index.check_and_add(textured_image(seed), entry))
+                frames.append(entry)
+            worker_index.save()
+
+        extractor = VideoExtractor(AppConfig())
+        kept = extractor.drop_cross_video_duplicates(frames, self.tmp.name)
+
+        self.assertEqual([(f['video_source'], f['timestamp']) for f in kept],
+                         [('a.mp4', 1.0), ('a.mp4', 2.0), ('b.mp4', 2.0)])
+        self.assertFalse((Path(self.tmp.name) / 'b_1.0.jpg').exists())
+        self.assertEqual(len(PerceptualHashIndex(self.index_path, DedupeConfig())), 3)
+
+    def test_other_hash_method_is_ignored(self):
+        index = PerceptualHashIndex(self.index_path, DedupeConfig(hash_method='dhash'))
+        index.check_and_add(textured_image(0), {'video_source': 'a.mp4', 'timestamp': 1.0})
+        index.save()
+
+        self.assertEqual(len(PerceptualHashIndex(self.index_path, DedupeConfig(hash_method='phash'))), 0)
+
+
+class TestExtractionDedupe(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.video_path = Path(self.tmp.name) / 'clip.mp4'
+        make_synthetic_clip(self.video_path, num_frames=90, fps=30.0, size=(256, 128))
+        self.output_dir = Path(self.tmp.name) / 'out'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_targeted_frames_skip_near_duplicates(self):
+        extractor = VideoExtractor(AppConfig())
+        problems = [{'type': 'unaligned_cluster', 'video_source': str(self.video_path),
+                     'start_time': 1.0, 'end_time': 1.0}]
+        first = extractor.extract_targeted_frames(problems, str(self.output_dir))
+        self.assertEqual(len(first), 1)
+        self.assertTrue((self.output_dir / INDEX_FILENAME).exists())
+
+        # 別の動画として同じ内容を再抽出すると重複として除外される
+        copy_path = Path(self.tmp.name) / 'copy.mp4'
+        copy_path.write_bytes(self.video_path.read_bytes())
+        problems[0]['video_source'] = str(copy_path)
+        second = VideoExtractor(AppConfig()).extract_targeted_frames(problems, str(self.output_dir))
+        self.assertEqual(second, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
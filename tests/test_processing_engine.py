@@ -0,0 +1,105 @@
+import unittest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from core.processing_engine import ProcessingEngine
+from models.config_models import AppConfig
+
+
+def thread_pool_executor(max_workers, mp_context=None):
+    # テストではモックを共有できるようプロセスの代わりにスレッドで実行する
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+class TestParallelInitialExtraction(unittest.TestCase):
+    def setUp(self):
+        self.config = AppConfig()
+        self.config.processing.extraction_workers = 3
+        self.config.processing.target_images_per_video = 30
+        with patch('core.processing_engine.QualityFilter'), \
+                patch('core.processing_engine.RealityScanScheduler'):
+            self.engine = ProcessingEngine(self.config)
+
+    def test_results_merge_in_video_order(self):
+        videos = ['a.mp4', 'b.mp4', 'c.mp4']
+        delays = {'a.mp4': 0.3, 'b.mp4': 0.1, 'c.mp4': 0.0}
+
+        def fake_extract(self_, video_path, target_count, quality_filter, confidence, area_threshold,
+                         output_dir, stop_check=None, progress_callback=None):
+            progress_callback(0.5)
+            time.sleep(delays[video_path])
+            return [{'video_source': video_path, 'timestamp': float(t)} for t in range(2)]
+
+        with patch('core.processing_engine.QualityFilter'), \
+                patch('core.processing_engine.ProcessPoolExecutor', thread_pool_executor), \
+                patch('core.processing_engine.VideoExtractor.extract_adaptive_frames', fake_extract):
+            frames = self.engine._extract_initial_frames(videos, 'out')
+
+        self.assertEqual([f['video_source'] for f in frames],
+                         ['a.mp4', 'a.mp4', 'b.mp4', 'b.mp4', 'c.mp4', 'c.mp4'])
+        self.assertEqual(self.engine.progress_info['phase_progress'], 100)
+        self.assertEqual(self.engine.progress_info['video_progress'], [1.0, 1.0, 1.0])
+        self.assertEqual(self.engine.progress_info['total_images'], 6)
+
+    def test_stop_request_propagates_to_workers(self):
+        stopped = []
+
+        def fake_extract(self_, video_path, target_count, quality_filter, confidence, area_threshold,
+                         output_dir, stop_check=None, progress_callback=None):
+            deadline = time.time() + 10
+            while not stop_check() and time.time() < deadline:
+                time.sleep(0.05)
+            stopped.append(video_path)
+            return []
+
+        with patch('core.processing_engine.QualityFilter'), \
+                patch('core.processing_engine.ProcessPoolExecutor', thread_pool_executor), \
+                patch('core.processing_engine.VideoExtractor.extract_adaptive_frames', fake_extract):
+            self.engine.stop_requested = True
+            start = time.time()
+            frames = self.engine._extract_initial_frames(['a.mp4', 'b.mp4'], 'out')
+
+        self.assertEqual(frames, [])
+        self.assertEqual(sorted(stopped), ['a.mp4', 'b.mp4'])
+        self.assertLess(time.time() - start, 5)
+
+    def test_single_worker_uses_shared_extractor(self):
+        self.config.processing.extraction_workers = 1
+        self.engine.video_extractor = MagicMock()
+        self.engine.video_extractor.extract_adaptive_frames.return_value = [{'video_source': 'a.mp4'}]
+
+        frames = self.engine._extract_initial_frames(['a.mp4', 'b.mp4'], 'out')
+
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(self.engine.video_extractor.extract_adaptive_frames.call_count, 2)
+        self.assertEqual(self.engine.progress_info['phase_progress'], 100)
+
+
+class TestAlignmentCandidates(unittest.TestCase):
+    def test_best_scoring_quality_is_kept(self):
+        config = AppConfig()
+        config.realityscan.iteration_qualities = ['draft', 'normal']
+        with patch('core.processing_engine.QualityFilter'), \
+                patch('core.processing_engine.RealityScanScheduler'):
+            engine = ProcessingEngine(config)
+
+        def result(quality, ratio, status='completed'):
+            return {'quality': quality, 'slot': quality, 'status': status, 'components': [{}],
+                    'alignment_ratio': ratio, 'mean_reprojection_error': 1.0}
+
+        engine.realityscan_scheduler.run.return_value = [result('draft', 0.9), result('normal', 0.7)]
+        best = engine._run_alignment([{'image_path': 'a.jpg'}])
+
+        jobs = engine.realityscan_scheduler.run.call_args.args[0]
+        self.assertEqual([job.quality for job in jobs], ['draft', 'normal'])
+        self.assertEqual(best['quality'], 'draft')
+        engine.realityscan_scheduler.share_result.assert_called_once_with(best)
+
+        # キャンセルされた候補は採用しない
+        engine.realityscan_scheduler.run.return_value = [result('draft', 0.9, 'cancelled'), result('normal', 0.7)]
+        self.assertEqual(engine._run_alignment([])['quality'], 'normal')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,298 @@
+import unittest
+import importlib.util
+import logging
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.engine.results import Boxes
+
+from core.quality_filter import QualityFilter
+from core.yolo_backends import (TorchBackend, clear_shared_backends, convert_openvino, create_backend, export_onnx,
+                                export_stem)
+from models.config_models import YoloConfig
+from models.data_models import DetectionRecord
+
+
+class FakeModel:
+    """正規化座標で固定の検出結果を返す ultralytics モデル（入力解像度に合わせてピクセル座標を作る）"""
+
+    def __init__(self, detections):
+        # (x1, y1, x2, y2, conf, cls) の正規化座標
+        self.detections = detections
+        self.calls = []
+
+    def __call__(self, images, verbose=False, **kwargs):
+        self.calls.append(len(images))
+        results = []
+        for image in images:
+            h, w = image.shape[:2]
+            data = torch.tensor([[x1 * w, y1 * h, x2 * w, y2 * h, conf, cls]
+                                 for x1, y1, x2, y2, conf, cls in self.detections], dtype=torch.float32)
+            results.append(SimpleNamespace(boxes=Boxes(data.reshape(-1, 6), orig_shape=(h, w))))
+        return results
+
+
+def export_worker(model_path: str, export_dir: str):
+    """別プロセスから同じモデルを ONNX にエクスポートする"""
+    export_onnx(YoloConfig(model_name=model_path, device='cpu', imgsz=320, export_dir=export_dir))
+
+
+def convert_worker(onnx_path: str):
+    """別プロセスから同じ ONNX を OpenVINO IR に変換する"""
+    convert_openvino(Path(onnx_path))
+
+
+def make_filter(detections) -> QualityFilter:
+    backend = TorchBackend.__new__(TorchBackend)
+    backend.config = YoloConfig()
+    backend.conf_threshold = TorchBackend.CONF_THRESHOLD
+    backend.model = FakeModel(detections)
+    backend.names = {0: 'person', 1: 'bicycle', 2: 'car'}
+
+    quality_filter = QualityFilter.__new__(QualityFilter)
+    quality_filter.config = YoloConfig()
+    quality_filter.logger = logging.getLogger(__name__)
+    quality_filter.backend = backend
+    quality_filter.detection_cache = None
+    quality_filter.class_ids = quality_filter._resolve_class_ids(quality_filter.config.filtering.enabled_classes)
+    return quality_filter
+
+
+class TestQualityFilter(unittest.TestCase):
+    def test_area_ratio_does_not_depend_on_resolution(self):
+        # 面積比 0.5 * 0.4 = 0.2、画像中心から離れた人物
+        quality_filter = make_filter([(0.0, 0.0, 0.5, 0.4, 0.9, 0)])
+        for w, h in ((5760, 2880), (1280, 640), (320, 160)):
+            image = np.zeros((h, w, 3), dtype=np.uint8)
+            self.assertFalse(quality_filter.is_frame_acceptable(image, 0.5, 0.15))
+            self.assertTrue(quality_filter.is_frame_acceptable(image, 0.5, 0.25))
+
+    def test_low_confidence_and_other_classes_are_ignored(self):
+        quality_filter = make_filter([(0.0, 0.0, 1.0, 1.0, 0.3, 0), (0.0, 0.0, 1.0, 1.0, 0.9, 2)])
+        self.assertTrue(quality_filter.is_frame_acceptable(np.zeros((64, 128, 3), dtype=np.uint8), 0.5, 0.15))
+
+    def test_evaluate_batch_runs_one_model_call(self):
+        quality_filter = make_filter([(0.1, 0.2, 0.6, 0.6, 0.9, 0), (0.0, 0.0, 0.1, 0.1, 0.8, 2)])
+        images = [np.zeros((64, 128, 3), dtype=np.uint8)] * 3 + [None]
+        verdicts = quality_filter.evaluate_batch(images, 0.5, 0.15)
+
+        self.assertEqual(quality_filter.backend.model.calls, [3])
+        self.assertEqual([v.accepted for v in verdicts], [False, False, False, False])
+        self.assertEqual(verdicts[0].rejection_reason, 'person')
+        self.assertEqual(verdicts[3].rejection_reason, 'no_image')
+        self.assertEqual(len(verdicts[0].detections), 2)
+        np.testing.assert_allclose(verdicts[0].detections.to_array()[0], [0.1, 0.2, 0.6, 0.6, 0.9, 0], atol=1e-5)
+
+    def test_enabled_classes_and_center_distance(self):
+        # 小さいが画像中心にある車と、大きいが端にある人物
+        quality_filter = make_filter([(0.45, 0.45, 0.55, 0.55, 0.9, 2), (0.0, 0.0, 0.3, 0.9, 0.9, 0)])
+        image = np.zeros((64, 128, 3), dtype=np.uint8)
+        verdict = quality_filter.evaluate_batch([image], 0.5, 0.5)[0]
+        self.assertTrue(verdict.accepted)
+
+        quality_filter.class_ids = quality_filter._resolve_class_ids(['person', 'car'])
+        verdict = quality_filter.evaluate_batch([image], 0.5, 0.005)[0]
+        self.assertEqual(verdict.rejection_reason, 'car')
+
+        # キャッシュした検出を、推論し直さずに別の閾値で再判定する
+        self.assertTrue(quality_filter.evaluate_detections(verdict.detections, 0.5, 0.5).accepted)
+        self.assertEqual(quality_filter.evaluate_detections(verdict.detections, 0.5, 0.2).rejection_reason, 'person')
+        # 中心判定を有効にすると、端にある大きな人物だけでは不採用にならない
+        quality_filter.config.filtering.person.center_distance_threshold = 0.3
+        self.assertTrue(quality_filter.evaluate_detections(verdict.detections, 0.5, 0.2).accepted)
+        self.assertEqual(quality_filter.backend.model.calls, [1, 1])
+
+    def test_small_person_near_center_is_accepted(self):
+        quality_filter = make_filter([(0.45, 0.4, 0.55, 0.6, 0.9, 0)])
+        image = np.zeros((64, 128, 3), dtype=np.uint8)
+        for center_distance_threshold in (0.0, 0.3):
+            quality_filter.config.filtering.person.center_distance_threshold = center_distance_threshold
+            self.assertTrue(quality_filter.evaluate_batch([image], 0.5, 0.15)[0].accepted)
+        # 大きく中心にある人物は従来どおり不採用
+        record = DetectionRecord([[0.2, 0.1, 0.8, 0.9]], [0.9], [0])
+        self.assertEqual(quality_filter.evaluate_detections(record, 0.5, 0.15).rejection_reason, 'person')
+
+
+class TestLazyModelLoading(unittest.TestCase):
+    def setUp(self):
+        clear_shared_backends()
+        self.addCleanup(clear_shared_backends)
+        # 重みのダウンロードを避けるため構成ファイルから（未学習の）モデルを作る
+        self.config = YoloConfig(model_name='yolov8n.yaml', device='cpu', detection_cache_enabled=False)
+
+    def test_model_is_loaded_on_first_use_and_shared(self):
+        first = QualityFilter(self.config)
+        second = QualityFilter(self.config)
+        self.assertFalse(first.is_loaded)
+
+        first.evaluate_batch([np.zeros((64, 128, 3), dtype=np.uint8)], 0.5, 0.15)
+        self.assertTrue(first.is_loaded)
+        self.assertFalse(second.is_loaded)
+        self.assertIs(second.backend, first.backend)
+
+    def test_full_cache_hit_does_not_load_model(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = YoloConfig(model_name='yolov8n.yaml', device='cpu',
+                                detection_cache_path=str(Path(tmp) / 'detections.sqlite3'))
+            images = [np.zeros((64, 128, 3), dtype=np.uint8)] * 2
+            keys = [('video', 0.0), ('video', 0.5)]
+            first = QualityFilter(config)
+            expected = first.evaluate_batch(images, 0.5, 0.15, cache_keys=keys)
+            self.assertTrue(first.is_loaded)
+            first.detection_cache.close()
+            clear_shared_backends()
+
+            # 再実行: 全フレームがキャッシュにあるのでモデルを読み込まずに判定する
+            rerun = QualityFilter(config)
+            verdicts = rerun.evaluate_batch(images, 0.5, 0.15, cache_keys=keys)
+            self.assertFalse(rerun.is_loaded)
+            self.assertEqual(rerun.class_names, first.backend.names)
+            self.assertEqual(rerun.class_ids, first.class_ids)
+            self.assertEqual([v.accepted for v in verdicts], [v.accepted for v in expected])
+            rerun.detection_cache.close()
+
+    def test_background_warm_up(self):
+        quality_filter = QualityFilter(self.config)
+        quality_filter.warm_up().join()
+        self.assertTrue(quality_filter.is_loaded)
+        self.assertIs(QualityFilter(self.config).backend, quality_filter.backend)
+
+
+class TestExportedBackends(unittest.TestCase):
+    """エクスポート済みモデルのバックエンドが PyTorch と同じ検出結果を返すか"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        # 重みのダウンロードを避けるため、構成ファイルから作った（未学習の）モデルを保存して使う
+        cls.model_path = Path(cls.tmp.name) / 'tiny.pt'
+        YOLO('yolov8n.yaml').save(str(cls.model_path))
+        rng = np.random.default_rng(0)
+        cls.images = [rng.integers(0, 256, size=(320, 640, 3), dtype=np.uint8) for _ in range(2)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def _config(self, backend: str) -> YoloConfig:
+        return YoloConfig(model_name=str(self.model_path), device='cpu', backend=backend,
+                          imgsz=320, export_dir=str(Path(self.tmp.name) / 'exports'), num_threads=1)
+
+    def _detect(self, backend_name: str):
+        backend = create_backend(self._config(backend_name))
+        self.assertEqual(backend.name, backend_name)
+        # 未学習モデルでも検出が出るよう信頼度閾値を下げる
+        backend.conf_threshold = 1e-5
+        return backend, backend.detect(self.images)
+
+    def _assert_matches_torch(self, backend_name: str):
+        reference, expected = self._detect('torch')
+        backend, detections = self._detect(backend_name)
+
+        self.assertEqual(backend.names, reference.names)
+        for a, b in zip(expected, detections):
+            self.assertGreater(len(a), 0)
+            self.assertEqual(a.shape, b.shape)
+            # 信頼度が同じ検出の順序は実装により異なるため、並べ替えて比較する
+            a, b = (d[np.lexsort(np.round(d, 3).T[::-1])] for d in (a, b))
+            np.testing.assert_allclose(a, b, atol=1e-3)
+        # エクスポートはモデル名・重みの内容・入力サイズごとにキャッシュされる
+        self.assertTrue((Path(self.tmp.name) / 'exports' / f"{export_stem(self._config(backend_name))}.onnx").exists())
+
+    def test_export_cache_distinguishes_weights(self):
+        # 別フォルダの同名の重み・同じパスに上書きした重みは別のエクスポートになる
+        other = Path(self.tmp.name) / 'other' / 'tiny.pt'
+        other.parent.mkdir(exist_ok=True)
+        other.write_bytes(self.model_path.read_bytes() + b'retrained')
+        stem = export_stem(self._config('onnxruntime'))
+        self.assertTrue(stem.startswith('tiny_') and stem.endswith('_320'))
+        other_config = self._config('onnxruntime')
+        other_config.model_name = str(other)
+        self.assertNotEqual(export_stem(other_config), stem)
+
+        before = export_stem(other_config)
+        other.write_bytes(self.model_path.read_bytes() + b'retrained again')
+        self.assertNotEqual(export_stem(other_config), before)
+        # ハブのモデル名は名前と入力サイズだけ
+        self.assertEqual(export_stem(YoloConfig(model_name='yolov8n.pt', imgsz=640)), 'yolov8n_640')
+
+    @unittest.skipUnless(importlib.util.find_spec('onnx'), 'onnx is not installed')
+    def test_concurrent_exports_are_serialized(self):
+        # 並列抽出ワーカーが同時にエクスポートしても、モデルは1回だけ書き出され壊れない
+        export_dir = Path(self.tmp.name) / 'concurrent_exports'
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=export_worker, args=(str(self.model_path), str(export_dir)))
+                     for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=300)
+        self.assertEqual([p.exitcode for p in processes], [0, 0])
+        config = self._config('onnxruntime')
+        config.export_dir = str(export_dir)
+        self.assertEqual(sorted(p.name for p in export_dir.glob('*.onnx')), [f"{export_stem(config)}.onnx"])
+        onnx_path, names = export_onnx(config)
+        self.assertGreater(onnx_path.stat().st_size, 0)
+        self.assertEqual(names, YOLO(str(self.model_path)).names)
+
+    @unittest.skipUnless(importlib.util.find_spec('openvino'), 'openvino is not installed')
+    def test_concurrent_openvino_conversions_are_serialized(self):
+        onnx_path, _ = export_onnx(self._config('openvino'))
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=convert_worker, args=(str(onnx_path),)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=300)
+        self.assertEqual([p.exitcode for p in processes], [0, 0])
+        self.assertTrue(onnx_path.with_suffix('.xml').exists() and onnx_path.with_suffix('.bin').exists())
+        self.assertEqual(list(onnx_path.parent.glob('.convert_*')), [])
+        import openvino as ov
+        ov.Core().read_model(str(onnx_path.with_suffix('.xml')))
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            create_backend(self._config('tensorrt'))
+
+    @unittest.skipUnless(importlib.util.find_spec('onnxruntime'), 'onnxruntime is not installed')
+    def test_onnxruntime_matches_torch(self):
+        self._assert_matches_torch('onnxruntime')
+
+    @unittest.skipUnless(importlib.util.find_spec('openvino'), 'openvino is not installed')
+    def test_openvino_matches_torch(self):
+        self._assert_matches_torch('openvino')
+
+
+class TestQualityFilterBenchmark(unittest.TestCase):
+    def test_benchmark_per_frame_vs_batched(self):
+        """CPU での1枚ずつの推論とバッチ推論のスループットを比較する"""
+        # 重みのダウンロードを避けるため構成ファイルから（未学習の）モデルを作る
+        config = YoloConfig(model_name='yolov8n.yaml', device='cpu', batch_size=8, detection_cache_enabled=False)
+        quality_filter = QualityFilter(config)
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, size=(640, 1280, 3), dtype=np.uint8) for _ in range(16)]
+        quality_filter.evaluate_batch(frames[:1], 0.5, 0.15)
+
+        start = time.perf_counter()
+        single = [quality_filter.is_frame_acceptable(f, 0.5, 0.15) for f in frames]
+        per_frame_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = []
+        for i in range(0, len(frames), config.batch_size):
+            batched.extend(v.accepted for v in quality_filter.evaluate_batch(frames[i:i + config.batch_size], 0.5, 0.15))
+        batched_sec = time.perf_counter() - start
+
+        self.assertEqual(single, batched)
+        print(f"[benchmark] per-frame: {len(frames) / per_frame_sec:.1f} fps, "
+              f"batch={config.batch_size}: {len(frames) / batched_sec:.1f} fps")
+
+
+if __name__ == '__main__':
+    unittest.main()
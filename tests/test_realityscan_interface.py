@@ -1,8 +1,15 @@
 # tests/test_realityscan_interface.py
+import stat
+import sys
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 from pathlib import Path
 import tempfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
 
 from core.realityscan_interface import RealityScanInterface
 from models.config_models import RealityScanConfig
@@ -10,7 +17,7 @@ from models.config_models import RealityScanConfig
 class TestRealityScanInterface(unittest.TestCase):
     def setUp(self):
         # Mock config
-        self.mock_config = RealityScanConfig(executable_path="/path/to/realityscan.exe")
+        self.mock_config = RealityScanConfig(executable_path="/path/to/realityscan.exe", alignment_cache_enabled=False)
 
         # We need to patch the logger before instantiating the class
         with patch('logging.getLogger') as mock_get_logger:
@@ -40,5 +47,146 @@ class TestRealityScanInterface(unittest.TestCase):
 
         self.assertEqual(generated_commands, expected_commands)
 
+    def test_prepare_temp_images_stages_only_new_faces(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.interface.temp_dir = Path(tmp)
+            images = []
+            for i in range(4):
+                path = Path(tmp) / f"frame_{i}__face_front.jpg"
+                path.write_bytes(b'jpeg')
+                images.append({'image_path': str(path), 'face': 'front'})
+
+            image_dir = self.interface._prepare_temp_images(images[:2], only_faces=True)
+            self.assertEqual(self.interface.last_staging.added, 2)
+            self.interface._prepare_temp_images(images, only_faces=True)
+            self.assertEqual((self.interface.last_staging.added, self.interface.last_staging.unchanged), (2, 2))
+            self.assertEqual(len(list(image_dir.iterdir())), 4)
+
+    def test_generate_xmp_files_from_main_component(self):
+        rotation = [[0.0, 0.0, 1.0], [0.0, 1.0, 0.0], [-1.0, 0.0, 0.0]]
+
+        def image(name):
+            return {'name': name, 'path': name, 'pose': {'tx': 1.0, 'ty': 2.0, 'tz': 3.5, 'rotation': rotation}}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            image_dir = Path(tmp)
+            images = []
+            for name in ('a__face_front.jpg', 'b__face_up.jpg', 'c__face_left.jpg', 'pano.jpg'):
+                (image_dir / name).write_bytes(b'jpeg')
+                images.append({'image_path': str(image_dir / name), 'face': None if name == 'pano.jpg' else 'x'})
+
+            self.interface.alignment_data = {'status': 'completed', 'components': [
+                {'id': '0', 'images': [image('a__face_front.jpg'), image('b__face_up.jpg'), image('pano.jpg')]},
+                {'id': '1', 'images': [image('c__face_left.jpg')]},
+            ]}
+            self.interface._generate_xmp_files(images, image_dir)
+            # 最大コンポーネントの面画像だけに事前情報を付ける（パノラマと別コンポーネントは対象外）
+            self.assertEqual(sorted(p.name for p in image_dir.glob('*.xmp')), ['a__face_front.xmp', 'b__face_up.xmp'])
+
+            ns = {'xcr': 'http://www.capturingreality.com/ns/xcr/1.1#',
+                  'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'}
+            desc = ET.parse(image_dir / 'a__face_front.xmp').getroot().find('rdf:RDF/rdf:Description', ns)
+            self.assertEqual(desc.get(f"{{{ns['xcr']}}}PosePrior"), 'initial')
+            written = np.array(desc.find('xcr:Rotation', ns).text.split(), dtype=float).reshape(3, 3)
+            np.testing.assert_allclose(written, np.array(rotation).T)
+            self.assertEqual(desc.find('xcr:Position', ns).text.split(), ['1', '2', '3.5'])
+
+            # 次の反復で最大コンポーネントから外れた画像の XMP は削除される
+            self.interface.alignment_data['components'][0]['images'] = [image('a__face_front.jpg')]
+            self.interface._generate_xmp_files(images, image_dir)
+            self.assertEqual([p.name for p in image_dir.glob('*.xmp')], ['a__face_front.xmp'])
+
+    def test_failed_alignment_gives_no_priors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / 'a__face_front.jpg').write_bytes(b'jpeg')
+            self.interface.alignment_data = {'status': 'failed', 'components': [
+                {'id': '0', 'images': [{'name': 'a__face_front.jpg', 'pose': {}}]}]}
+            self.interface._generate_xmp_files(
+                [{'image_path': str(Path(tmp) / 'a__face_front.jpg'), 'face': 'front'}], Path(tmp))
+            self.assertEqual(list(Path(tmp).glob('*.xmp')), [])
+
+
+FAKE_PROGRESS_REALITYSCAN = """#!{python}
+# 進捗を出力してから結果 XML を書き出す。hang が真なら途中で出力を止めたまま待ち続ける
+import sys, time
+from pathlib import Path
+
+args = sys.argv[1:]
+for percent in (10, 42, 100):
+    print(f'Aligning images {{percent}}%', flush=True)
+    if {hang}:
+        time.sleep(30)
+print('warning: low overlap', file=sys.stderr, flush=True)
+Path(args[args.index('-exportXMP') + 1]).write_text(
+    '<RealityScanProject><summary total_images="1" aligned_images="1"/><components/></RealityScanProject>')
+"""
+
+# 出力パイプを引き継いだ孫プロセスを残して止まる。孫は親が終了させられた後に出力する
+FAKE_ORPHANING_REALITYSCAN = """#!{python}
+import subprocess, sys, time
+
+print('Aligning images 10%', flush=True)
+subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(1.5); print("late output", flush=True)'])
+time.sleep(30)
+"""
+
+
+class TestRealityScanOutputStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        image = Path(self.tmp.name) / 'frame_0__face_front.jpg'
+        image.write_bytes(b'jpeg')
+        self.images = [{'image_path': str(image), 'face': 'front'}]
+
+    def make_interface(self, hang: bool, script: str = FAKE_PROGRESS_REALITYSCAN, **config) -> RealityScanInterface:
+        exe = Path(self.tmp.name) / 'fake_realityscan.py'
+        exe.write_text(script.format(python=sys.executable, hang=hang), encoding='utf-8')
+        exe.chmod(exe.stat().st_mode | stat.S_IXUSR)
+        interface = RealityScanInterface(RealityScanConfig(executable_path=str(exe), alignment_cache_enabled=False, **config),
+                                         instance_name='streaming_test')
+        interface.temp_dir = Path(self.tmp.name) / 'instances'
+        return interface
+
+    def test_progress_is_reported_and_output_logged(self):
+        interface = self.make_interface(hang=False)
+        progress = []
+        interface.progress_callback = lambda percent, line: progress.append((percent, line))
+        result = interface.run_alignment(self.images)
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual([p for p, _ in progress], [10.0, 42.0, 100.0])
+        self.assertEqual(progress[1][1], 'Aligning images 42%')
+        log = Path(result['log_path']).read_text(encoding='utf-8').splitlines()
+        self.assertIn('[stdout] Aligning images 42%', log)
+        self.assertIn('[stderr] warning: low overlap', log)
+
+    def test_stalled_process_is_killed(self):
+        interface = self.make_interface(hang=True, stall_timeout_seconds=1, timeout_seconds=60)
+        start = time.perf_counter()
+        result = interface.run_alignment(self.images)
+
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(result['status'], 'stalled')
+        self.assertEqual(result['components'], [])
+        self.assertIn('Aligning images 10%', Path(result['log_path']).read_text(encoding='utf-8'))
+
+    def test_output_after_log_is_closed_is_dropped(self):
+        interface = self.make_interface(hang=True, script=FAKE_ORPHANING_REALITYSCAN,
+                                        stall_timeout_seconds=0.5, timeout_seconds=60)
+        errors = []
+        hook = patch.object(threading, 'excepthook', lambda args: errors.append(args.exc_value))
+        hook.start()
+        self.addCleanup(hook.stop)
+        with patch('core.realityscan_interface.READER_JOIN_TIMEOUT_SEC', 0.1):
+            result = interface.run_alignment(self.images)
+        # 孫プロセスが閉じたログファイルの後に出力し、パイプを閉じるまで待つ
+        time.sleep(2.5)
+
+        self.assertEqual(result['status'], 'stalled')
+        self.assertEqual(errors, [])
+        self.assertNotIn('late output', Path(result['log_path']).read_text(encoding='utf-8'))
+
+
 if __name__ == '__main__':
     unittest.main()
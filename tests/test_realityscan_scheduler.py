@@ -0,0 +1,111 @@
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from core.realityscan_scheduler import AlignmentJob, RealityScanScheduler
+from models.config_models import RealityScanConfig
+
+FAKE_REALITYSCAN = """#!{python}
+# 引数から画像フォルダと出力先を読み取り、全画像を1コンポーネントとする結果 XML を書き出す
+import sys, time
+from pathlib import Path
+
+args = sys.argv[1:]
+image_dir = Path(args[args.index('-addFolder') + 1])
+xml_path = Path(args[args.index('-exportXMP') + 1])
+time.sleep({sleep})
+names = sorted(p.name for p in image_dir.iterdir())
+images = ''.join(f'<image name="{{n}}" path="{{image_dir / n}}" tx="0" ty="0" tz="0"/>' for n in names)
+xml_path.write_text(
+    f'<RealityScanProject><summary total_images="{{len(names)}}" aligned_images="{{len(names)}}" '
+    f'mean_reprojection_error="1.0"/><components><component id="0" num_images="{{len(names)}}" '
+    f'reprojection_error="1.0">{{images}}</component></components></RealityScanProject>')
+"""
+
+
+class TestRealityScanScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.images = []
+        for i in range(3):
+            path = Path(self.tmp.name) / f"frame_{i}__face_front.jpg"
+            path.write_bytes(b'jpeg')
+            self.images.append({'image_path': str(path), 'face': 'front', 'timestamp': float(i)})
+
+    def make_scheduler(self, sleep: float, max_instances: int = 2, timeout: int = 60) -> RealityScanScheduler:
+        exe = Path(self.tmp.name) / f"fake_realityscan_{sleep}.py"
+        exe.write_text(FAKE_REALITYSCAN.format(python=sys.executable, sleep=sleep), encoding='utf-8')
+        exe.chmod(exe.stat().st_mode | stat.S_IXUSR)
+        config = RealityScanConfig(executable_path=str(exe), max_instances=max_instances, timeout_seconds=timeout,
+                                   alignment_cache_enabled=False)
+        scheduler = RealityScanScheduler(config, base_name=f"test_{os.getpid()}_{time.monotonic_ns()}")
+        for slot in ('draft', 'normal', 'high'):
+            scheduler.instance(slot).temp_dir = Path(self.tmp.name) / 'instances'
+        self.addCleanup(scheduler.shutdown)
+        return scheduler
+
+    def jobs(self, *qualities):
+        return [AlignmentJob(slot=q, images=self.images, quality=q) for q in qualities]
+
+    def test_runs_up_to_max_instances_at_once(self):
+        scheduler = self.make_scheduler(sleep=1.0, max_instances=2)
+        start = time.perf_counter()
+        results = scheduler.run(self.jobs('draft', 'normal'))
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 1.8)
+        self.assertEqual([r['status'] for r in results], ['completed', 'completed'])
+        self.assertEqual([r['quality'] for r in results], ['draft', 'normal'])
+        self.assertEqual([r['components'][0]['image_count'] for r in results], [3, 3])
+        # インスタンスごとに別のディレクトリを使う
+        self.assertNotEqual(results[0]['raw_output_path'], results[1]['raw_output_path'])
+
+    def test_single_instance_runs_sequentially(self):
+        scheduler = self.make_scheduler(sleep=0.5, max_instances=1)
+        start = time.perf_counter()
+        scheduler.run(self.jobs('draft', 'normal'))
+        self.assertGreaterEqual(time.perf_counter() - start, 1.0)
+
+    def test_timeout_kills_instance(self):
+        scheduler = self.make_scheduler(sleep=30, timeout=1)
+        start = time.perf_counter()
+        result, = scheduler.run(self.jobs('draft'))
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(result['status'], 'timeout')
+        self.assertEqual(result['components'], [])
+
+    def test_cancel_stops_running_and_queued_jobs(self):
+        scheduler = self.make_scheduler(sleep=30, max_instances=2)
+        futures = [scheduler.submit(job) for job in self.jobs('draft', 'normal', 'high')]
+        threading.Timer(0.5, scheduler.cancel).start()
+        start = time.perf_counter()
+        results = [f.result(timeout=20) for f in futures]
+
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual([r['status'] for r in results], ['cancelled'] * 3)
+
+    def test_next_run_after_cancel_is_not_cancelled(self):
+        scheduler = self.make_scheduler(sleep=0)
+        scheduler.cancel()
+
+        results = scheduler.run(self.jobs('draft'))
+
+        self.assertNotEqual(results[0]['status'], 'cancelled')
+        self.assertEqual(len(results[0]['components']), 1)
+
+    def test_pending_stop_request_cancels_new_run(self):
+        scheduler = self.make_scheduler(sleep=30)
+
+        results = scheduler.run(self.jobs('draft', 'normal'), stop_check=lambda: True)
+
+        self.assertEqual([r['status'] for r in results], ['cancelled'] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import importlib.util
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from core.processing_engine import ProcessingEngine
+from core.realityscan_interface import RealityScanInterface
+from core.video_extractor import VideoExtractor
+from models.config_models import AppConfig, RealityScanConfig
+
+SIMULATOR = Path(__file__).resolve().parent.parent / 'scripts' / 'realityscan_simulator.py'
+FACES = tuple(VideoExtractor.FACE_ORIENTS)
+FPS = 30.0
+
+
+def make_face_images(image_dir: Path, frame_numbers, video: str = 'walk'):
+    """シミュレータが読む名前形式のキューブフェイス画像と、そのメタデータを作る"""
+    image_dir.mkdir(parents=True, exist_ok=True)
+    images = []
+    for frame in frame_numbers:
+        for face in FACES:
+            path = image_dir / f"{video}_frame_{frame:05d}__face_{face}.jpg"
+            path.write_bytes(b'jpeg')
+            images.append({'image_path': str(path), 'face': face, 'timestamp': frame / FPS,
+                           'video_source': f"/videos/{video}.mp4"})
+    return images
+
+
+class TestRealityScanSimulator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.image_dir = Path(self.tmp.name) / 'frames'
+        env = patch.dict(os.environ, {'REALITYSCAN_SIM_LATENCY': '0.001', 'REALITYSCAN_SIM_MAX_GAP_FRAMES': '45',
+                                      'REALITYSCAN_SIM_DROP_RATIO': '0'})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def make_interface(self) -> RealityScanInterface:
+        interface = RealityScanInterface(RealityScanConfig(executable_path=str(SIMULATOR), alignment_cache_enabled=False),
+                                         instance_name='simulator_test')
+        interface.temp_dir = Path(self.tmp.name) / 'instances'
+        return interface
+
+    def test_gaps_split_components(self):
+        # 90〜300 フレームの間が空いているので2つのコンポーネントになり、孤立した 600 は未整列
+        images = make_face_images(self.image_dir, [0, 30, 60, 90, 300, 330, 600])
+        result = self.make_interface().run_alignment(images)
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual([c['image_count'] for c in result['components']], [24, 12])
+        self.assertEqual(sorted(result['unaligned_images']),
+                         sorted(f"walk_frame_00600__face_{face}.jpg" for face in FACES))
+        # 2つ目のコンポーネントは先頭カメラを原点とする独立した座標系
+        self.assertEqual(result['components'][1]['images'][0]['pose']['tx'], 0.0)
+
+    def test_face_directions_match_extractor(self):
+        spec = importlib.util.spec_from_file_location('realityscan_simulator', SIMULATOR)
+        simulator = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(simulator)
+        self.assertEqual(simulator.FACE_DIRECTIONS, VideoExtractor.FACE_ORIENTS)
+
+        result = self.make_interface().run_alignment(make_face_images(self.image_dir, [0, 30]))
+        poses = {img['name']: img['pose'] for img in result['components'][0]['images']}
+        # up 面の光軸（回転の3列目）は鉛直方向を向く（正面向きの姿勢に落ちない）
+        up = poses['walk_frame_00000__face_up.jpg']['rotation']
+        self.assertAlmostEqual(abs(up[1][2]), 1.0, places=6)
+        self.assertNotEqual(up, poses['walk_frame_00000__face_front.jpg']['rotation'])
+
+    def test_targeted_and_webp_images_fill_gaps(self):
+        images = make_face_images(self.image_dir, [0, 30, 300, 330])
+        # extract_targeted_frames が書き出す名前（秒単位）と、webp で書き出した画像
+        for seconds in ('2_000', '3_500', '5_000', '6_500', '8_000', '9_500'):
+            path = self.image_dir / f"walk_targeted_{seconds}s.webp"
+            path.write_bytes(b'webp')
+            images.append({'image_path': str(path), 'timestamp': float(seconds.replace('_', '.')),
+                           'video_source': '/videos/walk.mp4'})
+        interface = self.make_interface()
+        interface.config.use_cube_faces = False
+        result = interface.run_alignment(images)
+
+        self.assertEqual(len(result['components']), 1)
+        self.assertEqual(result['components'][0]['image_count'], len(images))
+        self.assertEqual(result['unaligned_images'], [])
+
+    def test_pose_priors_are_kept(self):
+        images = make_face_images(self.image_dir, [0, 30, 60])
+        interface = self.make_interface()
+        first = interface.run_alignment(images)
+        second = interface.run_alignment(images + make_face_images(self.image_dir, [90]))
+
+        self.assertEqual(len(second['components']), 1)
+        before = {img['name']: img['pose'] for img in first['components'][0]['images']}
+        after = {img['name']: img['pose'] for img in second['components'][0]['images']}
+        for name, pose in before.items():
+            self.assertAlmostEqual(after[name]['tx'], pose['tx'], places=9)
+            for row_after, row_before in zip(after[name]['rotation'], pose['rotation']):
+                for a, b in zip(row_after, row_before):
+                    self.assertAlmostEqual(a, b, places=9)
+
+    def test_benchmark_adaptive_alignment_loop(self):
+        """シミュレータを使って適応的アライメントの反復全体を計測する"""
+        env = patch.dict(os.environ, {'REALITYSCAN_SIM_LATENCY': '0.002', 'REALITYSCAN_SIM_DROP_RATIO': '0.01'})
+        env.start()
+        self.addCleanup(env.stop)
+        config = AppConfig()
+        config.realityscan.executable_path = str(SIMULATOR)
+        config.realityscan.alignment_cache_enabled = False
+        # ホームディレクトリの検出キャッシュに書き込まない
+        config.yolo.detection_cache_enabled = False
+        # ターゲット抽出の画像は面に分けないので、キューブフェイスと一緒に全画像を渡す
+        config.realityscan.use_cube_faces = False
+        config.processing.max_iterations = 5
+        # 再投影誤差では止めず、コンポーネントが1つにつながるまで反復させる
+        config.realityscan.stop_conditions.reprojection_error_threshold = 0.0
+        engine = ProcessingEngine(config)
+        engine.realityscan_scheduler.instance('normal').temp_dir = Path(self.tmp.name) / 'instances'
+        self.addCleanup(engine.realityscan_scheduler.shutdown)
+
+        # 0〜10 秒と 20〜30 秒だけを抽出した状態から始める
+        initial = make_face_images(self.image_dir, list(range(0, 301, 30)) + list(range(600, 901, 30)))
+        targeted_calls = []
+
+        def extract_targeted_frames(problem_areas, output_dir, existing_images=None):
+            # 問題区間を 1 秒間隔で埋める（動画のデコードの代わり）
+            existing = {round(img['timestamp'] * FPS) for img in existing_images or []}
+            frames = set()
+            for problem in problem_areas:
+                start, end = round(problem['start_time'] * FPS), round(problem['end_time'] * FPS)
+                frames.update(f for f in range(start - start % 30, end + 1, 30) if f not in existing)
+            targeted_calls.append(len(frames))
+            # extract_targeted_frames と同じ名前・形式（面に分けない equirect）で書き出す
+            added = []
+            for frame in sorted(frames):
+                t = frame / FPS
+                path = self.image_dir / f"walk_targeted_{f'{t:.3f}'.replace('.', '_')}s.jpg"
+                path.write_bytes(b'jpeg')
+                added.append({'video_source': '/videos/walk.mp4', 'timestamp': t, 'image_path': str(path),
+                              'type': 'targeted'})
+            return added
+
+        engine.video_extractor.extract_targeted_frames = extract_targeted_frames
+        start = time.perf_counter()
+        result = engine._adaptive_alignment_process(list(initial), str(self.tmp.name))
+        elapsed = time.perf_counter() - start
+
+        print(f"[benchmark] adaptive alignment with simulator: {len(targeted_calls) + 1} iterations, "
+              f"{len(initial)} -> {result['total_images']} images, {elapsed:.2f} s "
+              f"(progress {engine.progress_info['realityscan_progress']})")
+        self.assertEqual(len(result['components']), 1)
+        self.assertGreater(result['total_images'], len(initial))
+        self.assertEqual(engine.progress_info['realityscan_progress'], {'normal': 100.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
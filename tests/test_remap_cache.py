@@ -0,0 +1,77 @@
+import unittest
+import time
+
+import cv2
+import numpy as np
+
+from core.remap_cache import RemapCache, build_face_maps
+from core.video_extractor import VideoExtractor
+from models.config_models import AppConfig
+
+
+def make_equirect(h: int, w: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+
+
+class TestRemapCache(unittest.TestCase):
+    def test_cached_maps_match_float_remap(self):
+        eqp = make_equirect(256, 512)
+        extractor = VideoExtractor(AppConfig())
+        faces = extractor._equirectangular_to_cubefaces(eqp, face_size=64)
+
+        for name, (yaw, pitch) in VideoExtractor.FACE_ORIENTS.items():
+            map_x, map_y = build_face_maps(256, 512, 64, yaw, pitch)
+            expected = cv2.remap(eqp, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_WRAP)
+            # 固定小数点テーブルは 1/32 画素精度のため僅かな差のみ許容する
+            diff = np.abs(faces[name].astype(np.int16) - expected.astype(np.int16))
+            self.assertLessEqual(diff.mean(), 2.0, name)
+
+        self.assertEqual(extractor.remap_cache.stats['misses'], 6)
+        extractor._equirectangular_to_cubefaces(eqp, face_size=64)
+        self.assertEqual(extractor.remap_cache.stats['hits'], 6)
+
+    def test_lru_eviction_respects_byte_limit(self):
+        # 64x64 の固定小数点テーブルは 64*64*(4+2) = 24576 バイト
+        cache = RemapCache(max_bytes=3 * 24576)
+        for yaw in (0, 90, 180):
+            cache.get(128, 256, 64, yaw, 0)
+        cache.get(128, 256, 64, 0, 0)  # yaw=0 を最新にする
+        cache.get(128, 256, 64, -90, 0)
+
+        self.assertEqual(len(cache), 3)
+        self.assertLessEqual(cache.current_bytes, cache.max_bytes)
+        self.assertEqual(cache.stats['evictions'], 1)
+
+        # 最も古い yaw=90 が破棄され、yaw=0 は残っている
+        cache.get(128, 256, 64, 0, 0)
+        self.assertEqual(cache.stats['misses'], 4)
+        cache.get(128, 256, 64, 90, 0)
+        self.assertEqual(cache.stats['misses'], 5)
+
+    def test_benchmark_per_frame_speedup(self):
+        """キャッシュ無し（毎フレーム再計算）とキャッシュ有りの1フレームあたり時間を比較する"""
+        eqp = make_equirect(1440, 2880)
+        extractor = VideoExtractor(AppConfig())
+
+        for face_size in (1024, 1600):
+            start = time.perf_counter()
+            for yaw, pitch in VideoExtractor.FACE_ORIENTS.values():
+                map_x, map_y = build_face_maps(1440, 2880, face_size, yaw, pitch)
+                cv2.remap(eqp, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_WRAP)
+            uncached = time.perf_counter() - start
+
+            extractor._equirectangular_to_cubefaces(eqp, face_size=face_size)  # ウォームアップ
+            runs = 3
+            start = time.perf_counter()
+            for _ in range(runs):
+                extractor._equirectangular_to_cubefaces(eqp, face_size=face_size)
+            cached = (time.perf_counter() - start) / runs
+
+            print(f"[benchmark] face_size={face_size}: uncached {uncached * 1000:.1f} ms/frame, "
+                  f"cached {cached * 1000:.1f} ms/frame ({uncached / cached:.1f}x)")
+            self.assertLess(cached, uncached)
+
+
+if __name__ == '__main__':
+    unittest.main()
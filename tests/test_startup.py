@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 起動時に読み込まれてはいけない重い依存
+HEAVY_MODULES = ('torch', 'ultralytics', 'cupy', 'onnxruntime', 'openvino', 'pandas')
+
+PROBE = """
+import json, runpy, sys, time
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_startup(body: str, home: str) -> dict:
+    """新しいインタプリタで body を実行し、所要時間と読み込まれた重い依存を返す"""
+    env = {**os.environ, 'PYTHONPATH': str(ROOT), 'HOME': home}
+    result = subprocess.run([sys.executable, '-c', PROBE.format(body=body, heavy=HEAVY_MODULES)],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestStartupBenchmark(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_benchmark_entry_points_do_not_load_models(self):
+        """各エントリポイントの起動時間を計測し、モデル関連の依存が読み込まれないことを確認する"""
+        outdir = Path(self.tmp.name) / 'faces'
+        entry_points = {
+            'gui.py': "import gui",
+            'video_3dgs_skeleton.py': "import video_3dgs_skeleton",
+            'ProcessingEngine()': ("from core.processing_engine import ProcessingEngine\n"
+                                   "from models.config_models import AppConfig\n"
+                                   "ProcessingEngine(AppConfig())"),
+            'scripts/convert_pano_to_faces.py': (
+                f"sys.argv = ['convert_pano_to_faces.py', '--outdir', {str(outdir)!r}, '--face-size', '256']\n"
+                "runpy.run_path('scripts/convert_pano_to_faces.py', run_name='__main__')"),
+        }
+        for name, body in entry_points.items():
+            result = measure_startup(body, self.tmp.name)
+            print(f"[benchmark] startup {name}: {result['elapsed'] * 1000:.0f} ms (heavy modules: {result['loaded']})")
+            self.assertEqual(result['loaded'], [], name)
+        self.assertEqual(len(list(outdir.glob('face_*.jpg'))), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from core.video_extractor import VideoExtractor, merge_intervals
+from models.config_models import AppConfig
+from tests.test_frame_reader import make_synthetic_clip
+
+
+class TestMergeIntervals(unittest.TestCase):
+    def test_overlapping_and_unsorted_intervals_are_merged(self):
+        intervals = [(5.0, 7.0), (1.0, 3.0), (2.5, 4.0), (7.0, 8.0), (10.0, 10.0)]
+        self.assertEqual(merge_intervals(intervals), [(1.0, 4.0), (5.0, 8.0), (10.0, 10.0)])
+
+    def test_reversed_interval_is_normalized(self):
+        self.assertEqual(merge_intervals([(3.0, 1.0)]), [(1.0, 3.0)])
+
+
+class TestTargetedExtraction(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.videos = []
+        for name in ('a.mp4', 'b.mp4'):
+            path = Path(self.tmp.name) / name
+            make_synthetic_clip(path, num_frames=240, fps=30.0, size=(256, 128))
+            self.videos.append(str(path))
+        self.output_dir = Path(self.tmp.name) / 'out'
+
+        config = AppConfig()
+        config.extraction.dedupe.enabled = False
+        self.extractor = VideoExtractor(config)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_overlapping_problems_are_decoded_once_in_order(self):
+        problems = [
+            {'type': 'component_gap', 'video_source': self.videos[0], 'start_time': 3.0, 'end_time': 5.0},
+            {'type': 'unaligned_cluster', 'video_source': self.videos[0], 'start_time': 1.0, 'end_time': 4.0},
+            {'type': 'unaligned_cluster', 'video_source': self.videos[0], 'start_time': 2.0, 'end_time': 3.0},
+        ]
+        frames = self.extractor.extract_targeted_frames(problems, str(self.output_dir))
+
+        timestamps = [f['timestamp'] for f in frames]
+        self.assertEqual(timestamps, sorted(timestamps))
+        # マージ後の 1.0s〜5.0s 区間から 3枚/秒 = 12枚
+        self.assertEqual(len(frames), 12)
+        self.assertTrue(all(1.0 < t < 5.0 for t in timestamps))
+        self.assertTrue(all(Path(f['image_path']).exists() for f in frames))
+
+    def test_existing_timestamps_are_skipped(self):
+        problems = [{'type': 'component_gap', 'video_source': self.videos[0], 'start_time': 1.0, 'end_time': 2.0}]
+        first = self.extractor.extract_targeted_frames(problems, str(self.output_dir))
+        again = self.extractor.extract_targeted_frames(problems, str(self.output_dir), existing_images=first)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(again, [])
+
+    def test_videos_are_processed_in_problem_order(self):
+        problems = [
+            {'type': 'component_gap', 'video_source': self.videos[1], 'start_time': 1.0, 'end_time': 2.0},
+            {'type': 'component_gap', 'video_source': self.videos[0], 'start_time': 1.0, 'end_time': 2.0},
+        ]
+        frames = self.extractor.extract_targeted_frames(problems, str(self.output_dir))
+
+        self.assertEqual([Path(f['video_source']).name for f in frames], ['b.mp4'] * 3 + ['a.mp4'] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,7 @@
 # utils/cuda_utils.py - CUDA関連ユーティリティ
 import cv2
-import cupy as cp
-import torch
 import numpy as np
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 import logging
 
 class CudaUtils:
@@ -15,15 +13,32 @@ class CudaUtils:
     
     def _check_cuda_availability(self) -> bool:
         """CUDA利用可能性チェック"""
+        # cupy / torch は import だけで数秒かかるため、チェック時に初めて読み込む
         checks = {
             'opencv_cuda': cv2.cuda.getCudaEnabledDeviceCount() > 0,
-            'cupy': cp.cuda.is_available(),
-            'torch_cuda': torch.cuda.is_available()
+            'cupy': self._cupy_available(),
+            'torch_cuda': self._torch_cuda_available()
         }
         
         self.logger.info(f"CUDA利用可能性: {checks}")
         return all(checks.values())
     
+    @staticmethod
+    def _cupy_available() -> bool:
+        try:
+            import cupy as cp
+        except ImportError:
+            return False
+        return cp.cuda.is_available()
+
+    @staticmethod
+    def _torch_cuda_available() -> bool:
+        try:
+            import torch
+        except ImportError:
+            return False
+        return torch.cuda.is_available()
+    
     def equirect_to_cube_gpu(self, equirect_image: np.ndarray, 
                            direction: str) -> Optional[np.ndarray]:
         """GPU使用 正距円筒図→キューブマップ変換"""
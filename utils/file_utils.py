@@ -0,0 +1,60 @@
+# utils/file_utils.py - ファイル識別・プロセス間排他ユーティリティ
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 内容ハッシュに使う先頭・末尾のバイト数
+FINGERPRINT_SAMPLE_BYTES = 1024 * 1024
+
+
+def file_fingerprint(path: Union[str, Path], sample_bytes: int = FINGERPRINT_SAMPLE_BYTES) -> str:
+    """サイズ・更新時刻・先頭/末尾の内容ハッシュからファイルの識別子を作る
+
+    数GBの動画全体を読まずに済むよう、内容は先頭と末尾の sample_bytes のみハッシュする。
+    """
+    path = Path(path)
+    stat = path.stat()
+    digest = hashlib.sha1()
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_bytes))
+        if stat.st_size > sample_bytes:
+            f.seek(max(sample_bytes, stat.st_size - sample_bytes), os.SEEK_SET)
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
+def weights_fingerprint(model_name: Union[str, Path]) -> str:
+    """ローカルの重みファイルなら file_fingerprint を、ハブのモデル名（ファイルが無い）なら空文字を返す
+
+    同じファイル名の別モデルや、同じパスに再学習した重みをキャッシュのキーで区別するために使う。
+    """
+    path = Path(model_name)
+    return file_fingerprint(path) if path.is_file() else ''
+
+
+@contextmanager
+def process_file_lock(lock_path: Path):
+    """lock_path のファイルロックで他のプロセス（並列抽出ワーカー）と排他する"""
+    with open(lock_path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)